@@ -0,0 +1,111 @@
+"""
+合成仓库生成器
+按固定随机种子生成可复现的本地Git仓库, 供基准测试使用
+"""
+import os
+import random
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from git import Actor, Repo
+
+AUTHORS = [
+    Actor("Alice Zhang", "alice@example.com"),
+    Actor("Bob Li", "bob@example.com"),
+    Actor("alice zhang", "alice@example.com"),
+    Actor("Carol Wang", "carol@example.com"),
+    Actor("Dave Chen", "dave@example.com"),
+]
+
+START_DATE = datetime(2020, 1, 1, 12, 0, 0)
+
+
+@dataclass
+class RepoSpec:
+    """合成仓库规模参数"""
+    commits: int = 50
+    files: int = 30
+    functions_per_file: int = 8
+    duplication_rate: float = 0.1
+    seed: int = 42
+
+
+SIZES = {
+    'small': RepoSpec(commits=30, files=20, functions_per_file=6),
+    'medium': RepoSpec(commits=200, files=100, functions_per_file=10),
+    'large': RepoSpec(commits=1000, files=500, functions_per_file=15),
+}
+
+
+def _make_function(rng: random.Random, index: int) -> str:
+    """生成一个带随机分支结构的函数"""
+    params = ', '.join(f"arg{i}" for i in range(rng.randint(0, 6)))
+    lines = [f"def func_{index}({params}):", f"    total = {rng.randint(0, 100)}"]
+    for i in range(rng.randint(1, 6)):
+        kind = rng.choice(('if', 'for', 'while', 'plain'))
+        if kind == 'if':
+            lines += [f"    if total > {rng.randint(0, 50)} and total % {rng.randint(2, 9)}:",
+                      f"        total -= {i + 1}"]
+        elif kind == 'for':
+            lines += [f"    for i in range({rng.randint(1, 20)}):",
+                      f"        total += i * {i + 1}"]
+        elif kind == 'while':
+            lines += [f"    while total > {rng.randint(100, 200)}:",
+                      "        total //= 2"]
+        else:
+            lines.append(f"    total = total * {rng.randint(1, 5)} + {i}")
+    lines.append("    return total")
+    return '\n'.join(lines)
+
+
+def _make_file(rng: random.Random, functions: int, salt: int) -> str:
+    header = ["import os", "import sys", "", ""]
+    body = [_make_function(rng, salt * 1000 + i) for i in range(functions)]
+    return '\n'.join(header) + '\n\n\n'.join(body) + '\n'
+
+
+def generate_repo(path: str, spec: RepoSpec) -> str:
+    """在 path 生成合成仓库(已存在则覆盖), 返回仓库路径"""
+    rng = random.Random(spec.seed)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    repo = Repo.init(path)
+
+    file_names = [f"pkg{i % 10}/module_{i}.py" for i in range(spec.files)]
+    contents = {}
+    for i, name in enumerate(file_names):
+        if contents and rng.random() < spec.duplication_rate:
+            # 复制一个已有文件并追加少量改动, 模拟跨文件拷贝
+            source = rng.choice(list(contents.values()))
+            contents[name] = source + f"\n\nCOPY_MARKER = {i}\n"
+        else:
+            contents[name] = _make_file(rng, spec.functions_per_file, i)
+
+    with open(os.path.join(path, '.mailmap'), 'w', encoding='utf-8') as f:
+        f.write("Alice Zhang <alice@example.com>\n")
+
+    # 第一个提交写入全部文件, 之后每个提交修改少量文件
+    for n in range(spec.commits):
+        if n == 0:
+            changed = file_names
+        else:
+            changed = rng.sample(file_names, k=min(len(file_names), rng.randint(1, 3)))
+            for name in changed:
+                contents[name] += f"\n\n{_make_function(rng, n * 100000 + rng.randint(0, 999))}\n"
+
+        for name in changed:
+            full_path = os.path.join(path, name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w', encoding='utf-8') as f:
+                f.write(contents[name])
+
+        repo.index.add(list(changed) + ([".mailmap"] if n == 0 else []))
+        author = AUTHORS[rng.randrange(len(AUTHORS))]
+        when = (START_DATE + timedelta(hours=n * 7)).strftime('%Y-%m-%dT%H:%M:%S')
+        repo.index.commit(f"commit {n}: update {len(changed)} files",
+                          author=author, committer=author,
+                          author_date=when, commit_date=when)
+
+    repo.close()
+    return path
@@ -0,0 +1,85 @@
+"""
+资源限制吞吐量对比
+运行:  python -m benchmarks.guard --size medium
+在同一合成仓库中加入病态文件(超大、超长、深层嵌套、语法错误), 比较与干净语料的分析吞吐量
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from git import Repo
+
+from benchmarks.generator import SIZES, generate_repo
+from src.collector import GitCollector
+from src.guard import FileLimits, GuardedPool
+
+PATHOLOGICAL = {
+    'generated/huge_table.py': lambda: "TABLE = [\n" + "    (1, 2, 3),\n" * 150000 + "]\n",
+    'generated/long_file.py': lambda: "x = 1\n" * 30000,
+    'generated/deep_expr.py': lambda: "x = " + " + ".join(["a"] * 50000) + "\n",
+    'generated/nested_expr.py': lambda: "x = " + " + ".join(["a"] * 800) + "\n",
+    'generated/minified.py': lambda: "x=1;" * 400000 + "\n",
+    'generated/broken.py': lambda: "def broken(:\n" * 100,
+}
+
+
+def salt_repo(path: str, copies: int):
+    """追加一个提交, 写入 copies 组病态文件"""
+    repo = Repo(path)
+    names = []
+    for i in range(copies):
+        for name, make in PATHOLOGICAL.items():
+            name = name.replace('.py', f'_{i}.py')
+            full_path = os.path.join(path, name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w', encoding='utf-8') as f:
+                f.write(make())
+            names.append(name)
+    repo.index.add(names)
+    repo.index.commit("add generated files")
+    repo.close()
+
+
+def run(repo_path: str, limits: FileLimits, workers: int):
+    collector = GitCollector(repo_path)
+    collector.clone()
+    blobs = collector.get_python_blobs()
+    start = time.perf_counter()
+    with GuardedPool(repo_path, limits, workers) as pool:
+        results = list(pool.imap(blobs.items()))
+        killed = pool.killed
+    elapsed = time.perf_counter() - start
+    analyzed = sum(1 for r in results if not r.skipped)
+    return elapsed, analyzed, len(results) - analyzed, killed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="资源限制吞吐量对比")
+    parser.add_argument("--size", choices=sorted(SIZES), default="medium", help="合成仓库规模")
+    parser.add_argument("--copies", type=int, default=2, help="病态文件组数")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="分析进程数")
+    parser.add_argument("--timeout", type=float, default=2.0, help="单文件超时秒数")
+    args = parser.parse_args(argv)
+    limits = FileLimits(timeout=args.timeout)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        clean = generate_repo(os.path.join(workdir, "clean"), SIZES[args.size])
+        salted = generate_repo(os.path.join(workdir, "salted"), SIZES[args.size])
+        salt_repo(salted, args.copies)
+
+        print(f"  {'语料':<8} {'耗时(s)':>8} {'分析':>6} {'跳过':>6} {'终止进程':>8} {'文件/秒':>10}")
+        rates = {}
+        for name, path in (('clean', clean), ('salted', salted)):
+            elapsed, analyzed, skipped, killed = run(path, limits, args.workers)
+            rates[name] = analyzed / elapsed
+            print(f"  {name:<8} {elapsed:>8.3f} {analyzed:>6} {skipped:>6} {killed:>8} {rates[name]:>10.1f}")
+        print(f"\n  含病态文件时吞吐量为干净语料的 {rates['salted'] / rates['clean']:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+运行统计开销
+运行:  python -m benchmarks.profiling --size medium -r 5
+对同一合成仓库交替执行完整分析: 不计时(空统计器)、默认阶段计时与计数、--profile(cProfile+tracemalloc),
+每次使用新的数据库, 以耗时中位数计算相对不计时的开销.
+端到端耗时的波动通常大于 2%, 因此另外统计一次运行中的计时/计数调用次数, 乘以单次调用成本,
+得到默认统计的开销估算并与 2% 目标对比
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as cli
+from benchmarks.generator import SIZES, generate_repo
+from src.profiling import RunProfiler
+
+TARGET = 0.02
+
+
+class NullProfiler(RunProfiler):
+    """不做任何计时与计数的统计器, 作为无插桩基线"""
+
+    def __init__(self, profile: bool = False, top_n: int = 25):
+        super().__init__(profile=False, top_n=top_n)
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        pass
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+
+class CountingProfiler(RunProfiler):
+    """记录 stage/add/count 的调用次数"""
+    calls = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        CountingProfiler.calls += 1
+        with super().stage(name):
+            yield
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        CountingProfiler.calls += 1
+        super().add(name, seconds, calls)
+
+    def count(self, name: str, n: int = 1):
+        CountingProfiler.calls += 1
+        super().count(name, n)
+
+
+MODES = {
+    'none': (NullProfiler, False),
+    'stages': (RunProfiler, False),
+    'profile': (RunProfiler, True),
+    'counting': (CountingProfiler, False),
+}
+
+
+def run_once(repo_path: str, workdir: str, mode: str, index: int, args) -> float:
+    profiler_cls, profile = MODES[mode]
+    cli.DB_PATH = os.path.join(workdir, f"{mode}_{index}.db")
+    cli.RunProfiler = profiler_cls
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli.analyze_repository(repo_path, max_commits=args.commits, profile=profile,
+                                   workers=args.workers)
+        return time.perf_counter() - start
+    finally:
+        cli.RunProfiler = RunProfiler
+
+
+def call_cost(n: int = 200000) -> float:
+    """一次 stage 计时的平均耗时(秒), add/count 比它更便宜"""
+    profiler = RunProfiler()
+    start = time.perf_counter()
+    for _ in range(n):
+        with profiler.stage("bench"):
+            pass
+    return (time.perf_counter() - start) / n
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="运行统计开销")
+    parser.add_argument("--size", choices=sorted(SIZES), default="medium", help="合成仓库规模")
+    parser.add_argument("--commits", type=int, default=100, help="分析提交数")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="分析进程数")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="每种模式的运行次数")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        repo_path = generate_repo(os.path.join(workdir, "repo"), SIZES[args.size])
+        run_once(repo_path, workdir, 'stages', -1, args)  # 预热
+        run_once(repo_path, workdir, 'counting', -1, args)
+        samples = {mode: [] for mode in ('none', 'stages', 'profile')}
+        # 交替执行各模式, 减少系统负载漂移对比较的影响
+        for i in range(args.repeat):
+            for mode in samples:
+                samples[mode].append(run_once(repo_path, workdir, mode, i, args))
+
+        baseline = statistics.median(samples['none'])
+        print(f"  {'模式':<8} {'中位数(s)':>10} {'最小(s)':>9} {'开销':>8}")
+        for mode, times in samples.items():
+            overhead = statistics.median(times) / baseline - 1
+            print(f"  {mode:<8} {statistics.median(times):>10.3f} {min(times):>9.3f} {overhead:>+8.1%}")
+        cost = call_cost()
+        overhead = CountingProfiler.calls * cost / baseline
+        print(f"\n  每次运行 {CountingProfiler.calls} 次计时/计数调用 x {cost * 1e6:.2f} us "
+              f"= {CountingProfiler.calls * cost * 1000:.2f} ms")
+        print(f"  默认统计开销估算 {overhead:.3%}, {'达到' if overhead < TARGET else '未达到'} "
+              f"{TARGET:.0%} 目标 (--profile 仅用于排查, 不计入目标)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+提交记录表示方式对比
+运行:  python -m benchmarks.records -n 100000
+比较字典、CommitRecord 列表与 CommitBatch 的内存占用和 pickle 吞吐量
+"""
+import argparse
+import gc
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import AUTHORS, START_DATE
+from src.records import CommitBatch, CommitRecord, make_commit
+
+PATHS = [f"pkg{i % 10}/module_{i}.py" for i in range(50)]
+
+
+def raw_commits(count: int, seed: int = 42) -> Iterator[Tuple]:
+    """生成提交字段; 字符串逐个构造, 与GitPython解析结果一样互不共享"""
+    rng = random.Random(seed)
+    start = int(START_DATE.timestamp())
+    for n in range(count):
+        author = AUTHORS[rng.randrange(len(AUTHORS))]
+        yield ('%040x' % rng.getrandbits(160), ''.join(author.name), ''.join(author.email),
+               f"commit {n}: update {rng.choice(PATHS)}", start + n * 3600,
+               rng.randint(1, 5), rng.randint(0, 200), rng.randint(0, 100))
+
+
+def build_dicts(count: int) -> List[Dict]:
+    """与 GitCollector 旧格式一致的提交字典"""
+    return [{
+        'sha': sha, 'author': author, 'email': email, 'message': message,
+        'date': datetime.fromtimestamp(ts), 'files_changed': files,
+        'insertions': ins, 'deletions': dels,
+    } for sha, author, email, message, ts, files, ins, dels in raw_commits(count)]
+
+
+def build_records(count: int) -> List[CommitRecord]:
+    return [make_commit(*fields) for fields in raw_commits(count)]
+
+
+def build_batch(count: int) -> CommitBatch:
+    return CommitBatch(make_commit(*fields) for fields in raw_commits(count))
+
+
+BUILDERS = {
+    'dict': build_dicts,
+    'CommitRecord': build_records,
+    'CommitBatch': build_batch,
+}
+
+
+def measure_memory(build: Callable[[], object]) -> int:
+    """返回 build() 结果常驻的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def measure_pickle(obj, repeat: int) -> Dict[str, float]:
+    dumps, loads = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        dumps.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        pickle.loads(data)
+        loads.append(time.perf_counter() - start)
+    return {'bytes': len(data), 'dumps': min(dumps), 'loads': min(loads)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="提交记录表示方式对比")
+    parser.add_argument("-n", "--count", type=int, default=100000, help="提交数")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="pickle重复次数")
+    args = parser.parse_args(argv)
+
+    print(f"{args.count} 个提交\n")
+    print(f"  {'格式':<14} {'内存(MB)':>10} {'pickle(MB)':>12} {'dumps(ms)':>10} "
+          f"{'loads(ms)':>10} {'提交/秒':>12}")
+    for name, build in BUILDERS.items():
+        memory = measure_memory(lambda: build(args.count))
+        stats = measure_pickle(build(args.count), args.repeat)
+        throughput = args.count / (stats['dumps'] + stats['loads'])
+        print(f"  {name:<14} {memory / 2 ** 20:>10.1f} {stats['bytes'] / 2 ** 20:>12.1f} "
+              f"{stats['dumps'] * 1000:>10.1f} {stats['loads'] * 1000:>10.1f} {throughput:>12,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
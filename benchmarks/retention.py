@@ -0,0 +1,124 @@
+"""
+数据保留与压缩效果
+运行:  python -m benchmarks.retention --nights 365
+模拟一个项目每晚分析一次(新增提交、少量文件变化、新快照与运行记录), 比较不清理与按策略定期 compact
+时数据库大小和常用查询延迟的变化
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import AUTHORS
+from src.analyzer import FileMetrics, FunctionInfo
+from src.retention import RetentionPolicy, compact
+from src.storage import Database
+
+MESSAGES = ["fix parser crash", "add caching layer", "refactor helpers", "update docs", "bump version"]
+
+
+def make_metrics(path: str, version: int, rng: random.Random, functions: int) -> FileMetrics:
+    funcs = [FunctionInfo(f"func_{version}_{i}", i * 12 + 1, rng.randint(3, 40), rng.randint(0, 5),
+                          rng.randint(1, 15)) for i in range(functions)]
+    return FileMetrics(path, loc=functions * 12, sloc=functions * 10, functions_count=functions,
+                       imports_count=3, functions=funcs, code_smells=["函数过长"] if version % 7 == 0 else [])
+
+
+def simulate_night(db: Database, night: int, when: datetime, blobs: Dict[str, str],
+                   rng: random.Random, args):
+    pid = db.save_project("nightly", "https://github.com/test/nightly")
+    commits = []
+    for i in range(args.commits_per_night):
+        author = AUTHORS[rng.randrange(len(AUTHORS))]
+        commits.append({'sha': f'{night:08x}{i:032x}', 'author': author.name, 'email': author.email,
+                        'message': f"{rng.choice(MESSAGES)} #{night}", 'date': when + timedelta(minutes=i),
+                        'files_changed': 1, 'insertions': rng.randint(1, 50), 'deletions': rng.randint(0, 20)})
+    db.save_commits(pid, commits)
+
+    for path in rng.sample(sorted(blobs), max(1, int(len(blobs) * args.churn))):
+        blobs[path] = f'{path}@{night}'
+    file_ids = db.find_file_rows(pid, blobs)
+    for path, blob in blobs.items():
+        if path not in file_ids:
+            metrics = make_metrics(path, night, rng, args.functions)
+            file_ids[path] = db.save_file_stats(pid, metrics, blob)
+            db.save_functions(pid, [(file_ids[path], f) for f in metrics.functions])
+    snapshot_id = db.save_snapshot(pid, f'{night:040x}', when, file_ids.values())
+    db.save_project_stats(pid, db.find_snapshot(pid, str(snapshot_id)))
+    db.save_run(pid, {'started_at': when.isoformat(), 'duration_seconds': 1.0, 'stages': {}})
+    return pid
+
+
+def query_latency(db: Database, pid: int, repeat: int = 5) -> float:
+    """常用读查询的总耗时中位数(毫秒)"""
+    queries: List[Callable] = [
+        lambda: db.get_file_stats(pid),
+        lambda: db.get_top_functions(pid, limit=20),
+        lambda: db.get_activity(pid, 'week'),
+        lambda: db.get_contributor_stats(pid),
+        lambda: db.search_commits("parser", pid),
+        lambda: db.get_snapshots(pid),
+    ]
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            query()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="数据保留与压缩效果")
+    parser.add_argument("--nights", type=int, default=365, help="模拟的分析次数(每晚一次)")
+    parser.add_argument("--files", type=int, default=300, help="项目文件数")
+    parser.add_argument("--functions", type=int, default=8, help="每个文件的函数数")
+    parser.add_argument("--churn", type=float, default=0.03, help="每晚变化的文件比例")
+    parser.add_argument("--commits-per-night", type=int, default=5, help="每晚新增提交数")
+    parser.add_argument("--compact-every", type=int, default=7, help="每隔多少晚执行一次 compact")
+    parser.add_argument("--report-every", type=int, default=60, help="每隔多少晚输出一次")
+    parser.add_argument("--keep-snapshots", type=int, default=30)
+    parser.add_argument("--commit-days", type=int, default=90)
+    args = parser.parse_args(argv)
+    policy = RetentionPolicy(keep_snapshots=args.keep_snapshots, commit_days=args.commit_days, run_days=30)
+    end = datetime.now().replace(microsecond=0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        dbs = {}
+        for name in ('raw', 'compacted'):
+            os.makedirs(os.path.join(workdir, name))
+            dbs[name] = Database(os.path.join(workdir, name, "analysis.db"))
+            dbs[name].init_tables()
+        state = {name: ({f"pkg{i % 10}/module_{i}.py": f"blob{i}" for i in range(args.files)},
+                        random.Random(7)) for name in dbs}
+
+        print(f"  {'晚':>5} {'不清理(MB)':>10} {'查询(ms)':>9} {'compact(MB)':>11} {'查询(ms)':>9} "
+              f"{'归档(KB)':>9}")
+        for night in range(1, args.nights + 1):
+            when = end - timedelta(days=args.nights - night)
+            row = {}
+            for name, db in dbs.items():
+                blobs, rng = state[name]
+                pid = simulate_night(db, night, when, blobs, rng, args)
+                if name == 'compacted' and night % args.compact_every == 0:
+                    compact(db, policy, now=when)
+                row[name] = pid
+            if night % args.report_every == 0 or night == args.nights:
+                cells = []
+                for name, db in dbs.items():
+                    cells.append(f"{os.path.getsize(db.db_path) / 1e6:>10.2f} "
+                                 f"{query_latency(db, row[name]):>9.2f}")
+                archived = sum(a['size_bytes'] for a in dbs['compacted'].get_archives(row['compacted']))
+                print(f"  {night:>5} {cells[0]} {cells[1]:>21} {archived / 1e3:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
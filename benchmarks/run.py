@@ -0,0 +1,346 @@
+"""
+基准测试入口
+运行:  python -m benchmarks.run --size small
+       python -m benchmarks.run --size small --save-baseline
+与基线相比变慢超过阈值时以非零状态码退出
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import SIZES, generate_repo
+from src.collector import GitCollector
+from src.analyzer import CodeAnalyzer
+from src.delta import compute_delta
+from src.profiling import RunProfiler
+from src.similarity import compute_signature
+from src.storage import Database
+from src.z3_checker import Z3Checker, Z3_AVAILABLE
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+
+# 基线耗时低于该值(秒)的用例只比较绝对差, 避免计时噪声误报
+NOISE_FLOOR = 0.0005
+
+
+class BenchContext:
+    """基准测试共享数据: 合成仓库、采集结果与已填充的数据库"""
+
+    def __init__(self, size: str, workdir: str):
+        self.spec = SIZES[size]
+        self.repo_path = generate_repo(os.path.join(workdir, f"repo_{size}"), self.spec)
+        self.collector = GitCollector(self.repo_path)
+        self.collector.clone()
+        self.blobs = self.collector.get_python_blobs()
+        self.files = list(self.blobs)
+        self.contents = {path: self.collector.get_current_file(path) for path in self.files}
+        self.commits = list(self.collector.get_commits(max_count=self.spec.commits))
+
+        self.db_path = os.path.join(workdir, "bench.db")
+        self.db = Database(self.db_path)
+        self.db.init_tables()
+        # 先分析较早的版本再分析HEAD, 得到两个快照供差异比较
+        self.ingest(self.db, f"HEAD~{min(5, len(self.commits) - 1)}")
+        self.project_id = self.ingest(self.db)
+        self.file_ids = [f['id'] for f in self.db.get_file_stats(self.project_id)]
+        self.file_id = self.file_ids[0]
+        self.signature = self.db.get_file_signature(self.file_id)
+        self.old_snapshot, self.new_snapshot = (s['id'] for s in self.db.get_snapshots(self.project_id)[-2:])
+        self._client = None
+
+    def ingest(self, db: Database, rev: Optional[str] = None) -> int:
+        """执行与 main.py 相同的入库流程; rev 为None时分析HEAD"""
+        blobs, contents = self.blobs, self.contents
+        if rev:
+            blobs = self.collector.get_python_blobs(rev)
+            contents = {path: self.collector.get_current_file(path, rev) for path in blobs}
+        profiler = RunProfiler()
+        profiler.start()
+        project_id = db.save_project(self.collector.repo_name, self.repo_path)
+        db.save_commits(project_id, self.commits, self.collector.get_mailmap())
+        file_ids = db.find_file_rows(project_id, blobs)
+        functions = []
+        for path, content in contents.items():
+            if path in file_ids:
+                continue
+            metrics = CodeAnalyzer(content, path).analyze()
+            if metrics:
+                file_id = db.save_file_stats(project_id, metrics, blobs[path])
+                db.save_file_signature(project_id, file_id, compute_signature(content))
+                file_ids[path] = file_id
+                functions.extend((file_id, f) for f in metrics.functions)
+        db.save_functions(project_id, functions)
+        head = self.collector.resolve(rev)
+        snapshot_id = db.save_snapshot(project_id, head.hexsha, head.committed_datetime, file_ids.values())
+        db.save_project_stats(project_id, db.find_snapshot(project_id, str(snapshot_id)))
+        profiler.stop()
+        db.save_run(project_id, profiler.report())
+        return project_id
+
+    @property
+    def client(self):
+        if self._client is None:
+            from src.web_app import create_app
+            app = create_app(self.db_path, os.path.join(os.path.dirname(self.db_path), "charts"))
+            missing = {r.rule for r in app.url_map.iter_rules() if r.endpoint != 'static'} - set(WEB_ENDPOINTS)
+            if missing:
+                raise RuntimeError(f"以下接口没有基准用例: {sorted(missing)}")
+            self._client = app.test_client()
+        return self._client
+
+
+BENCHMARKS: Dict[str, Callable[[BenchContext], object]] = {}
+
+
+def benchmark(name: str):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+# ---- 采集 ----
+
+@benchmark("collector.get_commits")
+def bench_get_commits(ctx):
+    return list(ctx.collector.get_commits(max_count=ctx.spec.commits))
+
+
+@benchmark("collector.get_python_files")
+def bench_get_python_files(ctx):
+    return ctx.collector.get_python_files()
+
+
+@benchmark("collector.get_current_file")
+def bench_get_current_file(ctx):
+    return [ctx.collector.get_current_file(path) for path in ctx.files]
+
+
+# ---- 分析 ----
+
+@benchmark("analyzer.analyze")
+def bench_analyze(ctx):
+    return [CodeAnalyzer(content, path).analyze() for path, content in ctx.contents.items()]
+
+
+@benchmark("z3_checker.check")
+def bench_z3_check(ctx):
+    return [Z3Checker(content).check() for content in ctx.contents.values()]
+
+
+@benchmark("similarity.compute_signature")
+def bench_signature(ctx):
+    return [compute_signature(content) for content in ctx.contents.values()]
+
+
+@benchmark("delta.compute_delta")
+def bench_delta(ctx):
+    old, new = (ctx.db.find_snapshot(ctx.project_id, str(s)) for s in (ctx.old_snapshot, ctx.new_snapshot))
+    return compute_delta(ctx.db, old, new)
+
+
+# ---- 存储 ----
+
+@benchmark("storage.ingest")
+def bench_ingest(ctx):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "ingest.db"))
+        db.init_tables()
+        return ctx.ingest(db)
+
+
+# 数据库读接口(get_/find_/search_ 开头的公开方法)全部计时, 必填参数按参数名从上下文取值;
+# 新增接口的参数名不在表中时导入即报错, 以免漏测
+ACCESSOR_ARGS: Dict[str, Callable[[BenchContext], object]] = {
+    'project_id': lambda c: c.project_id,
+    'file_id': lambda c: c.file_id,
+    'file_ids': lambda c: c.file_ids,
+    'signature': lambda c: c.signature,
+    'name': lambda c: c.collector.repo_name,
+    'blobs': lambda c: c.blobs,
+    'ref': lambda c: str(c.new_snapshot),
+    'old_snapshot_id': lambda c: c.old_snapshot,
+    'new_snapshot_id': lambda c: c.new_snapshot,
+    'query': lambda c: "update",  # 出现在每条提交信息中的常见词
+}
+ACCESSOR_OVERRIDES = {
+    'get_activity': {'granularity': 'week'},
+    'search_files': {'query': "module"},
+}
+ACCESSOR_EXCLUDE = {'get_conn'}
+
+
+def _db_benchmarks():
+    for name, method in inspect.getmembers(Database, inspect.isfunction):
+        if not name.startswith(('get_', 'find_', 'search_')) or name in ACCESSOR_EXCLUDE:
+            continue
+        overrides = ACCESSOR_OVERRIDES.get(name, {})
+        required = [p.name for p in list(inspect.signature(method).parameters.values())[1:]
+                    if p.default is inspect.Parameter.empty and p.name not in overrides]
+        unknown = [p for p in required if p not in ACCESSOR_ARGS]
+        if unknown:
+            raise KeyError(f"Database.{name} 的参数 {unknown} 没有基准取值, 请补充 ACCESSOR_ARGS")
+
+        def run(ctx, name=name, required=required, overrides=overrides):
+            kwargs = {p: ACCESSOR_ARGS[p](ctx) for p in required}
+            return getattr(ctx.db, name)(**kwargs, **overrides)
+        BENCHMARKS[f"storage.{name}"] = run
+
+
+_db_benchmarks()
+
+
+# ---- Web接口 ----
+
+# 路由规则 -> 请求URL; 创建Web应用时检查所有路由均已覆盖
+WEB_ENDPOINTS = {
+    "/": "/",
+    "/api/projects": "/api/projects",
+    "/api/project/<int:pid>": "/api/project/{pid}",
+    "/api/project/<int:pid>/contributors": "/api/project/{pid}/contributors",
+    "/api/project/<int:pid>/files": "/api/project/{pid}/files",
+    "/api/project/<int:pid>/commits": "/api/project/{pid}/commits",
+    "/api/project/<int:pid>/activity": "/api/project/{pid}/activity?granularity=month",
+    "/api/project/<int:pid>/snapshots": "/api/project/{pid}/snapshots",
+    "/api/project/<int:pid>/delta": "/api/project/{pid}/delta?from={old}&to={new}",
+    "/api/project/<int:pid>/functions": "/api/project/{pid}/functions",
+    "/api/project/<int:pid>/complexity": "/api/project/{pid}/complexity",
+    "/api/project/<int:pid>/chart/<chart_type>.png": "/api/project/{pid}/chart/complexity_trend.png",
+    "/api/project/<int:pid>/runs": "/api/project/{pid}/runs",
+    "/api/project/<int:pid>/skipped": "/api/project/{pid}/skipped",
+    "/api/project/<int:pid>/archives": "/api/project/{pid}/archives",
+    "/metrics": "/metrics",
+    "/api/search": "/api/search?q=update&project={pid}",
+    "/api/similar": "/api/similar?file_id={fid}",
+}
+
+
+def _web_benchmarks():
+    def make(url):
+        def run(ctx):
+            response = ctx.client.get(url.format(pid=ctx.project_id, fid=ctx.file_id,
+                                                 old=ctx.old_snapshot, new=ctx.new_snapshot))
+            assert response.status_code == 200, f"{url}: {response.status_code}"
+            return response
+        return run
+
+    for rule, url in WEB_ENDPOINTS.items():
+        # 用例名取规则中最后一个非参数段, 如 /api/project/<int:pid>/runs -> web.runs
+        segments = [s for s in rule.split('/') if s and not s.startswith('<')]
+        BENCHMARKS[f"web.{segments[-1] if segments else 'index'}"] = make(url)
+
+
+_web_benchmarks()
+
+
+def run_benchmarks(ctx: BenchContext, repeat: int, pattern: Optional[str] = None) -> Dict[str, Dict]:
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        if name.startswith("z3_checker") and not Z3_AVAILABLE:
+            continue
+        func(ctx)  # 预热
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(ctx)
+            timings.append(time.perf_counter() - start)
+        results[name] = {
+            'median': statistics.median(timings),
+            'min': min(timings),
+            'max': max(timings),
+            'repeat': repeat,
+        }
+        print(f"  {name:<40} {results[name]['median'] * 1000:>10.3f} ms")
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """返回超过阈值的回归项描述"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = current['median'] / base['median'] if base['median'] > 0 else float('inf')
+        slower = current['median'] - base['median']
+        if ratio > 1 + threshold and (base['median'] >= NOISE_FLOOR or slower >= NOISE_FLOOR):
+            regressions.append(f"{name}: {base['median'] * 1000:.3f} ms -> "
+                               f"{current['median'] * 1000:.3f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="OSS代码分析工具基准测试")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small", help="合成仓库规模")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="每个用例重复次数")
+    parser.add_argument("-k", "--filter", help="只运行名称包含该字符串的用例")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="结果JSON路径")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON路径")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("-t", "--threshold", type=float, default=0.25, help="回归阈值(相对变慢比例)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"生成合成仓库 ({args.size})...")
+        ctx = BenchContext(args.size, workdir)
+        print(f"{len(ctx.commits)} 个提交, {len(ctx.files)} 个文件\n")
+        results = run_benchmarks(ctx, args.repeat, args.filter)
+
+    report = {
+        'meta': {
+            'size': args.size,
+            'spec': asdict(SIZES[args.size]),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(),
+        },
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n结果已保存: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"基线已保存: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("未找到基线, 跳过对比 (使用 --save-baseline 生成)")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['meta']['size'] != args.size:
+        print(f"基线规模为 {baseline['meta']['size']}, 与本次 {args.size} 不一致, 跳过对比")
+        return 0
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项性能回归 (阈值 {args.threshold:.0%}):")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\n未发现性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+全文搜索延迟
+运行:  python -m benchmarks.search --commits 200000 --projects 20
+多个项目的提交交错写入(同一项目的提交ID不连续), 分别测量常见词、少见词、前缀与多词查询
+在全库和单个项目内搜索的延迟, 与 50 ms 目标对比
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import AUTHORS
+from src.storage import Database
+
+TARGET_MS = 50.0
+COMMON = ["fix", "update", "add", "refactor", "test", "docs", "bump", "cleanup"]
+TOPICS = ["parser", "cache", "config", "logging", "scheduler", "network", "storage", "renderer",
+          "plugin", "metrics", "auth", "session", "encoder", "migration", "cli", "worker"]
+RARE = "deadlock"
+
+
+def make_message(rng: random.Random, n: int) -> str:
+    words = [rng.choice(COMMON), rng.choice(TOPICS), "in", rng.choice(TOPICS)]
+    if n % 5000 == 0:
+        words.append(RARE)
+    return f"{' '.join(words)} (#{n})"
+
+
+def populate(db: Database, args) -> List[int]:
+    """按批次轮流为各项目写入提交, 使项目之间的提交ID交错"""
+    rng = random.Random(7)
+    pids = [db.save_project(f"project_{i}", f"https://github.com/test/project_{i}")
+            for i in range(args.projects)]
+    start = datetime(2020, 1, 1)
+    n = 0
+    while n < args.commits:
+        for pid in pids:
+            batch = []
+            for _ in range(min(args.batch, args.commits - n)):
+                author = AUTHORS[rng.randrange(len(AUTHORS))]
+                batch.append({'sha': f'{n:040x}', 'author': author.name, 'email': author.email,
+                              'message': make_message(rng, n), 'date': start + timedelta(minutes=n),
+                              'files_changed': 1, 'insertions': 1, 'deletions': 0})
+                n += 1
+            db.save_commits(pid, batch)
+    return pids
+
+
+def latency(func, repeat: int) -> float:
+    """耗时中位数(毫秒)"""
+    func()  # 预热
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="全文搜索延迟")
+    parser.add_argument("--commits", type=int, default=200000, help="提交总数")
+    parser.add_argument("--projects", type=int, default=20, help="项目数")
+    parser.add_argument("--batch", type=int, default=500, help="每个项目每批写入的提交数")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="每个查询重复次数")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = Database(os.path.join(workdir, "search.db"))
+        db.init_tables()
+        begin = time.perf_counter()
+        pids = populate(db, args)
+        print(f"写入 {args.commits} 个提交 ({args.projects} 个项目): {time.perf_counter() - begin:.1f} 秒"
+              f"{'' if db.fts_enabled else ' (未启用FTS5, 使用LIKE)'}\n")
+
+        queries = [("常见词", COMMON[0]), ("主题词", TOPICS[0]), ("少见词", RARE),
+                   ("前缀", TOPICS[1][:4] + "*"), ("多词", f"{COMMON[1]} {TOPICS[2]}")]
+        print(f"  {'查询':<8} {'':<14} {'全库(ms)':>9} {'单项目(ms)':>11}")
+        slow = 0
+        for label, query in queries:
+            cells = [latency(lambda: db.search_commits(query, project_id), args.repeat)
+                     for project_id in (None, pids[len(pids) // 2])]
+            slow += sum(ms > TARGET_MS for ms in cells)
+            print(f"  {label:<8} {query:<14} {cells[0]:>9.2f} {cells[1]:>11.2f}")
+        print(f"\n{'全部' if not slow else f'{slow} 项未'}达到 {TARGET_MS:.0f} ms 目标")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,145 +2,669 @@
 OSS代码分析工具 - 主程序
 """
 import argparse
+import asyncio
+import html
+import json
 import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from git.exc import BadName
 
 from src.collector import GitCollector
-from src.analyzer import CodeAnalyzer
+from src.async_collector import CollectedFile, CollectedRepo, collect_repos
 from src.storage import Database
+from src.sharding import SHARD_MODES, open_database
+from src.guard import FileLimits, GuardedPool
+from src.profiling import RunProfiler
+from src.delta import compute_delta
+from src.retention import ARCHIVE_DIR, RetentionPolicy, compact
+
+# 数据库位置: 以 .db 结尾为单文件, 否则为分片目录; 由全局参数 --db 等设置
+DB_PATH = "data/analysis.db"
+SHARD_MODE = "project"
+SHARD_BUCKETS = 16
+
+
+def open_db():
+    db = open_database(DB_PATH, SHARD_MODE, SHARD_BUCKETS)
+    db.init_tables()
+    return db
+
 
+def resolve_revision(collector: GitCollector, rev: Optional[str]):
+    """解析修订版本, 无效时输出错误并返回None"""
+    try:
+        return collector.resolve(rev)
+    except (BadName, ValueError):
+        print(f"无效的修订版本: {rev}")
+        return None
 
-def analyze_repository(repo_url: str, max_commits: int = 100):
-    """分析仓库"""
+
+def analyze_repository(repo_url: str, max_commits: int = 100,
+                       profile: bool = False, report_path: str = None, rev: str = None,
+                       limits: FileLimits = None, workers: int = None):
+    """分析仓库, rev 指定要分析的修订版本(默认为默认分支/HEAD)
+
+    文件在受资源限制的工作进程中分析, 超限的文件记录到 skipped_files 表
+    """
     print(f"{'='*50}")
     print(f"OSS代码分析工具")
     print(f"{'='*50}")
     print(f"仓库:  {repo_url}")
+    if rev:
+        print(f"修订版本: {rev}")
     print(f"分析提交数: {max_commits}\n")
 
     # 初始化
-    db = Database("data/analysis.db")
-    db.init_tables()
+    db = open_db()
+    profiler = RunProfiler(profile=profile)
+    profiler.start()
+
+    try:
+        collector = GitCollector(repo_url, "data/repos")
+        with profiler.stage("clone"):
+            cloned = collector.clone()
+        if not cloned:
+            print("仓库克隆/打开失败!")
+            return
+        # 先校验修订版本, 避免无效 rev 留下空的项目记录
+        head = resolve_revision(collector, rev)
+        if head is None:
+            return
+
+        # 保存项目
+        with profiler.stage("db_write"):
+            project_id = db.save_project(collector.repo_name, repo_url)
+        print(f"项目ID: {project_id}\n")
+
+        # 获取提交
+        print("正在获取提交历史...")
+        with profiler.stage("get_commits"):
+            commits = collector.get_commit_batch(max_count=max_commits, rev=rev)
+        profiler.count("commits", len(commits))
+        print(f"获取到 {len(commits)} 个提交\n")
+
+        # 保存提交信息
+        print("正在保存提交信息...")
+        with profiler.stage("read_mailmap"):
+            mailmap = collector.get_mailmap(rev)
+        with profiler.stage("db_write"):
+            db.save_commits(project_id, commits, mailmap)
+        profiler.count("rows_written", len(commits))
+        print(f"已保存 {len(commits)} 个提交\n")
+
+        # 分析当前代码
+        print("正在分析当前代码...")
+        with profiler.stage("list_files"):
+            python_blobs = collector.get_python_blobs(rev)
+        print(f"找到 {len(python_blobs)} 个Python文件\n")
+
+        # 路径与blob均未变化的文件直接复用已有分析结果
+        with profiler.stage("db_read"):
+            file_ids = db.find_file_rows(project_id, python_blobs)
+        profiler.count("files_reused", len(file_ids))
+        print(f"复用 {len(file_ids)} 个未变化文件的分析结果\n")
+
+        tasks = [(path, blob) for path, blob in python_blobs.items() if path not in file_ids]
+        with GuardedPool(collector.local_path, limits, workers) as pool:
+            skipped = save_file_results(db, project_id, pool.imap(tasks), file_ids, profiler)
+        profiler.count("workers_killed", pool.killed)
+        profiler.count("workers_recycled", pool.recycled)
+
+        snapshot = save_snapshot(db, project_id, head.hexsha, head.committed_datetime, file_ids, profiler)
+        snapshot_id = snapshot['id']
+
+        # 保存运行报告
+        profiler.stop()
+        report = profiler.report()
+        run_id = db.save_run(project_id, report)
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+          # 输出结果
+        print(f"{'='*50}")
+        print("分析结果")
+        print(f"{'='*50}")
+        print(f"快照: {snapshot_id} ({head.hexsha[:10]})")
+        print(f"Python文件数: {snapshot['total_files']}")
+        print(f"总代码行数:  {snapshot['total_loc']}")
+        print(f"函数总数: {snapshot['total_functions']}")
+        print(f"类总数: {snapshot['total_classes']}")
+        print(f"代码异味数: {snapshot['total_smells']}")
+        if skipped:
+            print(f"跳过文件数: {len(skipped)}")
+            for result in skipped[:10]:
+                print(f"  - {result.file_path}: {result.skipped} {result.detail}")
+
+        all_smells = db.get_code_smells(project_id)
+
+        if all_smells:
+            print(f"\n代码异味详情 (前10个):")
+            for smell in all_smells[:10]:
+                print(f"  - {smell}")
+
+        # 贡献者统计
+        contributors = db.get_contributor_stats(project_id)
+        print(f"\n贡献者排名 (前5名):")
+        for i, c in enumerate(contributors[:5], 1):
+            print(f"  {i}. {c['author']}: {c['commits']} 次提交")
+
+        print(f"\n阶段耗时 (运行ID: {run_id}, 共 {report['duration_seconds']:.2f} 秒):")
+        for stage, info in sorted(report['stages'].items(), key=lambda x: x[1]['seconds'], reverse=True):
+            print(f"  {stage}: {info['seconds']:.3f} 秒 ({info['calls']} 次)")
+        if report_path:
+            print(f"运行报告已保存: {report_path}")
+
+        print(f"\n{'='*50}")
+        print("分析完成!  运行 'python main.py web' 查看Web界面")
+        print(f"{'='*50}")
+    finally:
+        # 提前返回或出错时也要停止 cProfile/tracemalloc
+        profiler.stop()
+        db.close()
+
+
+def save_file_results(db: Database, project_id: int, results, file_ids: Dict[str, int],
+                      profiler: RunProfiler) -> List:
+    """写入工作进程返回的分析结果, 新文件行加入 file_ids; 返回跳过的文件"""
+    all_functions, skipped = [], []
+    results = iter(results)
+    while True:
+        # 读取blob、解析与签名在工作进程中完成, 各步骤耗时随结果返回;
+        # wait_results 为主进程等待结果的时间(含排队与超时等待)
+        with profiler.stage("wait_results"):
+            result = next(results, None)
+        if result is None:
+            break
+        for stage, seconds in result.timings.items():
+            profiler.add(stage, seconds)
+        if result.skipped:
+            skipped.append(result)
+            profiler.count("files_skipped")
+            continue
+        profiler.count("files")
+        profiler.count("bytes", result.size)
+        with profiler.stage("db_write"):
+            file_id = db.save_file_stats(project_id, result.metrics, result.blob_sha)
+            db.save_file_signature(project_id, file_id, result.signature)
+        profiler.count("rows_written", 1)
+        file_ids[result.file_path] = file_id
+        all_functions.extend((file_id, f) for f in result.metrics.functions)
+
+    with profiler.stage("db_write"):
+        db.save_skipped_files(project_id, skipped)
+        # 批量保存函数信息
+        db.save_functions(project_id, all_functions)
+    profiler.count("rows_written", len(all_functions))
+    return skipped
+
+
+def save_snapshot(db: Database, project_id: int, head_sha: str, committed_at: datetime,
+                  file_ids: Dict[str, int], profiler: RunProfiler) -> Dict:
+    """保存快照并更新项目统计"""
+    with profiler.stage("db_write"):
+        snapshot_id = db.save_snapshot(project_id, head_sha, committed_at, file_ids.values())
+        snapshot = db.find_snapshot(project_id, str(snapshot_id))
+        db.save_project_stats(project_id, snapshot)
+    return snapshot
+
+
+def batch_analyze(list_file: str, max_commits: int = 100, limits: FileLimits = None,
+                  workers: int = None, concurrency: int = 8, writers: int = 4):
+    """批量分析仓库列表(每行一个URL或本地路径, #开头为注释)
+
+    各仓库的提交与文件由异步采集器并发读取, 分析线程从队列中取出文件后立即交给进程池;
+    写库由 writers 个线程完成, 同一数据库文件的写入按写锁串行
+    """
+    with open(list_file, encoding='utf-8') as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    db = open_db()
+    repos = {}
+    for url in urls:
+        try:
+            collector = GitCollector(url, "data/repos")
+        except ValueError as e:
+            print(f"跳过 {url}: {e}")
+            continue
+        if collector.clone():
+            repos[collector.local_path] = url
+        else:
+            print(f"跳过 {url}: 仓库克隆/打开失败")
+
+    print(f"批量分析 {len(repos)} 个仓库 (并发 {concurrency})\n")
+    start = time.perf_counter()
+    asyncio.run(_batch_pipeline(db, repos, max_commits, limits or FileLimits(), workers,
+                                concurrency, writers))
+    print(f"\n完成, 共 {time.perf_counter() - start:.2f} 秒")
+    db.close()
+
+
+@dataclass
+class _BatchRepo:
+    """批量分析中一个仓库的进度"""
+    repo: CollectedRepo
+    profiler: RunProfiler
+    reused: Dict[str, int]
+    results: List = field(default_factory=list)
+    pending: int = 0
+    done: bool = False
+
+
+async def _batch_pipeline(db: Database, repos: Dict[str, str], max_commits: int,
+                          limits: FileLimits, workers: int, concurrency: int, writers: int):
+    queue = asyncio.Queue(maxsize=256)
+    producer = asyncio.ensure_future(collect_repos(repos, queue, concurrency, max_commits,
+                                                   max_bytes=limits.max_bytes))
+    loop = asyncio.get_running_loop()
+
+    def items():
+        """在分析线程中阻塞读取采集队列"""
+        while (item := asyncio.run_coroutine_threadsafe(queue.get(), loop).result()) is not None:
+            yield item
+
+    with GuardedPool(None, limits, workers) as pool, \
+            ThreadPoolExecutor(max_workers=1) as analysis, \
+            ThreadPoolExecutor(max_workers=writers) as writer:
+        # 分析在线程中进行, 文件到达即交给进程池; 仓库的结果齐全后交给写线程, 不同分片的写入并行
+        writes = await loop.run_in_executor(analysis, _analyze_stream, db, pool, items(), repos, writer)
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in writes))
+    await producer
+
+
+def _analyze_stream(db: Database, pool: GuardedPool, items: Iterator, repos: Dict[str, str],
+                    writer: ThreadPoolExecutor) -> List[Future]:
+    """消费采集结果并分析未变化文件以外的文件(项目已存在时复用已有结果)
+
+    内容相同的文件分析结果相同, 因此按 (路径, blob SHA) 将结果分配给等待中的仓库;
+    仓库采集完成且结果齐全时提交写库任务, 返回写库任务列表
+    """
+    states: Dict[str, _BatchRepo] = {}
+    waiting: Dict[Tuple[str, str], Deque[str]] = {}
+    writes = []
+
+    def finish(state: _BatchRepo):
+        if state.done and not state.pending:
+            path = state.repo.repo_path
+            del states[path]
+            writes.append(writer.submit(_store_collected, db, repos[path], state.repo,
+                                        state.results, state.profiler))
+
+    def tasks():
+        for item in items:
+            if isinstance(item, CollectedRepo):
+                profiler = RunProfiler()
+                profiler.start()
+                with profiler.stage("db_read"):
+                    project_id = db.find_project(item.name)
+                    reused = db.find_file_rows(project_id, item.blobs) if project_id else {}
+                states[item.repo_path] = _BatchRepo(item, profiler, reused)
+            elif isinstance(item, CollectedFile):
+                state = states[item.repo_path]
+                if item.file_path in state.reused:
+                    continue
+                state.pending += 1
+                waiting.setdefault((item.file_path, item.blob_sha), deque()).append(item.repo_path)
+                yield item.file_path, item.blob_sha, item.size, item.content
+            elif item.error:
+                # 已提交的文件结果到达时直接丢弃
+                states.pop(item.repo_path, None)
+                print(f"  {repos[item.repo_path]}: 采集失败 {item.error}")
+            else:
+                states[item.repo_path].done = True
+                finish(states[item.repo_path])
+
+    for result in pool.imap(tasks()):
+        key = (result.file_path, result.blob_sha)
+        repo_path = waiting[key].popleft()
+        if not waiting[key]:
+            del waiting[key]
+        state = states.get(repo_path)
+        if state:
+            state.results.append(result)
+            state.pending -= 1
+            finish(state)
+    return writes
+
+
+def _store_collected(db: Database, url: str, repo: CollectedRepo, results: List,
+                     profiler: RunProfiler):
+    # save_project 自行持有项目所在文件的写锁, 不会与其他写线程的长事务冲突
+    project_id = db.save_project(repo.name, url)
+    with db.write_lock(project_id):
+        with profiler.stage("db_write"):
+            db.save_commits(project_id, repo.commits, repo.mailmap)
+        profiler.count("commits", len(repo.commits))
+        with profiler.stage("db_read"):
+            file_ids = db.find_file_rows(project_id, repo.blobs)
+        profiler.count("files_reused", len(file_ids))
+
+        analyzed = {r.file_path for r in results}
+        file_ids = {path: fid for path, fid in file_ids.items() if path not in analyzed}
+        skipped = save_file_results(db, project_id, results, file_ids, profiler)
+        snapshot = save_snapshot(db, project_id, repo.head_sha, repo.committed_at, file_ids, profiler)
+        profiler.stop()
+        db.save_run(project_id, profiler.report())
+    print(f"  {repo.name}: {len(repo.commits)} 个提交, {snapshot['total_files']} 个文件, "
+          f"跳过 {len(skipped)} 个")
+
+
+def diff_analyze(repo_url: str, rev_range: str, limits: FileLimits = None, workers: int = None):
+    """比较两个修订版本之间变化文件的度量"""
+    if '..' not in rev_range:
+        print("修订范围格式应为 <ref1>..<ref2>")
+        return
+    old_rev, new_rev = rev_range.split('..', 1)
+    new_rev = new_rev.lstrip('.') or 'HEAD'
 
     collector = GitCollector(repo_url, "data/repos")
     if not collector.clone():
         print("仓库克隆/打开失败!")
         return
+    if resolve_revision(collector, old_rev) is None or resolve_revision(collector, new_rev) is None:
+        return
 
-    # 保存项目
-    project_id = db.save_project(collector.repo_name, repo_url)
-    print(f"项目ID: {project_id}\n")
-
-    # 获取提交
-    print("正在获取提交历史...")
-    commits = list(collector.get_commits(max_count=max_commits))
-    print(f"获取到 {len(commits)} 个提交\n")
-
-    # 保存提交信息
-    print("正在保存提交信息...")
-    for commit in commits:
-        db.save_commit(project_id, commit)
-    print(f"已保存 {len(commits)} 个提交\n")
-
-    # 分析当前代码
-    print("正在分析当前代码...")
-    python_files = collector.get_python_files()
-    print(f"找到 {len(python_files)} 个Python文件\n")
-
-    total_loc = 0
-    total_functions = 0
-    total_classes = 0
-    all_smells = []
-
-    for file_path in python_files:
-        content = collector.get_current_file(file_path)
-        if content:
-            analyzer = CodeAnalyzer(content, file_path)
-            metrics = analyzer.analyze()
-            if metrics:
-                db.save_file_stats(project_id, metrics)
-                total_loc += metrics. loc
-                total_functions += metrics.functions_count
-                total_classes += metrics. classes_count
-                all_smells.extend(metrics.code_smells)
-
-    # 保存项目统计
-    db.save_project_stats(project_id, {
-        'total_files': len(python_files),
-        'total_loc': total_loc,
-        'total_functions': total_functions,
-        'total_classes': total_classes,
-        'total_smells': len(all_smells)
-    })
-      # 输出结果
-    print(f"{'='*50}")
-    print("分析结果")
-    print(f"{'='*50}")
-    print(f"Python文件数: {len(python_files)}")
-    print(f"总代码行数:  {total_loc}")
-    print(f"函数总数: {total_functions}")
-    print(f"类总数: {total_classes}")
-    print(f"代码异味数: {len(all_smells)}")
-
-    if all_smells:
-        print(f"\n代码异味详情 (前10个):")
-        for smell in all_smells[:10]:
-            print(f"  - {smell}")
-
-    # 贡献者统计
-    contributors = db.get_contributor_stats(project_id)
-    print(f"\n贡献者排名 (前5名):")
-    for i, c in enumerate(contributors[:5], 1):
-        print(f"  {i}. {c['author']}: {c['commits']} 次提交")
-
-    print(f"\n{'='*50}")
-    print("分析完成!  运行 'python main.py web' 查看Web界面")
-    print(f"{'='*50}")
+    changes = collector.get_changed_python_files(old_rev, new_rev)
+    print(f"{old_rev}..{new_rev}: {len(changes)} 个Python文件发生变化\n")
+    if not changes:
+        return
 
-    db.close()
+    # 只读取发生变化的blob, 在受资源限制的工作进程中分析
+    old_blobs, new_blobs = collector.get_python_blobs(old_rev), collector.get_python_blobs(new_rev)
+    with GuardedPool(collector.local_path, limits, workers) as pool:
+        old_results = {r.file_path: r for r in pool.imap(
+            (old, old_blobs[old]) for old, _ in changes if old in old_blobs)}
+        new_results = {r.file_path: r for r in pool.imap(
+            (new, new_blobs[new]) for _, new in changes if new in new_blobs)}
+    # 被跳过的文件没有度量, 不参与比较(否则会被当作新增或删除)
+    skipped = [(rev, r) for rev, results in ((old_rev, old_results), (new_rev, new_results))
+               for r in results.values() if r.skipped]
+    old_metrics = {path: r.metrics for path, r in old_results.items() if not r.skipped}
+    new_metrics = {path: r.metrics for path, r in new_results.items() if not r.skipped}
+
+    print(f"{'文件':<50} {'行数':>8} {'函数':>6} {'最大复杂度':>10} {'异味':>6}")
+    for old_path, new_path in changes:
+        if (old_path and old_path not in old_metrics) or (new_path and new_path not in new_metrics):
+            continue
+        old = old_metrics.get(old_path) if old_path else None
+        new = new_metrics.get(new_path) if new_path else None
+
+        def delta(attr):
+            return (getattr(new, attr) if new else 0) - (getattr(old, attr) if old else 0)
+
+        smells = (len(new.code_smells) if new else 0) - (len(old.code_smells) if old else 0)
+        label = new_path or f"{old_path} (已删除)"
+        if old_path and new_path and old_path != new_path:
+            label = f"{old_path} -> {new_path}"
+        elif not old_path:
+            label = f"{new_path} (新增)"
+        print(f"{label:<50} {delta('loc'):>+8} {delta('functions_count'):>+6} "
+              f"{delta('max_complexity'):>+10} {smells:>+6}")
+    if skipped:
+        print(f"\n跳过文件数: {len(skipped)}")
+        for rev, result in skipped:
+            print(f"  - {rev}:{result.file_path}: {result.skipped} {result.detail}")
+
+
+def show_delta(project_id: int, old_ref: str = None, new_ref: str = None, as_json: bool = False):
+    """比较项目的两个分析快照"""
+    db = open_db()
+    snapshots = db.get_snapshots(project_id)
+    if not old_ref or not new_ref:
+        print(f"项目 {project_id} 的快照:")
+        for s in snapshots:
+            print(f"  {s['id']}: {s['commit_sha'][:10]} {s['committed_at']} "
+                  f"({s['total_files']} 文件, {s['total_loc']} 行)")
+        for a in db.get_archives(project_id):
+            print(f"  归档 {a['id']}: {a['snapshots']} 个快照 {a['first_committed_at']} ~ "
+                  f"{a['last_committed_at']} ({a['path']})")
+        return
+
+    old, new = db.find_snapshot(project_id, old_ref), db.find_snapshot(project_id, new_ref)
+    if not old or not new:
+        print(f"找不到快照: {old_ref if not old else new_ref}")
+        return
+
+    delta = compute_delta(db, old, new)
+    if as_json:
+        print(json.dumps(delta, ensure_ascii=False, indent=2))
+        return
+
+    print(f"快照 {old['commit_sha'][:10]} -> {new['commit_sha'][:10]}: {delta['files_changed']} 个文件变化")
+    for name, change in delta['summary'].items():
+        print(f"  {name}: {change['old']} -> {change['new']} ({change['delta']:+})")
+    for f in delta['files']:
+        print(f"\n[{f['status']}] {f['file_path']}")
+        for name, change in f['metrics'].items():
+            print(f"    {name}: {change['old']} -> {change['new']} ({change['delta']:+})")
+        for smell in f['smells_added']:
+            print(f"    + {smell}")
+        for smell in f['smells_removed']:
+            print(f"    - {smell}")
+        for func in f['functions']:
+            detail = ', '.join(f"{k} {v['old']}->{v['new']}" for k, v in func['metrics'].items())
+            print(f"    函数 {func['name']} [{func['status']}] {detail}")
 
 
 def run_web(port: int = 5000):
     """启动Web"""
     from src.web_app import create_app
-    app = create_app("data/analysis.db")
+    app = create_app(DB_PATH)
     print(f"启动Web:  http://127.0.0.1:{port}")
     app.run(host="127.0.0.1", port=port, debug=True)
 
 
-def clear_data():
-    """清除数据"""
-    if os.path.exists("data/analysis.db"):
-        os.remove("data/analysis.db")
+def find_similar(file_id: int, threshold: float = 0.5, limit: int = 20):
+    """查找相似文件"""
+    db = open_db()
+    results = db.find_similar_files(file_id, threshold, limit)
+    if not results:
+        print(f"文件 {file_id} 没有相似文件")
+        return
+
+    print(f"与文件 {file_id} 相似的文件:")
+    for r in results:
+        print(f"  [{r['similarity']:.2f}] {r['project_name']}/{r['file_path']} (ID: {r['file_id']})")
+
+
+def show_complexity(project_id: int, order_by: str = "complexity", top_k: int = 10):
+    """查看函数复杂度统计"""
+    db = open_db()
+    project = db.get_project(project_id)
+    if not project:
+        print(f"项目 {project_id} 不存在")
+        return
+
+    label = "圈复杂度" if order_by == "complexity" else "行数"
+    print(f"=== {project['name']}: {label}最高的 {top_k} 个函数 ===")
+    for i, f in enumerate(db.get_top_functions(project_id, order_by, top_k), 1):
+        print(f"  {i}. {f['file_path']}:{f['line_start']} {f['name']} "
+              f"(复杂度 {f['complexity']}, {f['line_count']} 行)")
+
+    print("\n=== 圈复杂度分布 ===")
+    for complexity, count in db.get_complexity_histogram(project_id).items():
+        print(f"  {complexity:>4}: {count}")
+
+    print(f"\n=== 最复杂的 {top_k} 个文件 ===")
+    for f in db.get_file_complexity(project_id, top_k):
+        print(f"  {f['file_path']}: 最大 {f['max_complexity']}, 平均 {f['avg_complexity']:.2f}")
+
+
+def search(query: str, project_id: int = None, limit: int = 20):
+    """全文搜索提交信息与文件路径"""
+    db = open_db()
+
+    commits = db.search_commits(query, project_id, limit)
+    print(f"=== 提交 ({len(commits)}) ===")
+    for c in commits:
+        snippet = c['snippet'].replace('<mark>', '[').replace('</mark>', ']')
+        print(f"  {c['project_name']} {c['sha'][:8]} {c['author']}: {html.unescape(snippet)}")
+
+    files = db.search_files(query, project_id, limit)
+    print(f"\n=== 文件 ({len(files)}) ===")
+    for f in files:
+        print(f"  {f['project_name']}/{f['file_path']} ({f['loc']} 行)")
+
+
+def compact_data(policy: RetentionPolicy):
+    """按保留策略清理、归档旧数据并整理数据库文件"""
+    db = open_db()
+    start = time.time()
+    result = compact(db, policy)
+    for name, counts in result['projects'].items():
+        print(f"  {name}: 删除 {counts['snapshots']} 个快照(归档 {counts['archived']} 个), "
+              f"{counts['files']} 个文件行, {counts['commits']} 个提交, {counts['runs']} 条运行记录")
+    storage = result['storage']
+    print(f"\n数据库 {storage['size_before'] / 1e6:.1f} MB -> {storage['size_after'] / 1e6:.1f} MB, "
+          f"用时 {time.time() - start:.2f} 秒")
+
+
+def clear_data(project: str = None):
+    """清除数据; 指定项目名时只删除该项目"""
+    if project:
+        db = open_db()
+        project_id = db.find_project(project)
+        if project_id is None:
+            print(f"项目不存在: {project}")
+            return
+        db.delete_project(project_id)
+        print(f"已删除项目 {project}")
+    elif os.path.isdir(DB_PATH):
+        shutil.rmtree(DB_PATH)
+        print("已清除分片数据库")
+    elif os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+        shutil.rmtree(os.path.join(os.path.dirname(DB_PATH), ARCHIVE_DIR), ignore_errors=True)
         print("已清除数据库")
     print("完成!")
 
 
+def add_limit_arguments(parser):
+    """单文件资源限制参数"""
+    defaults = FileLimits()
+    parser.add_argument("--max-file-bytes", type=int, default=defaults.max_bytes, help="单文件最大字节数(0为不限)")
+    parser.add_argument("--max-file-lines", type=int, default=defaults.max_lines, help="单文件最大行数(0为不限)")
+    parser.add_argument("--file-timeout", type=float, default=defaults.timeout, help="单文件分析超时秒数(0为不限)")
+    parser.add_argument("--max-depth", type=int, default=defaults.max_depth, help="语法树最大嵌套深度(0为不限)")
+    parser.add_argument("--max-memory-mb", type=int, default=defaults.max_memory_mb, help="工作进程内存上限MB(0为不限)")
+    parser.add_argument("-j", "--workers", type=int, help="分析进程数(默认为CPU核数)")
+
+
+def limits_from_args(args) -> FileLimits:
+    return FileLimits(max_bytes=args.max_file_bytes, max_lines=args.max_file_lines,
+                      timeout=args.file_timeout, max_depth=args.max_depth,
+                      max_memory_mb=args.max_memory_mb)
+
+
 def main():
+    global DB_PATH, SHARD_MODE, SHARD_BUCKETS
     parser = argparse.ArgumentParser(description="OSS代码分析工具")
+    parser.add_argument("--db", default=DB_PATH,
+                        help="数据库路径; 以.db结尾为单文件, 否则为分片目录")
+    parser.add_argument("--shard-mode", choices=SHARD_MODES, default=SHARD_MODE,
+                        help="新建分片目录时的分片方式: 每项目一个文件或按哈希分桶")
+    parser.add_argument("--shard-buckets", type=int, default=SHARD_BUCKETS, help="哈希分桶数")
     subparsers = parser.add_subparsers(dest="command")
 
     # analyze命令
     p1 = subparsers. add_parser("analyze", help="分析仓库")
     p1.add_argument("repo_url", help="仓库URL或本地路径")
     p1.add_argument("-n", "--max-commits", type=int, default=100, help="最大提交数")
+    p1.add_argument("--profile", action="store_true", help="启用cProfile与tracemalloc采集")
+    p1.add_argument("--report", help="将JSON运行报告写入文件")
+    p1.add_argument("--rev", help="要分析的修订版本(分支、标签或SHA)")
+    add_limit_arguments(p1)
+
+    # diff-analyze命令
+    p5 = subparsers.add_parser("diff-analyze", help="比较两个修订版本的代码度量")
+    p5.add_argument("repo_url", help="仓库URL或本地路径")
+    p5.add_argument("rev_range", help="修订范围, 如 v1.0..v2.0")
+    add_limit_arguments(p5)
+
+    # batch命令
+    p8 = subparsers.add_parser("batch", help="批量分析仓库列表文件中的仓库")
+    p8.add_argument("list_file", help="仓库列表文件, 每行一个URL或本地路径")
+    p8.add_argument("-n", "--max-commits", type=int, default=100, help="每个仓库的最大提交数")
+    p8.add_argument("-c", "--concurrency", type=int, default=8, help="同时运行的git子进程数")
+    p8.add_argument("-w", "--writers", type=int, default=4, help="写库线程数(分片存储时不同分片并行写入)")
+    add_limit_arguments(p8)
 
     # web命令
     p2 = subparsers. add_parser("web", help="启动Web界面")
     p2.add_argument("-p", "--port", type=int, default=5000, help="端口号")
 
+    # similar命令
+    p3 = subparsers.add_parser("similar", help="查找跨项目相似文件")
+    p3.add_argument("file_id", type=int, help="文件ID")
+    p3.add_argument("-t", "--threshold", type=float, default=0.5, help="相似度阈值")
+    p3.add_argument("-l", "--limit", type=int, default=20, help="最大结果数")
+
+    # complexity命令
+    p4 = subparsers.add_parser("complexity", help="查看函数复杂度统计")
+    p4.add_argument("project_id", type=int, help="项目ID")
+    p4.add_argument("--by", choices=["complexity", "line_count"], default="complexity", help="排序字段")
+    p4.add_argument("-k", "--top", type=int, default=10, help="显示前K个")
+
+    # delta命令
+    p6 = subparsers.add_parser("delta", help="比较两个分析快照的度量变化")
+    p6.add_argument("project_id", type=int, help="项目ID")
+    p6.add_argument("from_ref", nargs="?", help="起始快照ID或提交SHA(省略则列出快照)")
+    p6.add_argument("to_ref", nargs="?", help="目标快照ID或提交SHA")
+    p6.add_argument("--json", action="store_true", help="以JSON输出")
+
+    # search命令
+    p7 = subparsers.add_parser("search", help="全文搜索提交信息与文件路径")
+    p7.add_argument("query", help="搜索关键词")
+    p7.add_argument("-p", "--project", type=int, help="限定项目ID")
+    p7.add_argument("-l", "--limit", type=int, default=20, help="最大结果数")
+
+    # compact命令
+    defaults = RetentionPolicy()
+    p9 = subparsers.add_parser("compact", help="按保留策略清理与归档旧数据, 整理数据库文件")
+    p9.add_argument("--keep-snapshots", type=int, default=defaults.keep_snapshots,
+                    help="每个项目保留的最近快照数(0为不限)")
+    p9.add_argument("--commit-days", type=int, default=defaults.commit_days,
+                    help="原始提交保留天数(0为不限), 活动汇总永久保留")
+    p9.add_argument("--run-days", type=int, default=defaults.run_days, help="运行记录保留天数(0为不限)")
+    p9.add_argument("--no-archive", action="store_true", help="直接删除旧快照, 不归档")
+
     # clear命令
-    subparsers.add_parser("clear", help="清除数据")
+    p10 = subparsers.add_parser("clear", help="清除数据")
+    p10.add_argument("-p", "--project", help="只删除指定名称的项目")
 
     args = parser.parse_args()
+    DB_PATH, SHARD_MODE, SHARD_BUCKETS = args.db, args.shard_mode, args.shard_buckets
     os.makedirs("data/repos", exist_ok=True)
 
     if args.command == "analyze":
-        analyze_repository(args.repo_url, args. max_commits)
+        analyze_repository(args.repo_url, args. max_commits, args.profile, args.report, args.rev,
+                           limits_from_args(args), args.workers)
+    elif args.command == "diff-analyze":
+        diff_analyze(args.repo_url, args.rev_range, limits_from_args(args), args.workers)
+    elif args.command == "batch":
+        batch_analyze(args.list_file, args.max_commits, limits_from_args(args), args.workers,
+                      args.concurrency, args.writers)
     elif args.command == "web":
         run_web(args.port)
+    elif args.command == "similar":
+        find_similar(args.file_id, args.threshold, args.limit)
+    elif args.command == "complexity":
+        show_complexity(args.project_id, args.by, args.top)
+    elif args.command == "delta":
+        show_delta(args.project_id, args.from_ref, args.to_ref, args.json)
+    elif args.command == "search":
+        search(args.query, args.project, args.limit)
+    elif args.command == "compact":
+        compact_data(RetentionPolicy(args.keep_snapshots, args.commit_days, args.run_days,
+                                     not args.no_archive))
     elif args.command == "clear":
-        clear_data()
+        clear_data(args.project)
     else:
         parser. print_help()
 
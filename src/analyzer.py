@@ -2,11 +2,24 @@
 Python代码分析模块
 """
 import ast
+import sys
 from typing import List, Optional
 from dataclasses import dataclass, field
 
+from .records import SLOTS
 
-@dataclass
+# 代码异味阈值
+MAX_FUNCTION_LINES = 50
+MAX_PARAMS = 5
+MAX_COMPLEXITY = 10
+MAX_CLASS_LINES = 300
+
+# 增加圈复杂度的分支节点
+_BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp,
+                 ast.ExceptHandler, ast.Assert, ast.comprehension)
+
+
+@dataclass(**SLOTS)
 class FunctionInfo:
     """函数信息"""
     name: str
@@ -14,3 +27,123 @@ class FunctionInfo:
     line_count: int
     params_count: int
     complexity: int
+
+
+@dataclass(**SLOTS)
+class FileMetrics:
+    """文件度量"""
+    file_path: str
+    loc: int = 0
+    sloc: int = 0
+    functions_count: int = 0
+    classes_count: int = 0
+    imports_count: int = 0
+    functions: List[FunctionInfo] = field(default_factory=list)
+    code_smells: List[str] = field(default_factory=list)
+
+    @property
+    def avg_complexity(self) -> float:
+        if not self.functions:
+            return 0.0
+        return sum(f.complexity for f in self.functions) / len(self.functions)
+
+    @property
+    def max_complexity(self) -> int:
+        return max((f.complexity for f in self.functions), default=0)
+
+    def to_dict(self) -> dict:
+        return {
+            'file_path': self.file_path,
+            'loc': self.loc,
+            'sloc': self.sloc,
+            'functions_count': self.functions_count,
+            'classes_count': self.classes_count,
+            'imports_count': self.imports_count,
+            'avg_complexity': round(self.avg_complexity, 2),
+            'max_complexity': self.max_complexity,
+            'code_smells': ','.join(self.code_smells),
+        }
+
+
+def cyclomatic_complexity(func_node) -> int:
+    """计算函数圈复杂度(不含嵌套函数与类)"""
+    complexity = 1
+    stack = list(ast.iter_child_nodes(func_node))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, _BRANCH_NODES):
+            complexity += 1
+            if isinstance(node, ast.comprehension):
+                complexity += len(node.ifs)
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        stack.extend(ast.iter_child_nodes(node))
+    return complexity
+
+
+class CodeAnalyzer:
+    """Python代码分析器"""
+
+    def __init__(self, source_code: str, file_path: str = ""):
+        self.source_code = source_code
+        self.file_path = file_path
+
+    def analyze(self, tree: Optional[ast.AST] = None) -> Optional[FileMetrics]:
+        """分析代码, 语法错误时返回None; 可传入已解析的语法树避免重复解析"""
+        if tree is None:
+            try:
+                tree = ast.parse(self.source_code)
+            except (SyntaxError, ValueError):
+                return None
+
+        lines = self.source_code.splitlines()
+        metrics = FileMetrics(file_path=sys.intern(self.file_path), loc=len(lines))
+        metrics.sloc = sum(1 for line in lines
+                           if line.strip() and not line.strip().startswith('#'))
+
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                metrics.functions.append(self._analyze_function(node))
+            elif isinstance(node, ast.ClassDef):
+                metrics.classes_count += 1
+                class_lines = self._line_count(node)
+                if class_lines > MAX_CLASS_LINES:
+                    metrics.code_smells.append(
+                        f"过大类: {node.name} (第{node.lineno}行 {class_lines}行)")
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                metrics.imports_count += 1
+
+        metrics.functions_count = len(metrics.functions)
+        for func in metrics.functions:
+            metrics.code_smells.extend(self._function_smells(func))
+        return metrics
+
+    def _analyze_function(self, node) -> FunctionInfo:
+        args = node.args
+        params = len(args.posonlyargs) + len(args.args) + len(args.kwonlyargs)
+        params += (args.vararg is not None) + (args.kwarg is not None)
+        return FunctionInfo(
+            name=node.name,
+            line_start=node.lineno,
+            line_count=self._line_count(node),
+            params_count=params,
+            complexity=cyclomatic_complexity(node),
+        )
+
+    @staticmethod
+    def _line_count(node) -> int:
+        end = getattr(node, 'end_lineno', None) or node.lineno
+        return end - node.lineno + 1
+
+    @staticmethod
+    def _function_smells(func: FunctionInfo) -> List[str]:
+        smells = []
+        if func.line_count > MAX_FUNCTION_LINES:
+            smells.append(f"过长函数: {func.name} (第{func.line_start}行 {func.line_count}行)")
+        if func.params_count > MAX_PARAMS:
+            smells.append(f"参数过多: {func.name} (第{func.line_start}行 {func.params_count}个参数)")
+        if func.complexity > MAX_COMPLEXITY:
+            smells.append(f"复杂度过高: {func.name} (第{func.line_start}行 复杂度{func.complexity})")
+        return smells
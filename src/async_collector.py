@@ -0,0 +1,228 @@
+"""
+异步Git数据采集模块
+以asyncio子进程驱动 git log / git ls-tree / git cat-file, 在信号量限制下并发读取多个本地仓库,
+采集结果写入异步队列供分析阶段消费
+"""
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from git.exc import GitCommandError
+
+from .collector import SKIP_DIRS
+from .identity import Mailmap
+from .records import CommitBatch, make_commit
+
+# git log 输出格式: 记录分隔符后为 SHA、作者、邮箱、提交时间戳、完整信息, 以NUL分隔
+_LOG_FORMAT = '%x1e%H%x00%an%x00%ae%x00%ct%x00%B%x00'
+# read_blobs 每次 git cat-file --batch 读取的blob数
+_BLOB_CHUNK = 64
+
+
+@dataclass
+class CollectedRepo:
+    """一个仓库的提交与文件列表, 在该仓库的文件之前入队"""
+    repo_path: str
+    name: str
+    head_sha: str
+    committed_at: datetime
+    commits: CommitBatch
+    mailmap: Mailmap
+    blobs: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class CollectedFile:
+    """一个Python文件; 超过大小限制时 content 为None"""
+    repo_path: str
+    file_path: str
+    blob_sha: str
+    size: int
+    content: Optional[str]
+
+
+@dataclass
+class RepoDone:
+    """仓库的全部文件均已入队; error 非空表示采集失败"""
+    repo_path: str
+    error: Optional[str] = None
+
+
+class AsyncGitCollector:
+    """本地仓库的异步只读采集器"""
+
+    def __init__(self, repo_path: str, semaphore: Optional[asyncio.Semaphore] = None):
+        self.repo_path = repo_path
+        self.repo_name = os.path.basename(os.path.abspath(repo_path))
+        self.semaphore = semaphore or asyncio.Semaphore(1)
+
+    async def _git(self, *args: str) -> bytes:
+        """运行git子命令并返回标准输出"""
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                'git', '-C', self.repo_path, *args,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise GitCommandError(['git', *args], process.returncode, stderr)
+        return stdout
+
+    async def resolve(self, rev: Optional[str] = None) -> Tuple[str, datetime]:
+        """解析修订版本, 返回 (提交SHA, 提交时间); 提交时间带提交者时区, 与 committed_datetime 一致"""
+        output = await self._git('log', '-1', '--format=%H %cI', rev or 'HEAD', '--')
+        sha, committed_at = output.decode().split()
+        return sha, datetime.fromisoformat(committed_at)
+
+    async def get_default_branch(self) -> str:
+        """获取默认分支, 规则与 GitCollector 相同"""
+        try:
+            ref = (await self._git('symbolic-ref', '--short', 'refs/remotes/origin/HEAD')).decode().strip()
+            if ref:
+                return ref
+        except GitCommandError:
+            pass
+        for branch in ('main', 'master'):
+            try:
+                await self._git('rev-parse', '--verify', '--quiet', f'refs/heads/{branch}')
+                return branch
+            except GitCommandError:
+                continue
+        return 'HEAD'
+
+    async def get_commit_batch(self, max_count: int = 100, rev: Optional[str] = None) -> CommitBatch:
+        """获取提交历史; 增删行数与 GitCollector 一致, 按第一个父提交计算"""
+        branch = rev or await self.get_default_branch()
+        output = await self._git('log', f'--max-count={max_count}', f'--format={_LOG_FORMAT}',
+                                 '--numstat', '--no-renames', '--diff-merges=first-parent',
+                                 branch, '--')
+        batch = CommitBatch()
+        for record in output.decode('utf-8', errors='replace').split('\x1e')[1:]:
+            sha, author, email, timestamp, message, stats = record.split('\x00', 5)
+            files = insertions = deletions = 0
+            for line in stats.splitlines():
+                parts = line.split('\t')
+                if len(parts) != 3:
+                    continue
+                files += 1
+                insertions += int(parts[0]) if parts[0] != '-' else 0
+                deletions += int(parts[1]) if parts[1] != '-' else 0
+            batch.append(make_commit(sha, author or "Unknown", email, message.strip(), int(timestamp),
+                                     files, insertions, deletions))
+        return batch
+
+    async def get_python_blobs(self, rev: Optional[str] = None) -> Dict[str, str]:
+        """获取指定版本的所有Python文件及其blob SHA"""
+        output = await self._git('ls-tree', '-r', '-z', rev or 'HEAD')
+        blobs = {}
+        for entry in output.decode('utf-8', errors='replace').split('\x00'):
+            if not entry:
+                continue
+            meta, path = entry.split('\t', 1)
+            _, kind, sha = meta.split()
+            if kind != 'blob' or not path.endswith('.py'):
+                continue
+            if any(part.lower() in SKIP_DIRS for part in path.split('/')[:-1]):
+                continue
+            blobs[path] = sha
+        return blobs
+
+    async def get_mailmap(self, rev: Optional[str] = None) -> Mailmap:
+        """读取仓库的 .mailmap"""
+        try:
+            content = await self._git('cat-file', 'blob', f"{rev or 'HEAD'}:.mailmap")
+        except GitCommandError:
+            return Mailmap()
+        return Mailmap.from_text(content.decode('utf-8', errors='ignore'))
+
+    async def get_blob_sizes(self, shas: Iterable[str]) -> Dict[str, int]:
+        """用 git cat-file --batch-check 批量读取blob大小"""
+        shas = list(shas)
+        if not shas:
+            return {}
+        output = await self._cat_file('--batch-check', shas)
+        sizes = {}
+        for line in output.decode().splitlines():
+            parts = line.split()
+            if len(parts) == 3:
+                sizes[parts[0]] = int(parts[2])
+        return sizes
+
+    async def read_blobs(self, shas: Iterable[str]) -> AsyncIterator[Tuple[str, bytes]]:
+        """用 git cat-file --batch 分块读取blob内容
+
+        每块读完即释放信号量再逐个返回, 消费方阻塞(如队列已满)时不占用子进程名额
+        """
+        shas = list(shas)
+        for start in range(0, len(shas), _BLOB_CHUNK):
+            output = await self._cat_file('--batch', shas[start:start + _BLOB_CHUNK])
+            offset = 0
+            while offset < len(output):
+                end = output.index(b'\n', offset)
+                header = output[offset:end].decode().split()
+                offset = end + 1
+                if len(header) != 3:  # "<sha> missing"
+                    continue
+                size = int(header[2])
+                if offset + size > len(output):
+                    raise ValueError(f"git cat-file 输出不完整: {header[0]}")
+                yield header[0], output[offset:offset + size]
+                offset += size + 1
+
+    async def _cat_file(self, mode: str, shas: List[str]) -> bytes:
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                'git', '-C', self.repo_path, 'cat-file', mode,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+            stdout, stderr = await process.communicate(''.join(f'{sha}\n' for sha in shas).encode())
+        if process.returncode != 0:
+            raise GitCommandError(['git', 'cat-file', mode], process.returncode, stderr)
+        return stdout
+
+
+async def collect_repo(collector: AsyncGitCollector, queue: asyncio.Queue, max_commits: int = 100,
+                       rev: Optional[str] = None, max_bytes: int = 0):
+    """采集一个仓库: 先入队 CollectedRepo, 再逐个入队 CollectedFile, 最后入队 RepoDone"""
+    path = collector.repo_path
+    try:
+        head_sha, committed_at = await collector.resolve(rev)
+        commits, blobs, mailmap = await asyncio.gather(
+            collector.get_commit_batch(max_count=max_commits, rev=rev),
+            collector.get_python_blobs(head_sha),
+            collector.get_mailmap(head_sha),
+        )
+        await queue.put(CollectedRepo(path, collector.repo_name, head_sha, committed_at,
+                                      commits, mailmap, blobs))
+
+        # 超过大小限制的blob只入队大小, 不读取内容
+        sizes = await collector.get_blob_sizes(set(blobs.values()))
+        paths_by_sha: Dict[str, List[str]] = {}
+        for file_path, sha in blobs.items():
+            if max_bytes and sizes.get(sha, 0) > max_bytes:
+                await queue.put(CollectedFile(path, file_path, sha, sizes[sha], None))
+            else:
+                paths_by_sha.setdefault(sha, []).append(file_path)
+
+        async for sha, data in collector.read_blobs(paths_by_sha):
+            content = data.decode('utf-8', errors='ignore')
+            for file_path in paths_by_sha[sha]:
+                await queue.put(CollectedFile(path, file_path, sha, len(data), content))
+    except (GitCommandError, OSError, ValueError, EOFError) as e:
+        await queue.put(RepoDone(path, str(e) or type(e).__name__))
+        return
+    await queue.put(RepoDone(path))
+
+
+async def collect_repos(repo_paths: Iterable[str], queue: asyncio.Queue, concurrency: int = 8,
+                        max_commits: int = 100, rev: Optional[str] = None, max_bytes: int = 0):
+    """并发采集多个仓库, 同时运行的git子进程数不超过 concurrency; 全部完成后入队None"""
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        await asyncio.gather(*(
+            collect_repo(AsyncGitCollector(path, semaphore), queue, max_commits, rev, max_bytes)
+            for path in repo_paths
+        ))
+    finally:
+        await queue.put(None)
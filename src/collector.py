@@ -4,10 +4,15 @@ Git仓库数据采集模块
 import os
 import re
 import shutil
-from datetime import datetime
-from typing import List, Dict, Optional, Generator
-from git import Repo
-from git.exc import GitCommandError, InvalidGitRepositoryError
+from typing import List, Dict, Optional, Generator, Tuple
+from git import Commit, Repo
+from git.exc import BadName, GitCommandError, InvalidGitRepositoryError
+
+from .identity import Mailmap
+from .records import CommitBatch, CommitRecord, make_commit
+
+# 查找Python文件时跳过的目录
+SKIP_DIRS = {'__pycache__', 'venv', 'env', '.git', 'node_modules', '.tox', 'build', 'dist'}
 
 
 class GitCollector:
@@ -70,6 +75,14 @@ class GitCollector:
 
     def get_default_branch(self) -> str:
         """获取默认分支"""
+        # 优先使用远程仓库声明的默认分支 (origin/HEAD)
+        try:
+            ref = self.repo.git.symbolic_ref('refs/remotes/origin/HEAD', short=True)
+            if ref:
+                return ref
+        except GitCommandError:
+            pass
+
         for branch in ['main', 'master']:
             try:
                 self.repo.refs[branch]
@@ -78,75 +91,121 @@ class GitCollector:
                 continue
         return 'HEAD'
 
-    def get_commits(self, max_count:  int = 100) -> Generator[Dict, None, None]:
-        """获取提交历史"""
+    def resolve(self, rev: Optional[str] = None) -> Commit:
+        """解析修订版本(分支、标签、SHA等), 默认为HEAD"""
+        return self.repo.commit(rev or 'HEAD')
+
+    def get_commits(self, max_count:  int = 100, rev: Optional[str] = None) -> Generator[CommitRecord, None, None]:
+        """获取提交历史, rev 可为修订版本或范围(如 v1.0..v2.0)"""
         if not self.repo:
             return
 
-        branch = self.get_default_branch()
-        try:
-            commits = self.repo.iter_commits(branch, max_count=max_count)
-        except:
-            commits = self.repo.iter_commits('HEAD', max_count=max_count)
+        # iter_commits 在迭代时才解析版本; 指定的 rev 无效时在迭代中抛出 GitCommandError,
+        # 调用方应先用 resolve 校验. 默认分支无法解析时回退到HEAD
+        branch = rev
+        if not branch:
+            branch = self.get_default_branch()
+            try:
+                self.repo.rev_parse(branch)
+            except (BadName, ValueError):
+                branch = 'HEAD'
 
-        for commit in commits:
+        for commit in self.repo.iter_commits(branch, max_count=max_count):
             try:
                 stats = commit.stats. total
             except:
                 stats = {'files': 0, 'insertions': 0, 'deletions': 0}
 
-            yield {
-                'sha': commit.hexsha,
-                'author': commit.author.name if commit.author else "Unknown",
-                'email': commit.author.email if commit.author else "",
-                'message': commit.message. strip()[:200],
-                'date': datetime.fromtimestamp(commit. committed_date),
-                'files_changed': stats.get('files', 0),
-                'insertions':  stats.get('insertions', 0),
-                'deletions':  stats.get('deletions', 0),
-            }
-
-    def get_python_files(self) -> List[str]:
-        """获取所有Python文件"""
+            author = commit.author
+            yield make_commit(
+                commit.hexsha,
+                author.name if author else "Unknown",
+                author.email if author else "",
+                commit.message.strip(),
+                commit.committed_date,
+                stats.get('files', 0),
+                stats.get('insertions', 0),
+                stats.get('deletions', 0),
+            )
+
+    def get_commit_batch(self, max_count: int = 100, rev: Optional[str] = None) -> CommitBatch:
+        """获取提交历史并打包为列式批次"""
+        return CommitBatch(self.get_commits(max_count, rev))
+
+    def get_python_files(self, rev: Optional[str] = None) -> List[str]:
+        """获取指定版本的所有Python文件"""
+        return list(self.get_python_blobs(rev))
+
+    def get_python_blobs(self, rev: Optional[str] = None) -> Dict[str, str]:
+        """获取指定版本的所有Python文件及其blob SHA; 版本无效时抛出 BadName"""
         if not self.repo:
-            return []
+            return {}
 
-        try:
-            tree = self.repo.head.commit.tree
-            files = []
-            self._find_files(tree, '', files)
-            return files
-        except:
-            return []
+        files = {}
+        self._find_files(self.resolve(rev).tree, '', files)
+        return files
 
-    def _find_files(self, tree, prefix: str, result: List[str]):
+    def _find_files(self, tree, prefix: str, result: Dict[str, str]):
         """递归查找Python文件"""
-        skip_dirs = {'__pycache__', 'venv', 'env', '.git', 'node_modules', '. tox', 'build', 'dist'}
-
         for item in tree:
             path = f"{prefix}/{item.name}" if prefix else item.name
             if item. type == 'tree':
-                if item.name.lower() not in skip_dirs:
+                if item.name.lower() not in SKIP_DIRS:
                     self._find_files(item, path, result)
             elif item.type == 'blob' and item.name.endswith('.py'):
-                result.append(path)
+                result[path] = item.hexsha
+
+    def get_current_file(self, file_path: str, rev: Optional[str] = None) -> Optional[str]:
+        """从对象库读取指定版本的文件内容(默认HEAD), 不涉及工作区; 文件不存在时返回None"""
+        try:
+            blob = self.resolve(rev).tree / file_path
+        except KeyError:
+            return None
+        return blob. data_stream.read().decode('utf-8', errors='ignore')
+
+    def get_blob_size(self, blob_sha: str) -> int:
+        """按SHA读取blob大小, 不读取内容"""
+        return self.repo.odb.info(bytes.fromhex(blob_sha)).size
 
-    def get_current_file(self, file_path: str) -> Optional[str]:
-        """获取当前版本的文件内容"""
+    def read_blob(self, blob_sha: str) -> Optional[str]:
+        """按SHA读取blob内容"""
         try:
-            blob = self.repo.head.commit.tree / file_path
-            return blob. data_stream.read().decode('utf-8', errors='ignore')
+            return self.repo.odb.stream(bytes.fromhex(blob_sha)).read().decode('utf-8', errors='ignore')
         except:
             return None
 
-    def get_file_types_stats(self) -> Dict[str, int]:
+    def get_changed_python_files(self, old_rev: str, new_rev: str) -> List[Tuple[Optional[str], Optional[str]]]:
+        """比较两个版本的树, 返回发生变化的Python文件 (旧路径, 新路径); 新增或删除时一侧为None
+
+        与 get_python_blobs 一样跳过 SKIP_DIRS 下的文件
+        """
+        def python_path(path: Optional[str]) -> Optional[str]:
+            if not path or not path.endswith('.py'):
+                return None
+            return None if any(part.lower() in SKIP_DIRS for part in path.split('/')[:-1]) else path
+
+        old_commit, new_commit = self.resolve(old_rev), self.resolve(new_rev)
+        changes = []
+        for diff in old_commit.diff(new_commit):
+            old_path = python_path(diff.a_path if not diff.new_file else None)
+            new_path = python_path(diff.b_path if not diff.deleted_file else None)
+            if old_path or new_path:
+                changes.append((old_path, new_path))
+        return changes
+
+    def get_mailmap(self, rev: Optional[str] = None) -> Mailmap:
+        """读取仓库的 .mailmap"""
+        content = self.get_current_file('.mailmap', rev)
+        return Mailmap.from_text(content) if content else Mailmap()
+
+    def get_file_types_stats(self, rev: Optional[str] = None) -> Dict[str, int]:
         """统计文件类型"""
         if not self.repo:
             return {}
 
         stats = {}
         try:
-            tree = self.repo.head.commit.tree
+            tree = self.resolve(rev).tree
             self._count_file_types(tree, stats)
         except:
             pass
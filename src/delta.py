@@ -0,0 +1,92 @@
+"""
+快照差异模块
+比较两个分析快照之间的文件、函数度量与代码异味变化
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+FILE_METRICS = ('loc', 'sloc', 'functions_count', 'classes_count', 'imports_count',
+                'avg_complexity', 'max_complexity')
+FUNCTION_METRICS = ('line_count', 'params_count', 'complexity')
+SNAPSHOT_METRICS = ('total_files', 'total_loc', 'total_sloc', 'total_functions',
+                    'total_classes', 'total_smells', 'avg_complexity', 'max_complexity')
+
+# 异味描述中的行号会随上方代码的增删而变化, 比较时忽略
+_LINE_RE = re.compile(r'第\d+行\s*')
+
+
+def _metric_delta(old: Optional[Dict], new: Optional[Dict], names) -> Dict[str, Dict]:
+    result = {}
+    for name in names:
+        before = old[name] if old else 0
+        after = new[name] if new else 0
+        if before != after:
+            result[name] = {'old': before, 'new': after, 'delta': round(after - before, 4)}
+    return result
+
+
+def _smells(row: Optional[Dict]) -> Counter:
+    if not row or not row['code_smells']:
+        return Counter()
+    return Counter(_LINE_RE.sub('', s) for s in row['code_smells'].split(','))
+
+
+def _function_deltas(old_funcs: List[Dict], new_funcs: List[Dict]) -> List[Dict]:
+    """按函数名配对(同名函数按出现顺序), 返回新增、删除和度量变化的函数"""
+    old_by_name, new_by_name = defaultdict(list), defaultdict(list)
+    for f in old_funcs:
+        old_by_name[f['name']].append(f)
+    for f in new_funcs:
+        new_by_name[f['name']].append(f)
+
+    changes = []
+    for name in sorted(set(old_by_name) | set(new_by_name)):
+        olds, news = old_by_name.get(name, []), new_by_name.get(name, [])
+        for i in range(max(len(olds), len(news))):
+            old = olds[i] if i < len(olds) else None
+            new = news[i] if i < len(news) else None
+            metrics = _metric_delta(old, new, FUNCTION_METRICS)
+            if old and new and not metrics:
+                continue
+            changes.append({
+                'name': name,
+                'status': 'added' if not old else 'removed' if not new else 'modified',
+                'line_start': (new or old)['line_start'],
+                'metrics': metrics,
+            })
+    return changes
+
+
+def compute_delta(db, old_snapshot: Dict, new_snapshot: Dict) -> Dict:
+    """计算两个快照的差异; 只读取两侧不共享的文件行(即blob发生变化的文件)"""
+    old_only, new_only = db.get_snapshot_diff_files(old_snapshot['id'], new_snapshot['id'])
+    old_by_path = {f['file_path']: f for f in old_only}
+    new_by_path = {f['file_path']: f for f in new_only}
+    functions = db.get_file_functions([f['id'] for f in old_only + new_only])
+
+    files = []
+    for path in sorted(set(old_by_path) | set(new_by_path)):
+        old, new = old_by_path.get(path), new_by_path.get(path)
+        old_smells, new_smells = _smells(old), _smells(new)
+        files.append({
+            'file_path': path,
+            'status': 'added' if not old else 'removed' if not new else 'modified',
+            'metrics': _metric_delta(old, new, FILE_METRICS),
+            'smells_added': sorted((new_smells - old_smells).elements()),
+            'smells_removed': sorted((old_smells - new_smells).elements()),
+            'functions': _function_deltas(functions.get(old['id'], []) if old else [],
+                                          functions.get(new['id'], []) if new else []),
+        })
+
+    def describe(snapshot):
+        return {'id': snapshot['id'], 'commit_sha': snapshot['commit_sha'],
+                'committed_at': snapshot['committed_at']}
+
+    return {
+        'from': describe(old_snapshot),
+        'to': describe(new_snapshot),
+        'summary': _metric_delta(old_snapshot, new_snapshot, SNAPSHOT_METRICS),
+        'files_changed': len(files),
+        'files': files,
+    }
@@ -0,0 +1,291 @@
+"""
+分析资源限制模块
+文件在独立的工作进程中读取和分析; 超出大小、行数、耗时或嵌套深度限制的文件记为跳过,
+超时或崩溃的工作进程会被终止并重新创建
+"""
+import ast
+import multiprocessing
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .analyzer import CodeAnalyzer, FileMetrics
+from .collector import GitCollector
+from .records import SLOTS
+from .similarity import compute_signature
+
+try:
+    import resource
+except ImportError:  # Windows 不支持内存上限
+    resource = None
+
+# 跳过原因
+SKIP_TOO_LARGE = 'too_large'
+SKIP_TOO_MANY_LINES = 'too_many_lines'
+SKIP_TOO_DEEP = 'too_deep'
+SKIP_TIMEOUT = 'timeout'
+SKIP_OUT_OF_MEMORY = 'out_of_memory'
+SKIP_SYNTAX_ERROR = 'syntax_error'
+SKIP_UNREADABLE = 'unreadable'
+SKIP_WORKER_CRASHED = 'worker_crashed'
+
+# 工作进程由 forkserver(不支持时为 spawn)创建: 直接fork会复制调用时其他线程的状态,
+# 例如事件循环线程正在创建的git子进程的管道, 导致 subprocess 永远等不到exec结果
+_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+@dataclass
+class FileLimits:
+    """单文件分析限制, 取0表示不限制"""
+    max_bytes: int = 1_000_000
+    max_lines: int = 20_000
+    timeout: float = 10.0
+    max_depth: int = 500
+    max_memory_mb: int = 0
+
+
+@dataclass(**SLOTS)
+class FileResult:
+    """单个文件的分析结果; skipped 非空时表示文件被跳过"""
+    file_path: str
+    blob_sha: str
+    size: int = 0
+    metrics: Optional[FileMetrics] = None
+    signature: Optional[List[int]] = None
+    skipped: Optional[str] = None
+    detail: str = ''
+    # 工作进程内各步骤耗时(秒): read_blob / analyze / signature
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def ast_depth_exceeds(tree: ast.AST, limit: int) -> bool:
+    """语法树嵌套深度是否超过 limit; 逐层展开, 超过即提前返回"""
+    level, depth = [tree], 1
+    while level:
+        if depth > limit:
+            return True
+        level = [child for node in level for child in ast.iter_child_nodes(node)]
+        depth += 1
+    return False
+
+
+def analyze_source(file_path: str, blob_sha: str, size: int, content: Optional[str],
+                   limits: FileLimits) -> FileResult:
+    """按限制分析已读取的文件内容(耗时限制由进程池负责); 超过大小限制时 content 可为None"""
+    result = FileResult(file_path, blob_sha, size)
+    if limits.max_bytes and size > limits.max_bytes:
+        result.skipped, result.detail = SKIP_TOO_LARGE, f"{size} 字节 > {limits.max_bytes}"
+        return result
+    if content is None:
+        result.skipped = SKIP_UNREADABLE
+        return result
+    lines = content.count('\n') + (not content.endswith('\n'))
+    if limits.max_lines and lines > limits.max_lines:
+        result.skipped, result.detail = SKIP_TOO_MANY_LINES, f"{lines} 行 > {limits.max_lines}"
+        return result
+
+    start = time.perf_counter()
+    try:
+        tree = ast.parse(content)
+        if limits.max_depth and ast_depth_exceeds(tree, limits.max_depth):
+            result.skipped, result.detail = SKIP_TOO_DEEP, f"嵌套深度 > {limits.max_depth}"
+            return result
+        result.metrics = CodeAnalyzer(content, file_path).analyze(tree)
+        analyzed = time.perf_counter()
+        result.timings['analyze'] = analyzed - start
+        result.signature = compute_signature(content)
+        result.timings['signature'] = time.perf_counter() - analyzed
+    except (SyntaxError, ValueError) as e:
+        result.skipped, result.detail = SKIP_SYNTAX_ERROR, str(e)
+    except RecursionError as e:
+        result.skipped, result.detail = SKIP_TOO_DEEP, str(e)
+    except MemoryError:
+        result.skipped = SKIP_OUT_OF_MEMORY
+    return result
+
+
+def analyze_blob(collector: GitCollector, file_path: str, blob_sha: str,
+                 limits: FileLimits) -> FileResult:
+    """从对象库读取blob并按限制分析; 超过大小限制的blob不读取内容"""
+    start = time.perf_counter()
+    try:
+        size = collector.get_blob_size(blob_sha)
+    except Exception as e:
+        return FileResult(file_path, blob_sha, skipped=SKIP_UNREADABLE, detail=str(e))
+    content = None if limits.max_bytes and size > limits.max_bytes else collector.read_blob(blob_sha)
+    read_seconds = time.perf_counter() - start
+    result = analyze_source(file_path, blob_sha, size, content, limits)
+    result.timings['read_blob'] = read_seconds
+    return result
+
+
+def _worker_main(conn, repo_path: Optional[str], limits: FileLimits):
+    """工作进程: 打开仓库后发送就绪信号, 之后逐个处理任务
+
+    任务为 (路径, blob SHA) 时从仓库读取内容; 为 (路径, blob SHA, 大小, 内容) 时直接分析
+    """
+    if resource and limits.max_memory_mb:
+        size = limits.max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    collector = None
+    if repo_path:
+        collector = GitCollector(repo_path)
+        collector.clone()
+    conn.send(None)
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        if len(task) == 2:
+            conn.send(analyze_blob(collector, task[0], task[1], limits))
+        else:
+            conn.send(analyze_source(*task, limits))
+    conn.close()
+
+
+class _Worker:
+    __slots__ = ('process', 'conn', 'tasks', 'task', 'deadline')
+
+    def __init__(self, repo_path: Optional[str], limits: FileLimits):
+        self.conn, child_conn = _MP_CONTEXT.Pipe()
+        self.process = _MP_CONTEXT.Process(target=_worker_main,
+                                               args=(child_conn, repo_path, limits), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.task: Optional[Tuple] = None
+        self.deadline: Optional[float] = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class GuardedPool:
+    """可终止、可回收的分析进程池
+
+    每个工作进程同一时间只处理一个文件; 超时的进程被强制终止, 异常退出的进程记为崩溃,
+    处理 max_tasks_per_worker 个文件后进程会被回收以释放累积的内存。
+    repo_path 为None时任务须自带文件内容。
+    """
+
+    def __init__(self, repo_path: Optional[str], limits: Optional[FileLimits] = None,
+                 workers: Optional[int] = None, max_tasks_per_worker: int = 500):
+        self.repo_path = repo_path
+        self.limits = limits or FileLimits()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.killed = 0
+        self.recycled = 0
+        self._idle: List[_Worker] = []
+        self._starting: List[_Worker] = []
+        self._busy: Dict[object, _Worker] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for worker in self._busy.values():
+            worker.kill()
+        for worker in self._idle + self._starting:
+            worker.stop()
+        self._idle, self._starting, self._busy = [], [], {}
+
+    def _dispatch(self, pending: Deque[Tuple]):
+        """就绪的进程领取任务, 不足时按需启动新进程"""
+        timeout = self.limits.timeout
+        while pending and self._idle:
+            worker = self._idle.pop()
+            worker.task = pending.popleft()
+            worker.deadline = time.monotonic() + timeout if timeout else None
+            worker.conn.send(worker.task)
+            self._busy[worker.conn] = worker
+        while len(pending) > len(self._starting) and \
+                len(self._busy) + len(self._starting) < self.workers:
+            self._starting.append(_Worker(self.repo_path, self.limits))
+
+    def imap(self, tasks: Iterable[Tuple]) -> Iterator[FileResult]:
+        """分析 (路径, blob SHA[, 大小, 内容]) 任务, 按完成顺序返回结果
+
+        任务在有空闲容量时才从 tasks 中逐个拉取, tasks 可以是边采集边产生的阻塞迭代器;
+        阻塞等待新任务期间, 其他进程的结果与超时要到下一个任务到达后才处理
+        """
+        tasks = iter(tasks)
+        pending: Deque[Tuple] = deque()
+        exhausted = False
+        busy = self._busy
+        timeout = self.limits.timeout
+
+        while True:
+            while not exhausted and len(pending) + len(busy) < self.workers:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                pending.append(task)
+                self._dispatch(pending)
+            self._dispatch(pending)
+            if not pending and not busy:
+                break
+
+            deadlines = [w.deadline for w in busy.values() if w.deadline is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait(list(busy) + [w.conn for w in self._starting], timeout=wait_for)
+
+            for conn in ready:
+                starting = next((w for w in self._starting if w.conn is conn), None)
+                if starting:
+                    self._starting.remove(starting)
+                    try:
+                        conn.recv()
+                        self._idle.append(starting)
+                    except (EOFError, OSError):
+                        starting.kill()
+                        raise RuntimeError(f"分析进程启动失败: {self.repo_path}")
+                    continue
+
+                worker = busy.pop(conn)
+                try:
+                    result = conn.recv()
+                except (EOFError, OSError):
+                    code = worker.process.exitcode
+                    worker.kill()
+                    self.killed += 1
+                    yield FileResult(worker.task[0], worker.task[1],
+                                     skipped=SKIP_WORKER_CRASHED, detail=f"退出码 {code}")
+                    continue
+                worker.tasks += 1
+                if worker.tasks >= self.max_tasks_per_worker:
+                    worker.stop()
+                    self.recycled += 1
+                else:
+                    self._idle.append(worker)
+                yield result
+
+            now = time.monotonic()
+            for conn, worker in list(busy.items()):
+                if worker.deadline is not None and worker.deadline <= now and conn not in ready:
+                    del busy[conn]
+                    worker.kill()
+                    self.killed += 1
+                    yield FileResult(worker.task[0], worker.task[1], skipped=SKIP_TIMEOUT,
+                                     detail=f"超过 {timeout} 秒")
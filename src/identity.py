@@ -0,0 +1,71 @@
+"""
+贡献者身份识别模块
+按 .mailmap、邮箱和规范化姓名合并同一贡献者的不同身份
+"""
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+# 这些名字过于常见, 不能作为合并依据
+GENERIC_NAMES = {'', 'unknown', 'root', 'admin', 'user', 'ubuntu', 'github', 'none'}
+
+_MAILMAP_RE = re.compile(r'^\s*([^<]*?)\s*<([^>]*)>\s*(?:([^<]*?)\s*<([^>]*)>)?\s*$')
+
+
+def normalize_name(name: str) -> str:
+    """姓名规范化: Unicode归一、忽略大小写、合并空白"""
+    name = unicodedata.normalize('NFKC', name or '')
+    return ' '.join(name.casefold().split())
+
+
+def normalize_email(email: str) -> str:
+    return (email or '').strip().lower()
+
+
+class Mailmap:
+    """git .mailmap 解析器"""
+
+    def __init__(self):
+        # (提交邮箱, 提交姓名) -> (规范姓名, 规范邮箱), 姓名为空表示匹配任意姓名
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[str], Optional[str]]] = {}
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Mailmap':
+        mailmap = cls()
+        for line in text.splitlines():
+            line = line.split('#', 1)[0]
+            match = _MAILMAP_RE.match(line)
+            if not match:
+                continue
+            proper_name, proper_email, commit_name, commit_email = match.groups()
+            if commit_email is None:
+                # "Proper Name <commit@email>"
+                commit_email, proper_email = proper_email, None
+            key = (normalize_email(commit_email), normalize_name(commit_name or ''))
+            mailmap._entries[key] = (proper_name or None, proper_email or None)
+        return mailmap
+
+    def resolve(self, name: str, email: str) -> Tuple[str, str]:
+        """返回映射后的(姓名, 邮箱)"""
+        email_key = normalize_email(email)
+        entry = (self._entries.get((email_key, normalize_name(name)))
+                 or self._entries.get((email_key, '')))
+        if not entry:
+            return name, email
+        proper_name, proper_email = entry
+        return proper_name or name, proper_email or email
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def identity_keys(name: str, email: str):
+    """生成用于合并身份的别名键"""
+    keys = []
+    email = normalize_email(email)
+    if email:
+        keys.append(f"email:{email}")
+    norm = normalize_name(name)
+    if norm not in GENERIC_NAMES:
+        keys.append(f"name:{norm}")
+    return keys
@@ -0,0 +1,131 @@
+"""
+运行性能统计模块
+记录分析流水线各阶段耗时与计数, 可选采集cProfile与tracemalloc数据
+"""
+import io
+import time
+import pstats
+import cProfile
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class RunProfiler:
+    """单次分析运行的计时器与计数器"""
+
+    def __init__(self, profile: bool = False, top_n: int = 25):
+        self.profile = profile
+        self.top_n = top_n
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+        self.stage_calls: Counter = Counter()
+        self.counters: Counter = Counter()
+        self.started_at: Optional[datetime] = None
+        self._start = 0.0
+        self._duration = 0.0
+        self._running = False
+        self._profiler: Optional[cProfile.Profile] = None
+        self._memory: Optional[Dict] = None
+
+    def start(self):
+        self._running = True
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        if self.profile:
+            tracemalloc.start()
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        """停止计时与采集; 未启动或已停止时不做任何事"""
+        if not self._running:
+            return
+        self._running = False
+        self._duration = time.perf_counter() - self._start
+        if self._profiler:
+            self._profiler.disable()
+        if self.profile and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._memory = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top_allocations': [
+                    {'location': str(stat.traceback), 'size_bytes': stat.size, 'count': stat.count}
+                    for stat in snapshot.statistics('lineno')[:self.top_n]
+                ],
+            }
+
+    @contextmanager
+    def stage(self, name: str):
+        """统计一个阶段的耗时, 同名阶段累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] += time.perf_counter() - start
+            self.stage_calls[name] += 1
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        """累加在其他进程中测得的阶段耗时"""
+        self.stage_seconds[name] += seconds
+        self.stage_calls[name] += calls
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def _profile_stats(self) -> List[Dict]:
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        result = []
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top_n]:
+            result.append({
+                'function': f"{filename}:{line}({func})",
+                'calls': ncalls,
+                'total_seconds': round(tottime, 6),
+                'cumulative_seconds': round(cumtime, 6),
+            })
+        return result
+
+    def report(self) -> Dict:
+        """生成结构化运行报告"""
+        report = {
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration_seconds': round(self._duration, 6),
+            'stages': {
+                name: {'seconds': round(seconds, 6), 'calls': self.stage_calls[name]}
+                for name, seconds in self.stage_seconds.items()
+            },
+            'counters': dict(self.counters),
+        }
+        if self._profiler:
+            report['profile'] = self._profile_stats()
+        if self._memory:
+            report['memory'] = self._memory
+        return report
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus(metrics: List[Dict]) -> str:
+    """将指标列表格式化为Prometheus文本格式
+
+    每项为 {'name', 'type', 'help', 'samples': [(labels, value), ...]}
+    """
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric['name']} {metric['help']}")
+        lines.append(f"# TYPE {metric['name']} {metric['type']}")
+        for labels, value in metric['samples']:
+            if labels:
+                label_str = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{metric['name']}{{{label_str}}} {value}")
+            else:
+                lines.append(f"{metric['name']} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,199 @@
+"""
+紧凑数据记录模块
+提交记录使用 __slots__ 与字符串驻留; 批量传输时使用列式存储与二进制序列化
+"""
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List
+
+# Python 3.10+ 的 dataclass 支持直接生成 __slots__
+SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+_MAGIC = b'CB1\x00'
+_SECTION = struct.Struct('<Q')
+# 二进制SHA长度: SHA-1 为20字节, SHA-256 对象格式的仓库为32字节
+SHA_SIZES = (20, 32)
+
+
+@dataclass(**SLOTS)
+class CommitRecord:
+    """单个提交; 支持 record['sha'] 形式访问以兼容原有的字典用法"""
+    sha: str
+    author: str
+    email: str
+    message: str
+    timestamp: int
+    files_changed: int = 0
+    insertions: int = 0
+    deletions: int = 0
+
+    @property
+    def date(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp)
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def __reduce__(self):
+        # 按位置参数序列化, 比默认的 __slots__ 状态字典更小更快
+        return CommitRecord, (self.sha, self.author, self.email, self.message, self.timestamp,
+                              self.files_changed, self.insertions, self.deletions)
+
+    def to_dict(self) -> Dict:
+        return {
+            'sha': self.sha, 'author': self.author, 'email': self.email,
+            'message': self.message, 'date': self.date,
+            'files_changed': self.files_changed,
+            'insertions': self.insertions, 'deletions': self.deletions,
+        }
+
+
+def make_commit(sha: str, author: str, email: str, message: str, timestamp: int,
+                files_changed: int = 0, insertions: int = 0, deletions: int = 0) -> CommitRecord:
+    """创建提交记录, 重复出现的作者与邮箱驻留为同一字符串对象"""
+    return CommitRecord(sha, sys.intern(author), sys.intern(email), message, int(timestamp),
+                        files_changed, insertions, deletions)
+
+
+def _pack_strings(strings: List[str]) -> bytes:
+    encoded = [s.encode('utf-8') for s in strings]
+    lengths = array('I', (len(b) for b in encoded))
+    return _SECTION.pack(len(encoded)) + lengths.tobytes() + b''.join(encoded)
+
+
+def _unpack_strings(data: memoryview) -> List[str]:
+    count, = _SECTION.unpack_from(data, 0)
+    lengths = array('I')
+    offset = _SECTION.size + count * lengths.itemsize
+    lengths.frombytes(data[_SECTION.size:offset])
+    result = []
+    for length in lengths:
+        result.append(str(data[offset:offset + length], 'utf-8'))
+        offset += length
+    return result
+
+
+class CommitBatch:
+    """列式提交批次
+
+    SHA以二进制定长连续存储(长度由第一个提交决定, 同一批次内须一致), 作者与邮箱存为
+    字符串表下标, 数值列使用 array。pickle 时走 to_bytes/from_bytes; 目前批次只在采集与
+    写库所在的同一进程内传递, 二进制格式仅由基准测试使用。
+    """
+
+    __slots__ = ('shas', 'sha_size', 'authors', 'emails', 'messages', 'timestamps',
+                 'files_changed', 'insertions', 'deletions', '_strings', '_string_index')
+
+    def __init__(self, records: Iterable = ()):
+        self.shas = bytearray()
+        self.sha_size = 0
+        self.authors = array('I')
+        self.emails = array('I')
+        self.messages: List[str] = []
+        self.timestamps = array('q')
+        self.files_changed = array('I')
+        self.insertions = array('I')
+        self.deletions = array('I')
+        self._strings: List[str] = []
+        self._string_index: Dict[str, int] = {}
+        for record in records:
+            self.append(record)
+
+    def _intern(self, value: str) -> int:
+        index = self._string_index.get(value)
+        if index is None:
+            index = self._string_index[value] = len(self._strings)
+            self._strings.append(value)
+        return index
+
+    def append(self, record):
+        """追加一个提交(CommitRecord 或原有的提交字典)"""
+        if isinstance(record, dict):
+            timestamp = int(record['date'].timestamp())
+        else:
+            timestamp = record.timestamp
+        self.shas += self._pack_sha(record['sha'])
+        self.authors.append(self._intern(record['author']))
+        self.emails.append(self._intern(record['email']))
+        self.messages.append(record['message'])
+        self.timestamps.append(timestamp)
+        self.files_changed.append(record['files_changed'])
+        self.insertions.append(record['insertions'])
+        self.deletions.append(record['deletions'])
+
+    def _pack_sha(self, sha: str) -> bytes:
+        try:
+            packed = bytes.fromhex(sha)
+        except ValueError:
+            packed = b''
+        if len(packed) not in SHA_SIZES or len(packed) * 2 != len(sha):
+            raise ValueError(f"无效的提交SHA: {sha!r}")
+        if not self.sha_size:
+            self.sha_size = len(packed)
+        elif len(packed) != self.sha_size:
+            raise ValueError(f"提交SHA长度不一致: {sha!r} (批次为 {self.sha_size * 2} 位)")
+        return packed
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, i: int) -> CommitRecord:
+        if i < 0:
+            i += len(self)
+        size = self.sha_size
+        return CommitRecord(
+            self.shas[i * size:(i + 1) * size].hex(),
+            self._strings[self.authors[i]], self._strings[self.emails[i]],
+            self.messages[i], self.timestamps[i],
+            self.files_changed[i], self.insertions[i], self.deletions[i],
+        )
+
+    def __iter__(self) -> Iterator[CommitRecord]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_bytes(self) -> bytes:
+        sections = [
+            bytes(self.shas), self.authors.tobytes(), self.emails.tobytes(),
+            self.timestamps.tobytes(), self.files_changed.tobytes(),
+            self.insertions.tobytes(), self.deletions.tobytes(),
+            _pack_strings(self._strings), _pack_strings(self.messages),
+        ]
+        return _MAGIC + b''.join(_SECTION.pack(len(s)) + s for s in sections)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CommitBatch':
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("无效的提交批次数据")
+        view = memoryview(data)
+        offset = len(_MAGIC)
+        sections = []
+        while offset < len(view):
+            size, = _SECTION.unpack_from(view, offset)
+            offset += _SECTION.size
+            sections.append(view[offset:offset + size])
+            offset += size
+
+        batch = cls()
+        batch.shas = bytearray(sections[0])
+        for column, section in zip(('authors', 'emails', 'timestamps', 'files_changed',
+                                    'insertions', 'deletions'), sections[1:7]):
+            getattr(batch, column).frombytes(section)
+        batch._strings = _unpack_strings(sections[7])
+        batch._string_index = {s: i for i, s in enumerate(batch._strings)}
+        batch.messages = _unpack_strings(sections[8])
+        # SHA长度不单独存储, 由SHA列长度与提交数推出
+        if len(batch):
+            batch.sha_size, remainder = divmod(len(batch.shas), len(batch))
+            if remainder or batch.sha_size not in SHA_SIZES:
+                raise ValueError("无效的提交批次数据")
+        return batch
+
+    def __reduce__(self):
+        return CommitBatch.from_bytes, (self.to_bytes(),)
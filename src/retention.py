@@ -0,0 +1,69 @@
+"""
+数据保留与压缩模块
+按保留策略清理旧快照、原始提交与运行记录(活动汇总永久保留), 旧快照先归档为压缩的SQLite文件,
+之后可只读挂载查询; 清理后增量VACUUM并更新查询统计
+"""
+import gzip
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_SUFFIX = ".db.gz"
+
+
+@dataclass
+class RetentionPolicy:
+    """保留策略; 0 表示不限制"""
+    keep_snapshots: int = 30    # 每个项目保留的最近快照数(当前快照始终保留)
+    commit_days: int = 365      # 原始提交保留天数, 活动与贡献者汇总不受影响
+    run_days: int = 90          # 运行记录保留天数(每个项目最近一次始终保留)
+    archive: bool = True        # 清理前将快照归档
+
+    def commit_cutoff(self, now: Optional[datetime] = None) -> Optional[str]:
+        return _cutoff(self.commit_days, now)
+
+    def run_cutoff(self, now: Optional[datetime] = None) -> Optional[str]:
+        return _cutoff(self.run_days, now)
+
+
+def _cutoff(days: int, now: Optional[datetime]) -> Optional[str]:
+    if not days:
+        return None
+    return ((now or datetime.now()) - timedelta(days=days)).isoformat()
+
+
+def pack_archive(db_file: str, dest: str) -> int:
+    """将SQLite文件压缩为归档文件并删除原文件, 返回归档大小"""
+    with open(db_file, 'rb') as src, gzip.open(dest, 'wb', compresslevel=6) as out:
+        shutil.copyfileobj(src, out, 1 << 20)
+    os.remove(db_file)
+    return os.path.getsize(dest)
+
+
+@contextmanager
+def unpacked_archive(path: str) -> Iterator[str]:
+    """解压归档到临时文件, 退出时删除"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.db')
+    try:
+        with os.fdopen(fd, 'wb') as out, gzip.open(path, 'rb') as src:
+            shutil.copyfileobj(src, out, 1 << 20)
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+
+def compact(db, policy: RetentionPolicy, now: Optional[datetime] = None) -> Dict:
+    """按策略清理所有项目, 然后整理数据库文件; 返回各项目清理数量与整理前后大小
+
+    db 可以是 Database 或 ShardedDatabase; 每个项目在其写锁内清理, 不阻塞其他分片的写入
+    """
+    projects = {}
+    for project in db.get_all_projects():
+        with db.write_lock(project['id']):
+            projects[project['name']] = db.prune_project(project['id'], policy, now)
+    return {'projects': projects, 'storage': db.optimize()}
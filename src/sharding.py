@@ -0,0 +1,316 @@
+"""
+分片存储模块
+每个项目(或每个哈希桶)的数据存放在独立的SQLite文件中, 目录库 catalog.db 记录项目所在分片与汇总统计。
+各分片的自增ID从 分片号 << SHARD_ID_BITS 开始, 文件、快照等ID全局唯一, 可直接由ID定位分片。
+"""
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .storage import Database
+
+CATALOG_NAME = "catalog.db"
+SHARD_MODES = ('project', 'hash')
+SHARD_ID_BITS = 40
+
+# 分片内使用自增ID的表; 新分片按分片号设置起始值
+_AUTOINCREMENT_TABLES = ('commits', 'authors', 'file_stats', 'functions', 'snapshots',
+                         'skipped_files', 'runs', 'archives')
+
+# 首个参数为项目ID的方法, 直接路由到项目所在分片
+_PROJECT_METHODS = frozenset({
+    'get_data_generation', 'save_commit', 'save_commits', 'save_file_stats', 'save_functions',
+    'find_file_rows', 'save_skipped_files', 'get_skipped_files', 'save_snapshot', 'get_snapshots',
+    'find_snapshot', 'save_file_signature', 'save_project_stats', 'save_run', 'get_runs',
+    'get_project', 'get_commits', 'get_contributor_stats', 'get_file_stats', 'get_top_functions',
+    'get_complexity_histogram', 'get_file_complexity', 'get_complexity_trend', 'get_code_growth',
+    'get_code_smells_summary', 'get_code_smells', 'get_commit_activity', 'get_activity',
+    'prune_project', 'get_archives', 'attach_archive', 'project_db_path',
+})
+
+# 读取方法对不存在的项目返回的结果, 与 Database 对未知项目ID的返回一致; 其余方法抛出 KeyError
+_MISSING_PROJECT_RESULTS = {
+    'get_project': lambda: None, 'find_snapshot': lambda: None,
+    'get_data_generation': dict, 'find_file_rows': dict, 'get_complexity_histogram': dict,
+    'get_code_smells_summary': dict, 'get_commit_activity': dict,
+    'get_skipped_files': list, 'get_snapshots': list, 'get_runs': list, 'get_commits': list,
+    'get_contributor_stats': list, 'get_file_stats': list, 'get_top_functions': list,
+    'get_file_complexity': list, 'get_complexity_trend': list, 'get_code_growth': list,
+    'get_code_smells': list, 'get_activity': list, 'get_archives': list,
+}
+
+# 会改变项目汇总信息的方法, 调用后同步到目录库
+_CATALOG_SYNC_METHODS = frozenset({'save_commit', 'save_commits', 'save_project_stats', 'prune_project'})
+
+
+class ShardedDatabase:
+    """分片数据库, 接口与 Database 相同, 按项目ID路由到分片
+
+    mode='project' 时每个项目一个分片; mode='hash' 时按项目名哈希到 buckets 个分片。
+    分片方式在首次初始化时写入目录库, 之后以目录库为准。
+    """
+
+    def __init__(self, root: str, mode: str = 'project', buckets: int = 16):
+        if mode not in SHARD_MODES:
+            raise ValueError(f"不支持的分片方式: {mode}")
+        self.root = root
+        self.mode = mode
+        self.buckets = buckets
+        self.catalog = Database(os.path.join(root, CATALOG_NAME))
+        self._shards: Dict[int, Database] = {}
+        self._project_shards: Dict[int, int] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._mutex = threading.Lock()
+
+    def init_tables(self):
+        """初始化目录库, 读取或写入分片方式"""
+        os.makedirs(self.root, exist_ok=True)
+        with self.catalog.get_conn() as conn:
+            cursor = conn.cursor()
+            self.catalog._init_projects_table(cursor)
+            self.catalog._ensure_columns(cursor, 'projects', {'shard': 'INTEGER'})
+            cursor.execute("CREATE TABLE IF NOT EXISTS shard_meta (key TEXT PRIMARY KEY, value TEXT)")
+            cursor.executemany("INSERT OR IGNORE INTO shard_meta (key, value) VALUES (?, ?)",
+                               [('mode', self.mode), ('buckets', str(self.buckets))])
+            cursor.execute("SELECT key, value FROM shard_meta")
+            meta = {row['key']: row['value'] for row in cursor.fetchall()}
+        self.mode, self.buckets = meta['mode'], int(meta['buckets'])
+
+    # ---- 分片定位 ----
+
+    def shard_path(self, index: int) -> str:
+        name = f"project_{index}.db" if self.mode == 'project' else f"shard_{index:03d}.db"
+        return os.path.join(self.root, name)
+
+    def shard(self, index: int) -> Database:
+        """获取分片(首次访问时建表并设置自增ID起始值)"""
+        with self._mutex:
+            db = self._shards.get(index)
+            if db is None:
+                db = Database(self.shard_path(index))
+                db.init_tables()
+                with db.get_conn() as conn:
+                    offset = index << SHARD_ID_BITS
+                    conn.executemany('''
+                        INSERT INTO sqlite_sequence (name, seq)
+                        SELECT ?1, ?2 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?1)
+                    ''', [(table, offset) for table in _AUTOINCREMENT_TABLES])
+                self._shards[index] = db
+                self._locks[index] = threading.Lock()
+            return db
+
+    def shard_index(self, project_id: int) -> int:
+        index = self._project_shards.get(project_id)
+        if index is None:
+            with self.catalog.get_conn() as conn:
+                row = conn.execute("SELECT shard FROM projects WHERE id = ?", (project_id,)).fetchone()
+            if row is None or row['shard'] is None:
+                raise KeyError(f"项目不存在: {project_id}")
+            index = self._project_shards[project_id] = row['shard']
+        return index
+
+    def find_project_shard(self, project_id: int) -> Optional[int]:
+        """项目所在分片号, 项目不存在时返回None"""
+        try:
+            return self.shard_index(project_id)
+        except KeyError:
+            return None
+
+    def shard_for_project(self, project_id: int) -> Database:
+        return self.shard(self.shard_index(project_id))
+
+    def shard_for_id(self, row_id: int) -> Database:
+        """按文件、快照等全局ID定位分片; ID不属于任何已有分片时抛出 KeyError(不创建新分片)"""
+        index = row_id >> SHARD_ID_BITS
+        if index not in self._shards and not os.path.exists(self.shard_path(index)):
+            raise KeyError(f"ID不属于任何分片: {row_id}")
+        return self.shard(index)
+
+    def shard_indexes(self) -> List[int]:
+        with self.catalog.get_conn() as conn:
+            return [row['shard'] for row in conn.execute(
+                "SELECT DISTINCT shard FROM projects WHERE shard IS NOT NULL ORDER BY shard")]
+
+    def all_shards(self) -> List[Database]:
+        return [self.shard(index) for index in self.shard_indexes()]
+
+    def _fan_out(self, func) -> List:
+        """在所有分片上并行执行 func(shard), 返回结果列表"""
+        shards = self.all_shards()
+        if len(shards) <= 1:
+            return [func(shard) for shard in shards]
+        with ThreadPoolExecutor(max_workers=min(8, len(shards))) as pool:
+            return list(pool.map(func, shards))
+
+    # ---- 路由 ----
+
+    def __getattr__(self, name: str):
+        if name not in _PROJECT_METHODS:
+            raise AttributeError(name)
+
+        def routed(project_id, *args, **kwargs):
+            try:
+                shard = self.shard_for_project(project_id)
+            except KeyError:
+                if name not in _MISSING_PROJECT_RESULTS:
+                    raise
+                return _MISSING_PROJECT_RESULTS[name]()
+            result = getattr(shard, name)(project_id, *args, **kwargs)
+            if name in _CATALOG_SYNC_METHODS:
+                self._sync_catalog(project_id)
+            return result
+        return routed
+
+    def _sync_catalog(self, project_id: int):
+        """将分片中的项目行复制到目录库"""
+        row = self.shard_for_project(project_id).get_project(project_id)
+        columns = [c for c in row if c != 'id']
+        with self.catalog.get_conn() as conn:
+            conn.execute(f"UPDATE projects SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                         [row[c] for c in columns] + [project_id])
+
+    def find_project(self, name: str) -> Optional[int]:
+        return self.catalog.find_project(name)
+
+    def save_project(self, name: str, url: str) -> int:
+        """在目录库中分配项目ID与分片, 再持有分片写锁在分片中保存项目
+
+        同一哈希分片的其他项目可能正由别的线程长时间写入, 不加锁会等待超时(database is locked)
+        """
+        project_id = self._reserve_project(name, url)
+        with self.write_lock(project_id):
+            self.shard_for_project(project_id).save_project(name, url, project_id)
+        self._sync_catalog(project_id)
+        return project_id
+
+    def _reserve_project(self, name: str, url: str) -> int:
+        """在目录库中查找或分配项目ID与分片"""
+        with self.catalog.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM projects WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            if row:
+                project_id = row['id']
+            else:
+                cursor.execute("INSERT INTO projects (name, url) VALUES (?, ?)", (name, url))
+                project_id = cursor.lastrowid
+                shard = project_id if self.mode == 'project' else \
+                    zlib.crc32(name.encode('utf-8')) % self.buckets
+                cursor.execute("UPDATE projects SET shard = ? WHERE id = ?", (shard, project_id))
+        return project_id
+
+    def delete_project(self, project_id: int):
+        """删除分片中的项目数据与目录库中的项目行; 按项目分片时同时删除分片文件"""
+        index = self.shard_index(project_id)
+        with self.write_lock(project_id):
+            shard = self.shard(index)
+            shard.delete_project(project_id)
+            if self.mode == 'project':
+                with self._mutex:
+                    self._shards.pop(index, None)
+                os.remove(shard.db_path)
+        with self.catalog.get_conn() as conn:
+            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        self._project_shards.pop(project_id, None)
+
+    def optimize(self) -> Dict[str, int]:
+        """并行整理各分片(持有分片写锁)与目录库, 返回合计的整理前后大小"""
+        def run(index: int) -> Dict[str, int]:
+            shard = self.shard(index)
+            with self._locks[index]:
+                return shard.optimize()
+
+        indexes = self.shard_indexes()
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(indexes)))) as pool:
+            sizes = list(pool.map(run, indexes))
+        sizes.append(self.catalog.optimize())
+        return {key: sum(size[key] for size in sizes) for key in ('size_before', 'size_after')}
+
+    def write_lock(self, project_id: int) -> threading.Lock:
+        index = self.shard_index(project_id)
+        self.shard(index)
+        return self._locks[index]
+
+    # ---- 按全局ID路由 ----
+
+    def get_snapshot_diff_files(self, old_snapshot_id: int, new_snapshot_id: int) -> Tuple[List[Dict], List[Dict]]:
+        return self.shard_for_id(old_snapshot_id).get_snapshot_diff_files(old_snapshot_id, new_snapshot_id)
+
+    def get_file_functions(self, file_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+        by_shard: Dict[int, List[int]] = {}
+        for file_id in file_ids:
+            by_shard.setdefault(file_id >> SHARD_ID_BITS, []).append(file_id)
+        result = {}
+        for index, ids in by_shard.items():
+            result.update(self.shard_for_id(ids[0]).get_file_functions(ids))
+        return result
+
+    def get_file_signature(self, file_id: int) -> Optional[List[int]]:
+        try:
+            return self.shard_for_id(file_id).get_file_signature(file_id)
+        except KeyError:
+            return None
+
+    # ---- 跨项目查询 ----
+
+    def get_all_projects(self) -> List[Dict]:
+        """从目录库读取项目列表与汇总统计"""
+        return self.catalog.get_all_projects()
+
+    def find_similar_files(self, file_id: int, threshold: float = 0.5,
+                           limit: int = 20) -> List[Dict]:
+        signature = self.get_file_signature(file_id)
+        if signature is None:
+            return []
+        results = [r for part in self._fan_out(lambda shard: shard.find_similar_by_signature(
+            signature, threshold, limit, exclude_file_id=file_id)) for r in part]
+        results.sort(key=lambda r: r['similarity'], reverse=True)
+        return results[:limit]
+
+    def search_commits(self, query: str, project_id: Optional[int] = None,
+                       limit: int = 20) -> List[Dict]:
+        """指定项目时只查询所在分片; 否则各分片并行查询后按相关度合并"""
+        if project_id is not None:
+            if self.find_project_shard(project_id) is None:
+                return []
+            return self.shard_for_project(project_id).search_commits(query, project_id, limit)
+        return self._merge_ranked(self._fan_out(lambda shard: shard.search_commits(query, None, limit)),
+                                  limit)
+
+    def search_files(self, query: str, project_id: Optional[int] = None,
+                     limit: int = 20) -> List[Dict]:
+        if project_id is not None:
+            if self.find_project_shard(project_id) is None:
+                return []
+            return self.shard_for_project(project_id).search_files(query, project_id, limit)
+        return self._merge_ranked(self._fan_out(lambda shard: shard.search_files(query, None, limit)),
+                                  limit)
+
+    @staticmethod
+    def _merge_ranked(parts: List[List[Dict]], limit: int) -> List[Dict]:
+        # bm25 分数按各分片自身的词频统计计算, 合并结果为近似排序
+        return sorted((r for part in parts for r in part), key=lambda r: r['rank'])[:limit]
+
+    def get_latest_runs(self) -> List[Dict]:
+        return [run for part in self._fan_out(lambda shard: shard.get_latest_runs()) for run in part]
+
+    def get_table_counts(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for counts in self._fan_out(lambda shard: shard.get_table_counts()):
+            for table, count in counts.items():
+                totals[table] = totals.get(table, 0) + count
+        totals['projects'] = len(self.get_all_projects())
+        return totals
+
+    def close(self):
+        pass
+
+
+def open_database(path: str, shard_mode: str = 'project',
+                  buckets: int = 16) -> Union[Database, ShardedDatabase]:
+    """以 .db 结尾的路径使用单文件数据库, 否则视为分片目录"""
+    if path.endswith('.db'):
+        return Database(path)
+    return ShardedDatabase(path, shard_mode, buckets)
@@ -0,0 +1,81 @@
+"""
+代码相似度模块
+基于MinHash/LSH检测跨项目的重复与相似文件
+"""
+import re
+import hashlib
+import random
+from array import array
+from typing import List, Set
+
+# 签名参数: 64个哈希函数, 分成16个band, 每个band 4行
+# 相似度阈值约为 (1/16)^(1/4) ≈ 0.5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+# 固定种子, 保证不同批次生成的签名可以互相比较
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERM)]
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def shingles(source_code: str) -> Set[int]:
+    """将源码切分为token级shingle并哈希(忽略注释与空白差异)"""
+    tokens = []
+    for line in source_code.splitlines():
+        line = line.split('#', 1)[0]
+        tokens.extend(_TOKEN_RE.findall(line))
+
+    if len(tokens) < SHINGLE_SIZE:
+        return {_hash64(' '.join(tokens).encode('utf-8'))} if tokens else set()
+
+    return {_hash64(' '.join(tokens[i:i + SHINGLE_SIZE]).encode('utf-8'))
+            for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def compute_signature(source_code: str) -> List[int]:
+    """计算MinHash签名, 空文件返回空列表"""
+    hashes = shingles(source_code)
+    if not hashes:
+        return []
+
+    signature = []
+    for a, b in _PERMUTATIONS:
+        signature.append(min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes))
+    return signature
+
+
+def band_hashes(signature: List[int]) -> List[int]:
+    """将签名分段哈希为LSH桶(有符号64位, 可直接存入SQLite INTEGER)"""
+    result = []
+    for band in range(BANDS):
+        chunk = array('I', signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        result.append(_hash64(bytes([band]) + chunk) - (1 << 63))
+    return result
+
+
+def pack_signature(signature: List[int]) -> bytes:
+    return array('I', signature).tobytes()
+
+
+def unpack_signature(data: bytes) -> List[int]:
+    sig = array('I')
+    sig.frombytes(data)
+    return sig.tolist()
+
+
+def estimate_similarity(sig1: List[int], sig2: List[int]) -> float:
+    """估计两个签名的Jaccard相似度"""
+    if not sig1 or len(sig1) != len(sig2):
+        return 0.0
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
@@ -1,10 +1,57 @@
 """
 SQLite数据存储模块
 """
+import html
+import json
+import os
 import sqlite3
-from typing import Dict, List, Optional
-from datetime import datetime
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from .analyzer import FunctionInfo
+from .identity import Mailmap, identity_keys, normalize_email
+from .retention import ARCHIVE_DIR, ARCHIVE_SUFFIX, RetentionPolicy, pack_archive, unpacked_archive
+from .similarity import band_hashes, pack_signature, unpack_signature, estimate_similarity
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# 带 project_id 列的表, 删除项目时按此顺序清理
+_PROJECT_TABLES = ('commits', 'contributor_stats', 'contributor_days', 'activity_rollups',
+                   'activity_authors', 'functions', 'file_signatures', 'lsh_buckets', 'file_stats',
+                   'snapshots', 'skipped_files', 'complexity_histogram', 'runs', 'archives')
+
+
+def activity_bucket(when: date, granularity: str) -> str:
+    """返回时间所在日/周(周一)/月的起始日期"""
+    if isinstance(when, datetime):
+        when = when.date()
+    if granularity == 'week':
+        when = when - timedelta(days=when.weekday())
+    elif granularity == 'month':
+        when = when.replace(day=1)
+    return when.isoformat()
+
+# 不限项目的全文搜索中参与相关度排序的最近匹配数; 常见词在大库中会命中数万个提交,
+# 全部计算 bm25 会超过 50 ms (见 benchmarks/search.py)
+SEARCH_WINDOW = 5000
+
+# 高亮标记先用控制字符占位, 转义HTML后再替换为<mark>
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+
+def fts_query(text: str) -> str:
+    """将用户输入转换为FTS5查询: 每个词作为短语, 词之间为AND"""
+    terms = [t.replace('"', '""') for t in text.split()]
+    return ' '.join(f'"{t}"' for t in terms)
+
+
+def highlight(snippet: Optional[str]) -> str:
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
 
 
 class Database:
@@ -12,6 +59,9 @@ class Database:
 
     def __init__(self, db_path: str = "data/analysis.db"):
         self.db_path = db_path
+        self.archive_dir = os.path.join(os.path.dirname(db_path), ARCHIVE_DIR)
+        self.fts_enabled = True
+        self._write_lock = threading.Lock()
 
     @contextmanager
     def get_conn(self):
@@ -28,21 +78,10 @@ class Database:
         """初始化表"""
         with self.get_conn() as conn:
             cursor = conn.cursor()
+            # 仅对新建的空数据库生效; 旧数据库在首次 optimize 时转换
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
 
-            # 项目表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS projects (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    url TEXT NOT NULL,
-                    total_files INTEGER DEFAULT 0,
-                    total_loc INTEGER DEFAULT 0,
-                    total_functions INTEGER DEFAULT 0,
-                    total_classes INTEGER DEFAULT 0,
-                    total_smells INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            self._init_projects_table(cursor)
 
             # 提交表
             cursor.execute('''
@@ -57,9 +96,87 @@ class Database:
                     files_changed INTEGER DEFAULT 0,
                     insertions INTEGER DEFAULT 0,
                     deletions INTEGER DEFAULT 0,
+                    author_id INTEGER,
                     FOREIGN KEY (project_id) REFERENCES projects(id)
                 )
             ''')
+            self._ensure_columns(cursor, 'commits', {'author_id': 'INTEGER'})
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_commits_project "
+                           "ON commits(project_id, committed_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_commits_project_id ON commits(project_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_commits_sha ON commits(project_id, sha)")
+
+            # 贡献者身份表(跨项目共享)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS authors (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    email TEXT
+                )
+            ''')
+
+            # 身份别名表: "email:<邮箱>" / "name:<规范化姓名>" -> 作者ID
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS author_aliases (
+                    alias TEXT PRIMARY KEY,
+                    author_id INTEGER NOT NULL,
+                    FOREIGN KEY (author_id) REFERENCES authors(id)
+                )
+            ''')
+
+            # 贡献者汇总表(随提交写入增量维护)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS contributor_stats (
+                    project_id INTEGER NOT NULL,
+                    author_id INTEGER NOT NULL,
+                    commits INTEGER DEFAULT 0,
+                    additions INTEGER DEFAULT 0,
+                    deletions INTEGER DEFAULT 0,
+                    first_commit TIMESTAMP,
+                    last_commit TIMESTAMP,
+                    active_days INTEGER DEFAULT 0,
+                    PRIMARY KEY (project_id, author_id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_contributor_commits "
+                           "ON contributor_stats(project_id, commits DESC)")
+
+            # 提交活动汇总表(日/周/月), bucket为时间段起始日期
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS activity_rollups (
+                    project_id INTEGER NOT NULL,
+                    granularity TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    commits INTEGER DEFAULT 0,
+                    insertions INTEGER DEFAULT 0,
+                    deletions INTEGER DEFAULT 0,
+                    authors INTEGER DEFAULT 0,
+                    PRIMARY KEY (project_id, granularity, bucket)
+                ) WITHOUT ROWID
+            ''')
+
+            # 各时间段内出现过的作者, 用于增量计算去重作者数
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS activity_authors (
+                    project_id INTEGER NOT NULL,
+                    granularity TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    author_id INTEGER NOT NULL,
+                    PRIMARY KEY (project_id, granularity, bucket, author_id)
+                ) WITHOUT ROWID
+            ''')
+
+            self._init_runs_table(cursor)
+
+            # 贡献者活跃日期, 用于增量计算活跃天数
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS contributor_days (
+                    project_id INTEGER NOT NULL,
+                    author_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    PRIMARY KEY (project_id, author_id, day)
+                )
+            ''')
 
             # 文件统计表
             cursor.execute('''
@@ -72,53 +189,694 @@ class Database:
                     functions_count INTEGER DEFAULT 0,
                     classes_count INTEGER DEFAULT 0,
                     imports_count INTEGER DEFAULT 0,
+                    avg_complexity REAL DEFAULT 0,
+                    max_complexity INTEGER DEFAULT 0,
                     code_smells TEXT,
+                    blob_sha TEXT,
+                    is_current INTEGER DEFAULT 1,
+                    FOREIGN KEY (project_id) REFERENCES projects(id)
+                )
+            ''')
+            self._ensure_columns(cursor, 'file_stats', {
+                'avg_complexity': 'REAL DEFAULT 0',
+                'max_complexity': 'INTEGER DEFAULT 0',
+                'blob_sha': 'TEXT',
+                'is_current': 'INTEGER DEFAULT 1',
+            })
+            cursor.execute("DROP INDEX IF EXISTS idx_file_stats_complexity")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_stats_current "
+                           "ON file_stats(project_id, is_current, max_complexity)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_stats_blob "
+                           "ON file_stats(project_id, file_path, blob_sha)")
+
+            # 函数表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS functions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    project_id INTEGER NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    line_start INTEGER DEFAULT 0,
+                    line_count INTEGER DEFAULT 0,
+                    params_count INTEGER DEFAULT 0,
+                    complexity INTEGER DEFAULT 1,
+                    is_current INTEGER DEFAULT 1,
+                    FOREIGN KEY (project_id) REFERENCES projects(id),
+                    FOREIGN KEY (file_id) REFERENCES file_stats(id)
+                )
+            ''')
+            self._ensure_columns(cursor, 'functions', {'is_current': 'INTEGER DEFAULT 1'})
+            cursor.execute("DROP INDEX IF EXISTS idx_functions_complexity")
+            cursor.execute("DROP INDEX IF EXISTS idx_functions_lines")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_functions_current_complexity "
+                           "ON functions(project_id, is_current, complexity)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_functions_current_lines "
+                           "ON functions(project_id, is_current, line_count)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_functions_file ON functions(file_id)")
+
+            # 分析快照表, 每个 (项目, 提交) 一条
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    project_id INTEGER NOT NULL,
+                    commit_sha TEXT NOT NULL,
+                    committed_at TIMESTAMP,
+                    total_files INTEGER DEFAULT 0,
+                    total_loc INTEGER DEFAULT 0,
+                    total_sloc INTEGER DEFAULT 0,
+                    total_functions INTEGER DEFAULT 0,
+                    total_classes INTEGER DEFAULT 0,
+                    total_smells INTEGER DEFAULT 0,
+                    avg_complexity REAL DEFAULT 0,
+                    max_complexity INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (project_id, commit_sha),
+                    FOREIGN KEY (project_id) REFERENCES projects(id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_time "
+                           "ON snapshots(project_id, committed_at)")
+
+            # 快照包含的文件; 未变化的文件(路径与blob相同)在快照间共享同一 file_stats 行
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS snapshot_files (
+                    snapshot_id INTEGER NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    PRIMARY KEY (snapshot_id, file_id)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_files_file ON snapshot_files(file_id)")
+
+            # 已归档的快照文件(压缩的SQLite库, 可只读挂载)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS archives (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    project_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    snapshots INTEGER DEFAULT 0,
+                    first_committed_at TIMESTAMP,
+                    last_committed_at TIMESTAMP,
+                    size_bytes INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (project_id) REFERENCES projects(id)
                 )
             ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_archives_project ON archives(project_id)")
+
+            # 因超出资源限制或无法解析而跳过的文件(最近一次分析)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS skipped_files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    project_id INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    blob_sha TEXT,
+                    size_bytes INTEGER DEFAULT 0,
+                    reason TEXT NOT NULL,
+                    detail TEXT,
+                    skipped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (project_id) REFERENCES projects(id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_skipped_files_project "
+                           "ON skipped_files(project_id, reason)")
+
+            # 复杂度分布汇总表(当前快照, 随函数写入累加)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS complexity_histogram (
+                    project_id INTEGER NOT NULL,
+                    complexity INTEGER NOT NULL,
+                    count INTEGER DEFAULT 0,
+                    PRIMARY KEY (project_id, complexity)
+                )
+            ''')
+
+            # 文件MinHash签名表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_signatures (
+                    file_id INTEGER PRIMARY KEY,
+                    project_id INTEGER NOT NULL,
+                    signature BLOB NOT NULL,
+                    FOREIGN KEY (file_id) REFERENCES file_stats(id)
+                )
+            ''')
 
-    def save_project(self, name: str, url: str) -> int:
-        """保存项目"""
-        with self. get_conn() as conn:
+            # LSH分桶表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    bucket INTEGER NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    project_id INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh_buckets(bucket)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lsh_file ON lsh_buckets(file_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lsh_project ON lsh_buckets(project_id)")
+
+            self._init_search_index(cursor)
+
+    def _init_search_index(self, cursor):
+        """创建FTS5全文索引(提交信息/作者、文件路径), 由触发器与基础表保持同步"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('commits_fts', 'files_fts')")
+        existing = {row['name'] for row in cursor.fetchall()}
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS commits_fts USING fts5(
+                    message, author,
+                    content='commits', content_rowid='id', tokenize='porter unicode61'
+                )
+            ''')
+            # 路径使用trigram分词, 支持任意子串匹配
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                    file_path,
+                    content='file_stats', content_rowid='id', tokenize='trigram'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            # SQLite未编译FTS5(或不支持trigram分词, 3.34之前)时退化为LIKE查询;
+            # 删除可能已建好的一半索引, 升级SQLite后两个索引一起重建并回填
+            self._drop_search_index(cursor)
+            self.fts_enabled = False
+            return
+
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS commits_fts_insert AFTER INSERT ON commits BEGIN
+                INSERT INTO commits_fts (rowid, message, author)
+                VALUES (new.id, new.message, new.author);
+            END;
+            CREATE TRIGGER IF NOT EXISTS commits_fts_delete AFTER DELETE ON commits BEGIN
+                INSERT INTO commits_fts (commits_fts, rowid, message, author)
+                VALUES ('delete', old.id, old.message, old.author);
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON file_stats BEGIN
+                INSERT INTO files_fts (rowid, file_path)
+                VALUES (new.id, new.file_path);
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON file_stats BEGIN
+                INSERT INTO files_fts (files_fts, rowid, file_path)
+                VALUES ('delete', old.id, old.file_path);
+            END;
+        ''')
+        # 旧数据库首次建立索引时回填已有数据
+        if 'commits_fts' not in existing:
+            cursor.execute("INSERT INTO commits_fts (commits_fts) VALUES ('rebuild')")
+        if 'files_fts' not in existing:
+            cursor.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def _drop_search_index(cursor):
+        """删除全文索引及其触发器"""
+        for name in ('commits_fts_insert', 'commits_fts_delete', 'files_fts_insert', 'files_fts_delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for name in ('commits_fts', 'files_fts'):
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS {name}")
+            except sqlite3.OperationalError:  # 缺少FTS5模块时无法删除, 留待下次
+                pass
+
+    def _init_projects_table(self, cursor):
+        # 项目表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS projects (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                total_files INTEGER DEFAULT 0,
+                total_loc INTEGER DEFAULT 0,
+                total_functions INTEGER DEFAULT 0,
+                total_classes INTEGER DEFAULT 0,
+                total_smells INTEGER DEFAULT 0,
+                commits_generation INTEGER DEFAULT 0,
+                files_generation INTEGER DEFAULT 0,
+                current_snapshot_id INTEGER,
+                commits_pruned_before TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self._ensure_columns(cursor, 'projects', {
+            'commits_generation': 'INTEGER DEFAULT 0',
+            'files_generation': 'INTEGER DEFAULT 0',
+            'current_snapshot_id': 'INTEGER',
+            'commits_pruned_before': 'TIMESTAMP',
+        })
+
+    def _init_runs_table(self, cursor):
+        # 运行记录表, report 为JSON格式的运行报告
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                started_at TIMESTAMP,
+                duration REAL DEFAULT 0,
+                report TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_runs_project ON runs(project_id, id)")
+
+    @staticmethod
+    def _ensure_columns(cursor, table: str, columns: Dict[str, str]):
+        """为旧数据库补齐新增列"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, ddl in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+    @staticmethod
+    def _bump_generation(cursor, project_id: int, *kinds: str):
+        """递增项目数据版本号, 供图表缓存判断数据是否变化"""
+        sets = ', '.join(f"{kind}_generation = {kind}_generation + 1" for kind in kinds)
+        cursor.execute(f"UPDATE projects SET {sets} WHERE id = ?", (project_id,))
+
+    def get_data_generation(self, project_id: int) -> Dict[str, int]:
+        """获取项目数据版本号"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT commits_generation, files_generation FROM projects WHERE id = ?",
+                (project_id,))
+            row = cursor.fetchone()
+            if not row:
+                return {}
+            return {'commits': row['commits_generation'], 'files': row['files_generation']}
+
+    def find_project(self, name: str) -> Optional[int]:
+        """按名称查找项目ID"""
+        with self.get_conn() as conn:
+            row = conn.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()
+            return row['id'] if row else None
+
+    def save_project(self, name: str, url: str, project_id: Optional[int] = None) -> int:
+        """保存项目; 新项目可指定ID(分片存储时由目录库分配)
+
+        持有写锁, 避免与其他线程正在进行的长写事务冲突(database is locked)
+        """
+        with self._write_lock, self.get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM projects WHERE name = ?", (name,))
             row = cursor.fetchone()
             if row:
-                # 清除旧数据
-                cursor. execute("DELETE FROM commits WHERE project_id = ?", (row['id'],))
-                cursor.execute("DELETE FROM file_stats WHERE project_id = ?", (row['id'],))
+                # 已有项目: 提交按SHA增量保存, 文件数据按快照保留, 旧数据由 prune_project 清理
                 return row['id']
-            cursor.execute("INSERT INTO projects (name, url) VALUES (?, ?)", (name, url))
+            cursor.execute("INSERT INTO projects (id, name, url) VALUES (?, ?, ?)",
+                           (project_id, name, url))
             return cursor.lastrowid
 
-    def save_commit(self, project_id: int, commit:  Dict):
+    def save_commit(self, project_id: int, commit:  Dict, mailmap: Optional[Mailmap] = None):
         """保存提交"""
+        self.save_commits(project_id, [commit], mailmap)
+
+    def save_commits(self, project_id: int, commits: Iterable[Dict],
+                     mailmap: Optional[Mailmap] = None) -> int:
+        """批量保存提交, 同时识别作者身份并增量更新贡献者汇总
+
+        已保存过的提交(同一SHA)以及早于已清理时间点的提交会被跳过, 汇总表不会重复累加
+        """
+        count = 0
         with self.get_conn() as conn:
             cursor = conn.cursor()
+            cursor.execute("SELECT commits_pruned_before FROM projects WHERE id = ?", (project_id,))
+            row = cursor.fetchone()
+            pruned_before = row['commits_pruned_before'] if row else None
+            author_cache: Dict[Tuple[str, str], int] = {}
+            # (粒度, 时间段) -> [提交数, 新增行, 删除行]
+            activity: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0, 0])
+            activity_authors = set()
+
+            for commit in commits:
+                when = commit['date']
+                committed_at = when.isoformat()
+                if pruned_before and committed_at <= pruned_before:
+                    continue
+                cursor.execute("SELECT 1 FROM commits WHERE project_id = ? AND sha = ?",
+                               (project_id, commit['sha']))
+                if cursor.fetchone():
+                    continue
+
+                name, email = commit['author'], commit['email']
+                if mailmap:
+                    name, email = mailmap.resolve(name, email)
+                key = (name, email)
+                if key not in author_cache:
+                    author_cache[key] = self._resolve_author(cursor, name, email)
+                author_id = author_cache[key]
+
+                cursor.execute('''
+                    INSERT INTO commits (project_id, sha, author, email, message,
+                                        committed_at, files_changed, insertions, deletions, author_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    project_id, commit['sha'], commit['author'], commit['email'],
+                    commit['message'], committed_at,
+                    commit['files_changed'], commit['insertions'], commit['deletions'], author_id
+                ))
+                self._update_contributor(cursor, project_id, author_id, commit, committed_at)
+
+                for granularity in GRANULARITIES:
+                    bucket = activity_bucket(when, granularity)
+                    totals = activity[(granularity, bucket)]
+                    totals[0] += 1
+                    totals[1] += commit['insertions']
+                    totals[2] += commit['deletions']
+                    activity_authors.add((granularity, bucket, author_id))
+                count += 1
+
+            self._update_activity(cursor, project_id, activity, activity_authors)
+            if count:
+                self._bump_generation(cursor, project_id, 'commits')
+        return count
+
+    @staticmethod
+    def _update_activity(cursor, project_id: int, activity: Dict, activity_authors: set):
+        """将一批提交累加到活动汇总表"""
+        cursor.executemany('''
+            INSERT INTO activity_rollups (project_id, granularity, bucket, commits, insertions, deletions)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(project_id, granularity, bucket) DO UPDATE SET
+                commits = commits + excluded.commits,
+                insertions = insertions + excluded.insertions,
+                deletions = deletions + excluded.deletions
+        ''', [(project_id, g, b, c, i, d) for (g, b), (c, i, d) in activity.items()])
+
+        cursor.executemany('''
+            INSERT OR IGNORE INTO activity_authors (project_id, granularity, bucket, author_id)
+            VALUES (?, ?, ?, ?)
+        ''', [(project_id, g, b, a) for g, b, a in activity_authors])
+
+        # 只重算本批涉及的时间段
+        cursor.executemany('''
+            UPDATE activity_rollups SET authors = (
+                SELECT COUNT(*) FROM activity_authors
+                WHERE project_id = ?1 AND granularity = ?2 AND bucket = ?3
+            ) WHERE project_id = ?1 AND granularity = ?2 AND bucket = ?3
+        ''', [(project_id, g, b) for g, b in activity])
+
+    @staticmethod
+    def _resolve_author(cursor, name: str, email: str) -> int:
+        """按邮箱、规范化姓名查找已有身份, 找不到则新建"""
+        keys = identity_keys(name, email)
+        author_id = None
+        for key in keys:
+            cursor.execute("SELECT author_id FROM author_aliases WHERE alias = ?", (key,))
+            row = cursor.fetchone()
+            if row:
+                author_id = row['author_id']
+                break
+
+        if author_id is None:
+            cursor.execute("INSERT INTO authors (name, email) VALUES (?, ?)",
+                           (name or "Unknown", normalize_email(email)))
+            author_id = cursor.lastrowid
+
+        cursor.executemany("INSERT OR IGNORE INTO author_aliases (alias, author_id) VALUES (?, ?)",
+                           [(key, author_id) for key in keys])
+        return author_id
+
+    @staticmethod
+    def _update_contributor(cursor, project_id: int, author_id: int, commit: Dict, committed_at: str):
+        """增量更新贡献者汇总"""
+        cursor.execute('''
+            INSERT INTO contributor_stats (project_id, author_id, commits, additions, deletions,
+                                           first_commit, last_commit)
+            VALUES (?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT(project_id, author_id) DO UPDATE SET
+                commits = commits + 1,
+                additions = additions + excluded.additions,
+                deletions = deletions + excluded.deletions,
+                first_commit = MIN(first_commit, excluded.first_commit),
+                last_commit = MAX(last_commit, excluded.last_commit)
+        ''', (project_id, author_id, commit['insertions'], commit['deletions'],
+              committed_at, committed_at))
+
+        cursor.execute("INSERT OR IGNORE INTO contributor_days (project_id, author_id, day) VALUES (?, ?, ?)",
+                       (project_id, author_id, committed_at[:10]))
+        if cursor.rowcount == 1:
             cursor.execute('''
-                INSERT INTO commits (project_id, sha, author, email, message,
-                                    committed_at, files_changed, insertions, deletions)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                project_id, commit['sha'], commit['author'], commit['email'],
-                commit['message'], commit['date']. isoformat(),
-                commit['files_changed'], commit['insertions'], commit['deletions']
-            ))
+                UPDATE contributor_stats SET active_days = active_days + 1
+                WHERE project_id = ? AND author_id = ?
+            ''', (project_id, author_id))
 
-    def save_file_stats(self, project_id: int, metrics):
-        """保存文件统计"""
+    def save_file_stats(self, project_id: int, metrics, blob_sha: Optional[str] = None) -> int:
+        """保存文件统计, 返回文件ID"""
         with self.get_conn() as conn:
             cursor = conn.cursor()
             data = metrics.to_dict()
             cursor.execute('''
                 INSERT INTO file_stats (project_id, file_path, loc, sloc,
-                                       functions_count, classes_count, imports_count, code_smells)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                       functions_count, classes_count, imports_count,
+                                       avg_complexity, max_complexity, code_smells, blob_sha)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 project_id, data['file_path'], data['loc'], data['sloc'],
                 data['functions_count'], data['classes_count'],
-                data['imports_count'], data['code_smells']
+                data['imports_count'], data.get('avg_complexity', 0),
+                data.get('max_complexity', 0), data['code_smells'], blob_sha
             ))
+            file_id = cursor.lastrowid
+            self._bump_generation(cursor, project_id, 'files')
+            return file_id
+
+    def save_functions(self, project_id: int, functions: List[Tuple[int, FunctionInfo]]):
+        """批量保存函数信息, functions为(文件ID, FunctionInfo)列表"""
+        if not functions:
+            return
+        with self.get_conn() as conn:
+            conn.executemany('''
+                INSERT INTO functions (project_id, file_id, name, line_start,
+                                       line_count, params_count, complexity)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(project_id, file_id, f.name, f.line_start, f.line_count,
+                   f.params_count, f.complexity) for file_id, f in functions])
+
+            histogram = Counter(f.complexity for _, f in functions)
+            conn.executemany('''
+                INSERT INTO complexity_histogram (project_id, complexity, count) VALUES (?, ?, ?)
+                ON CONFLICT(project_id, complexity) DO UPDATE SET count = count + excluded.count
+            ''', [(project_id, c, n) for c, n in histogram.items()])
+            self._bump_generation(conn, project_id, 'files')
+
+    def find_file_rows(self, project_id: int, blobs: Dict[str, str]) -> Dict[str, int]:
+        """查找已分析过的文件(路径与blob SHA均相同), 返回 路径 -> 文件ID"""
+        found = {}
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            for path, blob_sha in blobs.items():
+                cursor.execute('''
+                    SELECT id FROM file_stats WHERE project_id = ? AND file_path = ? AND blob_sha = ?
+                    ORDER BY id DESC LIMIT 1
+                ''', (project_id, path, blob_sha))
+                row = cursor.fetchone()
+                if row:
+                    found[path] = row['id']
+        return found
+
+    def save_skipped_files(self, project_id: int, skipped: Iterable) -> int:
+        """记录本次分析跳过的文件(替换项目之前的记录), 元素为带 file_path/blob_sha/size/reason/detail 属性的结果"""
+        rows = [(project_id, r.file_path, r.blob_sha, r.size, r.skipped, r.detail) for r in skipped]
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM skipped_files WHERE project_id = ?", (project_id,))
+            cursor.executemany('''
+                INSERT INTO skipped_files (project_id, file_path, blob_sha, size_bytes, reason, detail)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+        return len(rows)
+
+    def get_skipped_files(self, project_id: int) -> List[Dict]:
+        """获取项目最近一次分析跳过的文件"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT file_path, blob_sha, size_bytes, reason, detail, skipped_at
+                FROM skipped_files WHERE project_id = ? ORDER BY reason, file_path
+            ''', (project_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def save_snapshot(self, project_id: int, commit_sha: str, committed_at: datetime,
+                      file_ids: Iterable[int]) -> int:
+        """保存 (项目, 提交) 快照并将其设为项目当前版本, 返回快照ID"""
+        file_ids = set(file_ids)
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO snapshots (project_id, commit_sha, committed_at) VALUES (?, ?, ?)
+                ON CONFLICT(project_id, commit_sha) DO UPDATE SET committed_at = excluded.committed_at
+            ''', (project_id, commit_sha, committed_at.isoformat()))
+            cursor.execute("SELECT id FROM snapshots WHERE project_id = ? AND commit_sha = ?",
+                           (project_id, commit_sha))
+            snapshot_id = cursor.fetchone()['id']
+
+            cursor.execute("DELETE FROM snapshot_files WHERE snapshot_id = ?", (snapshot_id,))
+            cursor.executemany("INSERT INTO snapshot_files (snapshot_id, file_id) VALUES (?, ?)",
+                               [(snapshot_id, fid) for fid in file_ids])
+
+            self._switch_current_files(cursor, project_id, file_ids)
+            cursor.execute("UPDATE projects SET current_snapshot_id = ? WHERE id = ?",
+                           (snapshot_id, project_id))
+
+            cursor.execute('''
+                UPDATE snapshots SET (total_files, total_loc, total_sloc, total_functions,
+                                      total_classes, total_smells, avg_complexity, max_complexity) = (
+                    SELECT COUNT(*), COALESCE(SUM(f.loc), 0), COALESCE(SUM(f.sloc), 0),
+                           COALESCE(SUM(f.functions_count), 0), COALESCE(SUM(f.classes_count), 0),
+                           COALESCE(SUM(CASE WHEN f.code_smells != ''
+                               THEN LENGTH(f.code_smells) - LENGTH(REPLACE(f.code_smells, ',', '')) + 1
+                               ELSE 0 END), 0),
+                           COALESCE(SUM(f.avg_complexity * f.functions_count)
+                                    / NULLIF(SUM(f.functions_count), 0), 0),
+                           COALESCE(MAX(f.max_complexity), 0)
+                    FROM snapshot_files s JOIN file_stats f ON f.id = s.file_id
+                    WHERE s.snapshot_id = ?
+                ) WHERE id = ?
+            ''', (snapshot_id, snapshot_id))
+            self._bump_generation(cursor, project_id, 'files')
+            return snapshot_id
+
+    def _switch_current_files(self, cursor, project_id: int, file_ids: set):
+        """切换项目当前文件集合, 只更新进出当前集合的行并同步复杂度分布"""
+        cursor.execute("SELECT id FROM file_stats WHERE project_id = ? AND is_current = 1", (project_id,))
+        current = {row['id'] for row in cursor.fetchall()}
+        leaving, entering = current - file_ids, file_ids - current
+
+        for ids, flag, sign in ((leaving, 0, -1), (entering, 1, 1)):
+            if not ids:
+                continue
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS _switch_ids (id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM _switch_ids")
+            cursor.executemany("INSERT INTO _switch_ids (id) VALUES (?)", [(i,) for i in ids])
+            cursor.execute("UPDATE file_stats SET is_current = ? WHERE id IN (SELECT id FROM _switch_ids)",
+                           (flag,))
+            cursor.execute("UPDATE functions SET is_current = ? WHERE file_id IN (SELECT id FROM _switch_ids)",
+                           (flag,))
+            cursor.execute('''
+                SELECT complexity, COUNT(*) as count FROM functions
+                WHERE file_id IN (SELECT id FROM _switch_ids) GROUP BY complexity
+            ''')
+            cursor.executemany('''
+                INSERT INTO complexity_histogram (project_id, complexity, count) VALUES (?, ?, ?)
+                ON CONFLICT(project_id, complexity) DO UPDATE SET count = count + excluded.count
+            ''', [(project_id, row['complexity'], sign * row['count']) for row in cursor.fetchall()])
+        cursor.execute("DELETE FROM complexity_histogram WHERE project_id = ? AND count <= 0", (project_id,))
+
+    def get_snapshots(self, project_id: int) -> List[Dict]:
+        """获取项目的所有快照(按提交时间排序)"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM snapshots WHERE project_id = ? ORDER BY committed_at, id
+            ''', (project_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def find_snapshot(self, project_id: int, ref: str) -> Optional[Dict]:
+        """按快照ID或提交SHA(前缀)查找快照; 纯数字时先按ID查找(分片库的ID位数较多)"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            if ref.isdigit():
+                cursor.execute("SELECT * FROM snapshots WHERE project_id = ? AND id = ?",
+                               (project_id, int(ref)))
+                row = cursor.fetchone()
+                if row:
+                    return dict(row)
+            cursor.execute('''
+                SELECT * FROM snapshots WHERE project_id = ? AND commit_sha >= ? AND commit_sha < ?
+                ORDER BY commit_sha LIMIT 2
+            ''', (project_id, ref.lower(), ref.lower() + 'g'))
+            rows = cursor.fetchall()
+            return dict(rows[0]) if len(rows) == 1 else None
+
+    def get_snapshot_diff_files(self, old_snapshot_id: int, new_snapshot_id: int) -> Tuple[List[Dict], List[Dict]]:
+        """返回两个快照中不共享的文件行 (仅旧快照有的, 仅新快照有的)"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            query = '''
+                SELECT f.* FROM snapshot_files s JOIN file_stats f ON f.id = s.file_id
+                WHERE s.snapshot_id = ? AND s.file_id NOT IN (
+                    SELECT file_id FROM snapshot_files WHERE snapshot_id = ?)
+            '''
+            cursor.execute(query, (old_snapshot_id, new_snapshot_id))
+            old_only = [dict(row) for row in cursor.fetchall()]
+            cursor.execute(query, (new_snapshot_id, old_snapshot_id))
+            new_only = [dict(row) for row in cursor.fetchall()]
+            return old_only, new_only
+
+    def get_file_functions(self, file_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+        """批量获取文件的函数列表"""
+        result: Dict[int, List[Dict]] = defaultdict(list)
+        file_ids = list(file_ids)
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(file_ids), 500):
+                chunk = file_ids[i:i + 500]
+                cursor.execute(f'''
+                    SELECT * FROM functions WHERE file_id IN ({','.join('?' * len(chunk))})
+                    ORDER BY file_id, line_start
+                ''', chunk)
+                for row in cursor.fetchall():
+                    result[row['file_id']].append(dict(row))
+        return result
+
+    def save_file_signature(self, project_id: int, file_id: int, signature: List[int]):
+        """保存文件MinHash签名及LSH分桶"""
+        if not signature:
+            return
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO file_signatures (file_id, project_id, signature) VALUES (?, ?, ?)",
+                (file_id, project_id, pack_signature(signature))
+            )
+            cursor.executemany(
+                "INSERT INTO lsh_buckets (bucket, file_id, project_id) VALUES (?, ?, ?)",
+                [(bucket, file_id, project_id) for bucket in band_hashes(signature)]
+            )
+
+    def get_file_signature(self, file_id: int) -> Optional[List[int]]:
+        """获取文件的MinHash签名"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT signature FROM file_signatures WHERE file_id = ?", (file_id,))
+            row = cursor.fetchone()
+            return unpack_signature(row['signature']) if row else None
+
+    def find_similar_files(self, file_id: int, threshold: float = 0.5,
+                           limit: int = 20) -> List[Dict]:
+        """查找跨项目的相似文件(按相似度降序)"""
+        signature = self.get_file_signature(file_id)
+        if signature is None:
+            return []
+        return self.find_similar_by_signature(signature, threshold, limit, exclude_file_id=file_id)
+
+    def find_similar_by_signature(self, signature: List[int], threshold: float = 0.5, limit: int = 20,
+                                  exclude_file_id: Optional[int] = None) -> List[Dict]:
+        """查找与签名相似的当前版本文件"""
+        buckets = band_hashes(signature)
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            # 只有与目标文件至少共享一个LSH桶的文件才需要比较签名
+            cursor.execute(f'''
+                SELECT s.file_id, s.signature, f.file_path, f.project_id, p.name AS project_name
+                FROM file_signatures s
+                JOIN file_stats f ON f.id = s.file_id
+                JOIN projects p ON p.id = f.project_id
+                WHERE s.file_id IN (
+                    SELECT DISTINCT file_id FROM lsh_buckets
+                    WHERE bucket IN ({', '.join('?' * len(buckets))}) AND file_id IS NOT ?
+                ) AND f.is_current = 1
+            ''', (*buckets, exclude_file_id))
+
+            results = []
+            for cand in cursor.fetchall():
+                score = estimate_similarity(signature, unpack_signature(cand['signature']))
+                if score >= threshold:
+                    results.append({
+                        'file_id': cand['file_id'],
+                        'project_id': cand['project_id'],
+                        'project_name': cand['project_name'],
+                        'file_path': cand['file_path'],
+                        'similarity': round(score, 3),
+                    })
+            results.sort(key=lambda r: r['similarity'], reverse=True)
+            return results[:limit]
 
     def save_project_stats(self, project_id: int, stats:  Dict):
         """保存项目统计"""
@@ -133,6 +891,46 @@ class Database:
                 stats['total_files'], stats['total_loc'], stats['total_functions'],
                 stats['total_classes'], stats['total_smells'], project_id
             ))
+            self._bump_generation(cursor, project_id, 'files')
+
+    def save_run(self, project_id: Optional[int], report: Dict) -> int:
+        """保存一次分析运行的报告"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO runs (project_id, started_at, duration, report) VALUES (?, ?, ?, ?)",
+                (project_id, report.get('started_at'), report.get('duration_seconds', 0),
+                 json.dumps(report, ensure_ascii=False))
+            )
+            return cursor.lastrowid
+
+    def get_runs(self, project_id: int, limit: int = 20) -> List[Dict]:
+        """获取项目的运行记录(新到旧)"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM runs WHERE project_id = ? ORDER BY id DESC LIMIT ?
+            ''', (project_id, limit))
+            return [dict(row, report=json.loads(row['report'])) for row in cursor.fetchall()]
+
+    def get_latest_runs(self) -> List[Dict]:
+        """获取每个项目最近一次运行记录"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT r.*, p.name as project_name FROM runs r
+                JOIN projects p ON p.id = r.project_id
+                WHERE r.id IN (SELECT MAX(id) FROM runs GROUP BY project_id)
+            ''')
+            return [dict(row, report=json.loads(row['report'])) for row in cursor.fetchall()]
+
+    def get_table_counts(self) -> Dict[str, int]:
+        """获取主要数据表的行数"""
+        tables = ('projects', 'commits', 'file_stats', 'functions', 'authors', 'runs')
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            return {table: cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in tables}
 
     def get_all_projects(self) -> List[Dict]:
         """获取所有项目"""
@@ -164,11 +962,11 @@ class Database:
         with self.get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT author, COUNT(*) as commits,
-                       SUM(insertions) as additions, 
-                       SUM(deletions) as deletions
-                FROM commits WHERE project_id = ? 
-                GROUP BY author ORDER BY commits DESC
+                SELECT a.name as author, a.email, c.author_id, c.commits,
+                       c.additions, c.deletions, c.first_commit, c.last_commit, c.active_days
+                FROM contributor_stats c JOIN authors a ON a.id = c.author_id
+                WHERE c.project_id = ?
+                ORDER BY c.commits DESC
             ''', (project_id,))
             return [dict(row) for row in cursor.fetchall()]
 
@@ -177,18 +975,150 @@ class Database:
         with self.get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT * FROM file_stats WHERE project_id = ?
+                SELECT * FROM file_stats WHERE project_id = ? AND is_current = 1
                 ORDER BY loc DESC
             ''', (project_id,))
             return [dict(row) for row in cursor.fetchall()]
 
+    def get_top_functions(self, project_id: int, order_by: str = 'complexity',
+                          limit: int = 10) -> List[Dict]:
+        """获取复杂度或行数最高的前K个函数"""
+        if order_by not in ('complexity', 'line_count'):
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            # 子查询走 (project_id, order_by) 索引倒序扫描, 只为前K行回表取路径
+            cursor.execute(f'''
+                SELECT fn.id, fn.name, fn.line_start, fn.line_count, fn.params_count,
+                       fn.complexity, fn.file_id, f.file_path
+                FROM (SELECT * FROM functions WHERE project_id = ? AND is_current = 1
+                      ORDER BY {order_by} DESC LIMIT ?) fn
+                JOIN file_stats f ON f.id = fn.file_id
+                ORDER BY fn.{order_by} DESC
+            ''', (project_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_complexity_histogram(self, project_id: int) -> Dict[int, int]:
+        """获取圈复杂度分布(复杂度 -> 函数数)"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT complexity, count FROM complexity_histogram
+                WHERE project_id = ? ORDER BY complexity
+            ''', (project_id,))
+            return {row['complexity']: row['count'] for row in cursor.fetchall()}
+
+    def get_file_complexity(self, project_id: int, limit: int = 20) -> List[Dict]:
+        """获取按最大复杂度排序的文件汇总"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, file_path, functions_count, avg_complexity, max_complexity
+                FROM file_stats WHERE project_id = ? AND is_current = 1
+                ORDER BY max_complexity DESC LIMIT ?
+            ''', (project_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_complexity_trend(self, project_id: int) -> List[Dict]:
+        """获取各快照的复杂度趋势"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT commit_sha, committed_at, avg_complexity, max_complexity
+                FROM snapshots WHERE project_id = ? ORDER BY committed_at
+            ''', (project_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_code_growth(self, project_id: int) -> List[Dict]:
+        """获取各快照的代码规模趋势"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT commit_sha, committed_at, total_loc, total_sloc, total_functions
+                FROM snapshots WHERE project_id = ? ORDER BY committed_at
+            ''', (project_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_code_smells_summary(self, project_id: int) -> Dict[str, int]:
+        """获取代码异味按类型汇总"""
+        summary = Counter(smell.split(':', 1)[0].strip()
+                          for smell in self.get_code_smells(project_id))
+        return dict(summary.most_common())
+
+    def search_commits(self, query: str, project_id: Optional[int] = None,
+                       limit: int = 20) -> List[Dict]:
+        """全文搜索提交信息与作者, 按相关度排序"""
+        match = fts_query(query)
+        if not match:
+            return []
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            if self.fts_enabled:
+                # 项目过滤在排序与LIMIT之前进行, 限定项目时所有匹配都参与排序;
+                # 不限项目时只对最近的 SEARCH_WINDOW 个匹配计算相关度(rowid 下界下推到FTS5)
+                window = '' if project_id is not None else f'''
+                    AND commits_fts.rowid >= COALESCE((
+                        SELECT rowid FROM commits_fts WHERE commits_fts MATCH ?1
+                        ORDER BY rowid DESC LIMIT 1 OFFSET {SEARCH_WINDOW - 1}), 0)'''
+                cursor.execute(f'''
+                    SELECT c.id, c.project_id, p.name as project_name, c.sha, c.author,
+                           c.committed_at, c.message,
+                           snippet(commits_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', 16) as snippet,
+                           bm25(commits_fts) as rank
+                    FROM commits_fts
+                    JOIN commits c ON c.id = commits_fts.rowid
+                    JOIN projects p ON p.id = c.project_id
+                    WHERE commits_fts MATCH ?1 AND (?2 IS NULL OR c.project_id = ?2){window}
+                    ORDER BY rank LIMIT ?3
+                ''', (match, project_id, limit))
+            else:
+                cursor.execute('''
+                    SELECT c.id, c.project_id, p.name as project_name, c.sha, c.author,
+                           c.committed_at, c.message, c.message as snippet, 0 as rank
+                    FROM commits c JOIN projects p ON p.id = c.project_id
+                    WHERE (c.message LIKE ?1 OR c.author LIKE ?1) AND (?2 IS NULL OR c.project_id = ?2)
+                    ORDER BY c.committed_at DESC LIMIT ?3
+                ''', (f"%{query}%", project_id, limit))
+            return [dict(row, snippet=highlight(row['snippet'])) for row in cursor.fetchall()]
+
+    def search_files(self, query: str, project_id: Optional[int] = None,
+                     limit: int = 20) -> List[Dict]:
+        """搜索当前版本的文件路径(子串匹配)"""
+        match = fts_query(query)
+        if not match:
+            return []
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            if self.fts_enabled and all(len(t) >= 3 for t in query.split()):
+                cursor.execute(f'''
+                    SELECT f.id, f.project_id, p.name as project_name, f.file_path, f.loc,
+                           highlight(files_fts, 0, '{_MARK_START}', '{_MARK_END}') as snippet,
+                           bm25(files_fts) as rank
+                    FROM files_fts
+                    JOIN file_stats f ON f.id = files_fts.rowid
+                    JOIN projects p ON p.id = f.project_id
+                    WHERE files_fts MATCH ? AND f.is_current = 1
+                          AND (?2 IS NULL OR f.project_id = ?2)
+                    ORDER BY rank LIMIT ?3
+                ''', (match, project_id, limit))
+            else:
+                # trigram 索引无法匹配少于3个字符的查询
+                cursor.execute('''
+                    SELECT f.id, f.project_id, p.name as project_name, f.file_path, f.loc,
+                           f.file_path as snippet, 0 as rank
+                    FROM file_stats f JOIN projects p ON p.id = f.project_id
+                    WHERE f.file_path LIKE ?1 AND f.is_current = 1 AND (?2 IS NULL OR f.project_id = ?2)
+                    ORDER BY f.file_path LIMIT ?3
+                ''', (f"%{query.strip()}%", project_id, limit))
+            return [dict(row, snippet=highlight(row['snippet'])) for row in cursor.fetchall()]
+
     def get_code_smells(self, project_id: int) -> List[str]:
         """获取所有代码异味"""
         with self.get_conn() as conn:
             cursor = conn. cursor()
             cursor.execute('''
                 SELECT code_smells FROM file_stats 
-                WHERE project_id = ?  AND code_smells != ''
+                WHERE project_id = ?  AND is_current = 1 AND code_smells != ''
             ''', (project_id,))
 
             smells = []
@@ -202,12 +1132,215 @@ class Database:
         with self.get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT DATE(committed_at) as date, COUNT(*) as count
-                FROM commits WHERE project_id = ? 
-                GROUP BY DATE(committed_at)
-                ORDER BY date DESC LIMIT 30
+                SELECT bucket as date, commits as count FROM activity_rollups
+                WHERE project_id = ? AND granularity = 'day'
+                ORDER BY bucket DESC LIMIT 30
             ''', (project_id,))
             return {row['date']: row['count'] for row in cursor.fetchall()}
 
+    def get_activity(self, project_id: int, granularity: str = 'day',
+                     start: Optional[date] = None, end: Optional[date] = None) -> List[Dict]:
+        """获取按日/周/月汇总的提交活动"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的时间粒度: {granularity}")
+        start_bucket = activity_bucket(start, granularity) if start else '0000-00-00'
+        end_bucket = end.isoformat() if end else '9999-12-31'
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT bucket, commits, insertions, deletions, authors FROM activity_rollups
+                WHERE project_id = ? AND granularity = ? AND bucket BETWEEN ? AND ?
+                ORDER BY bucket
+            ''', (project_id, granularity, start_bucket, end_bucket))
+            return [dict(row) for row in cursor.fetchall()]
+
+    # ---- 数据保留 ----
+
+    def prune_project(self, project_id: int, policy: RetentionPolicy,
+                      now: Optional[datetime] = None) -> Dict[str, int]:
+        """按保留策略清理项目: 旧快照(先归档)、不再被任何快照引用的文件行、过期的提交与运行记录
+
+        活动与贡献者汇总表不清理; 被清理的提交之后不会重新写入, 避免汇总重复累加
+        """
+        counts = {'snapshots': 0, 'archived': 0, 'files': 0, 'commits': 0, 'runs': 0}
+        stale = self._stale_snapshots(project_id, policy.keep_snapshots)
+        if stale and policy.archive:
+            counts['archived'] = self._archive_snapshots(project_id, stale)['snapshots']
+
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS _prune_ids (id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM _prune_ids")
+            if stale:
+                cursor.executemany("INSERT INTO _prune_ids (id) VALUES (?)", [(i,) for i in stale])
+                cursor.execute("DELETE FROM snapshot_files WHERE snapshot_id IN (SELECT id FROM _prune_ids)")
+                cursor.execute("DELETE FROM snapshots WHERE id IN (SELECT id FROM _prune_ids)")
+                counts['snapshots'] = cursor.rowcount
+                cursor.execute("DELETE FROM _prune_ids")
+
+            # 不在当前版本且不属于任何快照的文件行, 包括快照功能之前写入的旧行(blob_sha 为空)
+            cursor.execute('''
+                INSERT INTO _prune_ids (id)
+                SELECT id FROM file_stats f WHERE project_id = ? AND is_current = 0
+                AND NOT EXISTS (SELECT 1 FROM snapshot_files s WHERE s.file_id = f.id)
+            ''', (project_id,))
+            for table in ('functions', 'file_signatures', 'lsh_buckets'):
+                cursor.execute(f"DELETE FROM {table} WHERE file_id IN (SELECT id FROM _prune_ids)")
+            cursor.execute("DELETE FROM file_stats WHERE id IN (SELECT id FROM _prune_ids)")
+            counts['files'] = cursor.rowcount
+
+            cutoff = policy.commit_cutoff(now)
+            if cutoff:
+                cursor.execute("SELECT MAX(committed_at) FROM commits WHERE project_id = ? AND committed_at < ?",
+                               (project_id, cutoff))
+                newest_pruned = cursor.fetchone()[0]
+                if newest_pruned:
+                    cursor.execute("DELETE FROM commits WHERE project_id = ? AND committed_at <= ?",
+                                   (project_id, newest_pruned))
+                    counts['commits'] = cursor.rowcount
+                    cursor.execute('''
+                        UPDATE projects SET commits_pruned_before = MAX(COALESCE(commits_pruned_before, ''), ?)
+                        WHERE id = ?
+                    ''', (newest_pruned, project_id))
+                    self._bump_generation(cursor, project_id, 'commits')
+
+            cutoff = policy.run_cutoff(now)
+            if cutoff:
+                cursor.execute('''
+                    DELETE FROM runs WHERE project_id = ?1 AND started_at < ?2
+                    AND id < (SELECT MAX(id) FROM runs WHERE project_id = ?1)
+                ''', (project_id, cutoff))
+                counts['runs'] = cursor.rowcount
+
+            if counts['snapshots'] or counts['files']:
+                self._bump_generation(cursor, project_id, 'files')
+        return counts
+
+    def _stale_snapshots(self, project_id: int, keep: int) -> List[int]:
+        """超出保留数的快照ID(按提交时间从新到旧保留 keep 个, 当前快照始终保留)"""
+        if not keep:
+            return []
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT current_snapshot_id FROM projects WHERE id = ?", (project_id,))
+            row = cursor.fetchone()
+            current = row['current_snapshot_id'] if row else None
+            cursor.execute('''
+                SELECT id FROM snapshots WHERE project_id = ? ORDER BY committed_at DESC, id DESC
+            ''', (project_id,))
+            ids = [r['id'] for r in cursor.fetchall()]
+        return [i for i in ids[keep:] if i != current]
+
+    def _archive_snapshots(self, project_id: int, snapshot_ids: List[int]) -> Dict:
+        """将快照及其文件、函数行写入独立的SQLite文件并压缩, 记录到 archives 表"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = f"project_{project_id}_{min(snapshot_ids)}-{max(snapshot_ids)}"
+        db_file = os.path.join(self.archive_dir, name + '.db')
+        if os.path.exists(db_file):
+            os.remove(db_file)
+
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            # ATTACH 不能在事务中执行, 须先于写临时表
+            cursor.execute("ATTACH DATABASE ? AS archive", (db_file,))
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS _archive_ids (id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM _archive_ids")
+            cursor.executemany("INSERT INTO _archive_ids (id) VALUES (?)", [(i,) for i in snapshot_ids])
+            for statement in (
+                "CREATE TABLE archive.projects AS SELECT * FROM main.projects WHERE id = ?",
+                "CREATE TABLE archive.snapshots AS SELECT * FROM main.snapshots "
+                "WHERE id IN (SELECT id FROM _archive_ids)",
+                "CREATE TABLE archive.snapshot_files AS SELECT * FROM main.snapshot_files "
+                "WHERE snapshot_id IN (SELECT id FROM _archive_ids)",
+                "CREATE TABLE archive.file_stats AS SELECT * FROM main.file_stats "
+                "WHERE id IN (SELECT file_id FROM archive.snapshot_files)",
+                "CREATE TABLE archive.functions AS SELECT * FROM main.functions "
+                "WHERE file_id IN (SELECT id FROM archive.file_stats)",
+            ):
+                cursor.execute(statement, (project_id,) if '?' in statement else ())
+            cursor.execute("CREATE INDEX archive.idx_snapshot_files ON snapshot_files(snapshot_id, file_id)")
+            cursor.execute("CREATE INDEX archive.idx_functions_file ON functions(file_id)")
+            cursor.execute("SELECT COUNT(*), MIN(committed_at), MAX(committed_at) FROM archive.snapshots")
+            count, first, last = cursor.fetchone()
+            conn.commit()
+            cursor.execute("DETACH DATABASE archive")
+
+        path = os.path.join(self.archive_dir, name + ARCHIVE_SUFFIX)
+        size = pack_archive(db_file, path)
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO archives (project_id, path, snapshots, first_committed_at,
+                                      last_committed_at, size_bytes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (project_id, os.path.basename(path), count, first, last, size))
+            return {'id': cursor.lastrowid, 'path': path, 'snapshots': count}
+
+    def get_archives(self, project_id: int) -> List[Dict]:
+        """获取项目的归档列表, path 为归档文件的完整路径"""
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM archives WHERE project_id = ? ORDER BY last_committed_at, id",
+                           (project_id,))
+            return [dict(row, path=os.path.join(self.archive_dir, row['path']))
+                    for row in cursor.fetchall()]
+
+    @contextmanager
+    def attach_archive(self, project_id: int, archive_id: int) -> Iterator[sqlite3.Connection]:
+        """解压归档并以只读方式挂载为 archive 库, 返回只读连接, 可与当前数据联合查询"""
+        archive = next((a for a in self.get_archives(project_id) if a['id'] == archive_id), None)
+        if archive is None:
+            raise KeyError(f"归档不存在: {archive_id}")
+        with unpacked_archive(archive['path']) as db_file:
+            conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro",
+                                   uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            try:
+                conn.execute("ATTACH DATABASE ? AS archive",
+                             (f"file:{pathname2url(db_file)}?mode=ro",))
+                yield conn
+            finally:
+                conn.close()
+
+    def delete_project(self, project_id: int):
+        """删除项目的全部数据及归档文件; 跨项目共享的作者身份保留"""
+        archives = self.get_archives(project_id)
+        with self.get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM snapshot_files WHERE snapshot_id IN "
+                           "(SELECT id FROM snapshots WHERE project_id = ?)", (project_id,))
+            for table in _PROJECT_TABLES:
+                cursor.execute(f"DELETE FROM {table} WHERE project_id = ?", (project_id,))
+            cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        for archive in archives:
+            if os.path.exists(archive['path']):
+                os.remove(archive['path'])
+
+    def optimize(self) -> Dict[str, int]:
+        """整理数据库文件: 增量VACUUM回收空闲页, 合并全文索引段并更新查询统计; 返回整理前后的文件大小"""
+        before = os.path.getsize(self.db_path)
+        with self.get_conn() as conn:
+            conn.isolation_level = None
+            cursor = conn.cursor()
+            if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # 旧数据库切换为增量模式需要一次完整VACUUM
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+            else:
+                cursor.execute("PRAGMA incremental_vacuum").fetchall()
+            cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('commits_fts', 'files_fts')")
+            for table in [row['name'] for row in cursor.fetchall()]:
+                cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+            cursor.execute("ANALYZE")
+        return {'size_before': before, 'size_after': os.path.getsize(self.db_path)}
+
+    def project_db_path(self, project_id: int) -> str:
+        """项目数据所在的数据库文件"""
+        return self.db_path
+
+    def write_lock(self, project_id: int) -> threading.Lock:
+        """项目所在数据库的写锁, 供多线程写入时串行化同一文件的写事务"""
+        return self._write_lock
+
     def close(self):
         pass
@@ -2,18 +2,33 @@
 数据可视化模块
 """
 import os
-from typing import List, Dict
+import glob
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Optional
 from datetime import datetime
 
+import matplotlib
+matplotlib.use('Agg')  # 无界面后端, 可在Web进程和子进程中安全渲染
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pandas as pd
 import numpy as np
 
+from .guard import _MP_CONTEXT
+
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
 
+# 图表类型 -> (绘图方法, 依赖的数据类别)
+CHART_TYPES = {
+    'complexity_trend': ('plot_complexity_trend', ('files',)),
+    'code_growth': ('plot_code_growth', ('files',)),
+    'contributors': ('plot_contributor_stats', ('commits',)),
+    'code_smells': ('plot_code_smells', ('files',)),
+}
+
 
 class Visualizer:
     """可视化生成器"""
@@ -145,7 +160,7 @@ class Visualizer:
         labels = list(smells.keys())
         values = list(smells.values())
 
-        colors = plt.cm.Reds(pd.np.linspace(0.3, 0.8, len(labels)))
+        colors = plt.cm.Reds(np.linspace(0.3, 0.8, len(labels)))
         bars = ax.bar(labels, values, color=colors)
 
         ax.set_xlabel('异味类型')
@@ -164,9 +179,7 @@ class Visualizer:
         print(f"代码异味分布图已保存: {save_path}")
 
     def generate_report(self, project_id: int, output_dir: str = "data"):
-        """生成完整报告"""
-        os.makedirs(output_dir, exist_ok=True)
-
+        """生成完整报告(仅重绘数据发生变化的图表)"""
         project = self.db.get_project(project_id)
         if not project:
             print(f"项目 {project_id} 不存在")
@@ -174,9 +187,121 @@ class Visualizer:
 
         print(f"\n=== 生成项目报告:  {project['name']} ===\n")
 
-        self.plot_complexity_trend(project_id, f"{output_dir}/complexity_trend.png")
-        self.plot_code_growth(project_id, f"{output_dir}/code_growth.png")
-        self.plot_contributor_stats(project_id, f"{output_dir}/contributors.png")
-        self.plot_code_smells(project_id, f"{output_dir}/code_smells.png")
+        with ChartCache(self.db, os.path.join(output_dir, "charts")) as cache:
+            paths = cache.render_many([project_id])[project_id]
+        for chart, path in paths.items():
+            print(f"{chart}: {path or '无数据'}")
+
+        print(f"\n报告生成完成，保存在 {cache.cache_dir}/ 目录")
+
+
+def _render_chart(db_path: str, project_id: int, chart: str, save_path: str) -> bool:
+    """子进程中渲染单个图表, 先写临时文件再原子替换"""
+    from .storage import Database
 
-        print(f"\n报告生成完成，保存在 {output_dir}/ 目录")
+    method, _ = CHART_TYPES[chart]
+    tmp_path = f"{save_path}.{os.getpid()}.tmp.png"
+    getattr(Visualizer(Database(db_path)), method)(project_id, tmp_path)
+    if not os.path.exists(tmp_path):
+        return False
+    os.replace(tmp_path, save_path)
+    return True
+
+
+class ChartCache:
+    """图表渲染缓存
+
+    按 (项目ID, 图表类型, 数据版本号) 缓存PNG, 数据未变化的图表直接复用磁盘文件,
+    需要重绘的图表在进程池中并行渲染。进程池在首次渲染时创建并长期复用, 由 forkserver
+    (不支持时为 spawn)启动, 在多线程的Web服务中调用也是安全的。
+    """
+
+    def __init__(self, db, cache_dir: str = "data/charts", max_workers: Optional[int] = None):
+        self.db = db
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_MP_CONTEXT)
+            return self._pool
+
+    def cache_key(self, project_id: int, chart: str) -> Optional[str]:
+        """返回图表的缓存版本标识, 项目不存在时返回None"""
+        generation = self.db.get_data_generation(project_id)
+        if not generation:
+            return None
+        _, deps = CHART_TYPES[chart]
+        return '-'.join(f"{dep}{generation[dep]}" for dep in deps)
+
+    def chart_path(self, project_id: int, chart: str, key: str) -> str:
+        return os.path.join(self.cache_dir, str(project_id), f"{chart}-{key}.png")
+
+    def _empty_marker(self, path: str) -> str:
+        return path[:-len('.png')] + '.empty'
+
+    def get(self, project_id: int, chart: str) -> Optional[str]:
+        """获取图表路径, 必要时渲染; 无数据时返回None"""
+        return self.render_many([project_id], [chart])[project_id][chart]
+
+    def render_many(self, project_ids: Iterable[int],
+                    charts: Iterable[str] = tuple(CHART_TYPES)) -> Dict[int, Dict[str, Optional[str]]]:
+        """批量获取图表, 只重绘缓存失效的部分"""
+        charts = list(charts)
+        results: Dict[int, Dict[str, Optional[str]]] = {}
+        stale = []
+
+        for pid in project_ids:
+            results[pid] = {}
+            for chart in charts:
+                key = self.cache_key(pid, chart)
+                if key is None:
+                    results[pid][chart] = None
+                    continue
+                path = self.chart_path(pid, chart, key)
+                if os.path.exists(path):
+                    results[pid][chart] = path
+                elif os.path.exists(self._empty_marker(path)):
+                    results[pid][chart] = None
+                else:
+                    stale.append((pid, chart, path))
+
+        if stale:
+            pool = self._get_pool()
+            futures = []
+            for pid, chart, path in stale:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                futures.append(pool.submit(_render_chart, self.db.project_db_path(pid), pid, chart, path))
+            for (pid, chart, path), future in zip(stale, futures):
+                rendered = future.result()
+                self._purge_old(pid, chart, path)
+                if rendered:
+                    results[pid][chart] = path
+                else:
+                    open(self._empty_marker(path), 'w').close()
+                    results[pid][chart] = None
+
+        return results
+
+    def _purge_old(self, project_id: int, chart: str, keep: str):
+        """删除该图表过期版本的缓存文件"""
+        pattern = os.path.join(self.cache_dir, str(project_id), f"{chart}-*")
+        keep_files = {keep, self._empty_marker(keep)}
+        for path in glob.glob(pattern):
+            if path not in keep_files:
+                os.remove(path)
@@ -1,15 +1,24 @@
 """
 Flask Web应用
 """
-from flask import Flask, render_template, jsonify
-from . storage import Database
+import os
+from datetime import date
 
+from flask import Flask, render_template, jsonify, request, send_file
+from . storage import GRANULARITIES
+from .sharding import open_database
+from .visualizer import ChartCache, CHART_TYPES
+from .profiling import format_prometheus
+from .delta import compute_delta
 
-def create_app(db_path: str = "data/analysis.db") -> Flask:
+
+def create_app(db_path: str = "data/analysis.db", chart_dir: str = "data/charts") -> Flask:
     app = Flask(__name__, template_folder='../templates')
     app.config['SECRET_KEY'] = 'dev-key'
 
-    db = Database(db_path)
+    db = open_database(db_path)
+    db.init_tables()
+    charts = ChartCache(db, chart_dir)
 
     @app.route('/')
     def index():
@@ -51,4 +60,118 @@ def create_app(db_path: str = "data/analysis.db") -> Flask:
     def api_commits(pid):
         return jsonify(db.get_commits(pid))
 
+    @app.route('/api/project/<int:pid>/activity')
+    def api_activity(pid):
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            return jsonify({'error': f'不支持的时间粒度: {granularity}'}), 400
+        try:
+            start, end = (date.fromisoformat(request.args[k]) if request.args.get(k) else None
+                          for k in ('from', 'to'))
+        except ValueError:
+            return jsonify({'error': '日期格式应为 YYYY-MM-DD'}), 400
+        return jsonify(db.get_activity(pid, granularity, start, end))
+
+    @app.route('/api/project/<int:pid>/snapshots')
+    def api_snapshots(pid):
+        return jsonify(db.get_snapshots(pid))
+
+    @app.route('/api/project/<int:pid>/delta')
+    def api_delta(pid):
+        refs = request.args.get('from'), request.args.get('to')
+        if not all(refs):
+            return jsonify({'error': '缺少参数 from/to'}), 400
+        old, new = (db.find_snapshot(pid, ref) for ref in refs)
+        if not old or not new:
+            return jsonify({'error': f'找不到快照: {refs[0] if not old else refs[1]}'}), 404
+        return jsonify(compute_delta(db, old, new))
+
+    @app.route('/api/project/<int:pid>/functions')
+    def api_functions(pid):
+        order_by = request.args.get('order', 'complexity')
+        if order_by not in ('complexity', 'line_count'):
+            return jsonify({'error': f'不支持的排序字段: {order_by}'}), 400
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify(db.get_top_functions(pid, order_by, limit))
+
+    @app.route('/api/project/<int:pid>/complexity')
+    def api_complexity(pid):
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({
+            'histogram': db.get_complexity_histogram(pid),
+            'files': db.get_file_complexity(pid, limit),
+        })
+
+    @app.route('/api/project/<int:pid>/chart/<chart_type>.png')
+    def api_chart(pid, chart_type):
+        if chart_type not in CHART_TYPES:
+            return jsonify({'error': f'不支持的图表类型: {chart_type}'}), 404
+        key = charts.cache_key(pid, chart_type)
+        if key is None:
+            return jsonify({'error': '项目不存在'}), 404
+        # ETag 与数据版本绑定, 数据未变化时浏览器收到 304
+        if key in request.if_none_match:
+            return '', 304, {'ETag': f'"{key}"'}
+        path = charts.get(pid, chart_type)
+        if not path:
+            return jsonify({'error': '无图表数据'}), 404
+        return send_file(os.path.abspath(path), mimetype='image/png', etag=key, max_age=300)
+
+    @app.route('/api/project/<int:pid>/runs')
+    def api_runs(pid):
+        return jsonify(db.get_runs(pid, request.args.get('limit', 20, type=int)))
+
+    @app.route('/api/project/<int:pid>/skipped')
+    def api_skipped(pid):
+        return jsonify(db.get_skipped_files(pid))
+
+    @app.route('/api/project/<int:pid>/archives')
+    def api_archives(pid):
+        return jsonify([{k: v for k, v in a.items() if k != 'path'} for a in db.get_archives(pid)])
+
+    @app.route('/metrics')
+    def metrics():
+        runs = db.get_latest_runs()
+        stage_samples, counter_samples, duration_samples = [], [], []
+        for run in runs:
+            project = run['project_name']
+            duration_samples.append(({'project': project}, run['duration']))
+            for stage, info in run['report'].get('stages', {}).items():
+                stage_samples.append(({'project': project, 'stage': stage}, info['seconds']))
+            for name, value in run['report'].get('counters', {}).items():
+                counter_samples.append(({'project': project, 'counter': name}, value))
+
+        body = format_prometheus([
+            {'name': 'oss_table_rows', 'type': 'gauge', 'help': '数据表行数',
+             'samples': [({'table': t}, n) for t, n in db.get_table_counts().items()]},
+            {'name': 'oss_last_run_duration_seconds', 'type': 'gauge', 'help': '最近一次分析总耗时',
+             'samples': duration_samples},
+            {'name': 'oss_last_run_stage_seconds', 'type': 'gauge', 'help': '最近一次分析各阶段耗时',
+             'samples': stage_samples},
+            {'name': 'oss_last_run_count', 'type': 'gauge', 'help': '最近一次分析的计数器',
+             'samples': counter_samples},
+        ])
+        return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.route('/api/search')
+    def api_search():
+        q = request.args.get('q', '').strip()
+        if not q:
+            return jsonify({'error': '缺少参数 q'}), 400
+        project_id = request.args.get('project', type=int)
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({
+            'commits': db.search_commits(q, project_id, limit),
+            'files': db.search_files(q, project_id, limit),
+        })
+
+    @app.route('/api/similar')
+    def api_similar():
+        file_id = request.args.get('file_id', type=int)
+        if file_id is None:
+            return jsonify({'error': '缺少参数 file_id'}), 400
+        threshold = request.args.get('threshold', 0.5, type=float)
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify(db.find_similar_files(file_id, threshold, limit))
+
     return app
@@ -29,6 +29,7 @@ class Z3Checker:
     def __init__(self, source_code: str):
         self.source_code = source_code
         self.issues: List[CodeIssue] = []
+        self.solver_calls = 0
         self._tree = None
 
     def check(self) -> List[CodeIssue]:
@@ -83,6 +84,7 @@ class Z3Checker:
             var = Int(divisor.id)
             solver.add(var == 0)
 
+            self.solver_calls += 1
             if solver.check() == sat:
                 self.issues.append(CodeIssue(
                     issue_type="潜在除零风险",
@@ -153,6 +155,7 @@ class Z3Checker:
             # 检查是否恒真
             solver.push()
             solver.add(Not(constraint))
+            self.solver_calls += 1
             if solver.check() == unsat:
                 self.issues.append(CodeIssue(
                     issue_type="恒真条件",
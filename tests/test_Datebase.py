@@ -57,7 +57,7 @@ class TestDatabase:
             db.save_commit(pid, {
                 'sha': f'sha{i}',
                 'author': 'Alice' if i < 3 else 'Bob',
-                'email': 'test@test.com',
+                'email': 'alice@test.com' if i < 3 else 'bob@test.com',
                 'message': f'Commit {i}',
                 'date': datetime.now(),
                 'files_changed': 1,
@@ -69,6 +69,609 @@ class TestDatabase:
         assert len(stats) == 2
         assert stats[0]['author'] == 'Alice'
         assert stats[0]['commits'] == 3
+        assert stats[0]['additions'] == 30
+        assert stats[0]['active_days'] == 1
+
+    def test_contributor_identity_merge(self, db):
+        from datetime import datetime
+        from src.identity import Mailmap
+        pid = db.save_project("test", "https://github.com/test/test")
+        mailmap = Mailmap.from_text("Alice Smith <alice@work.com> <alice@old.com>\n")
+
+        identities = [
+            ('Alice Smith', 'alice@work.com'),
+            ('alice', 'Alice@Work.com'),        # 邮箱相同(忽略大小写)
+            ('A. Smith', 'alice@old.com'),      # .mailmap 映射
+            ('alice  SMITH', 'alice@home.com'),  # 规范化姓名相同
+            ('Bob', 'bob@test.com'),
+        ]
+        db.save_commits(pid, [{
+            'sha': f'sha{i}', 'author': name, 'email': email, 'message': '',
+            'date': datetime(2024, 1, i + 1), 'files_changed': 1,
+            'insertions': 1, 'deletions': 0
+        } for i, (name, email) in enumerate(identities)], mailmap)
+
+        stats = db.get_contributor_stats(pid)
+        assert [(s['author'], s['commits']) for s in stats] == [('Alice Smith', 4), ('Bob', 1)]
+        assert stats[0]['active_days'] == 4
+        assert stats[0]['first_commit'].startswith('2024-01-01')
+
+    def test_find_similar_files(self, db):
+        from types import SimpleNamespace
+        from src.similarity import compute_signature
+
+        def save(pid, path, content):
+            data = {'file_path': path, 'loc': 1, 'sloc': 1, 'functions_count': 0,
+                    'classes_count': 0, 'imports_count': 0, 'code_smells': ''}
+            fid = db.save_file_stats(pid, SimpleNamespace(to_dict=lambda: data))
+            db.save_file_signature(pid, fid, compute_signature(content))
+            return fid
+
+        code = "\n".join(f"def func_{i}(a, b):\n    return a * {i} + b" for i in range(20))
+        p1 = db.save_project("p1", "https://github.com/test/p1")
+        p2 = db.save_project("p2", "https://github.com/test/p2")
+        f1 = save(p1, "utils.py", code)
+        f2 = save(p2, "vendor/utils.py", code + "\n# copied")
+        save(p2, "other.py", "class Foo:\n    pass\n")
+
+        similar = db.find_similar_files(f1)
+        assert [r['file_id'] for r in similar] == [f2]
+        assert similar[0]['project_name'] == 'p2'
+        assert similar[0]['similarity'] == 1.0
+
+    def test_function_metrics(self, db):
+        from src.analyzer import CodeAnalyzer
+
+        code = (
+            "def simple(a):\n"
+            "    return a\n"
+            "\n"
+            "def branchy(a, b):\n"
+            "    if a and b:\n"
+            "        return 1\n"
+            "    for i in range(a):\n"
+            "        if i > b:\n"
+            "            return i\n"
+            "    return 0\n"
+        )
+        metrics = CodeAnalyzer(code, "mod.py").analyze()
+        assert [f.complexity for f in metrics.functions] == [1, 5]
+
+        pid = db.save_project("test", "https://github.com/test/test")
+        fid = db.save_file_stats(pid, metrics)
+        db.save_functions(pid, [(fid, f) for f in metrics.functions])
+
+        top = db.get_top_functions(pid, limit=1)
+        assert top[0]['name'] == 'branchy'
+        assert top[0]['file_path'] == 'mod.py'
+        assert db.get_complexity_histogram(pid) == {1: 1, 5: 1}
+        assert db.get_file_complexity(pid)[0]['max_complexity'] == 5
+
+    def test_activity_rollups(self, db):
+        from datetime import date, datetime
+        pid = db.save_project("test", "https://github.com/test/test")
+        days = [datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 12),
+                datetime(2024, 1, 3), datetime(2024, 2, 5)]
+        for i, day in enumerate(days):
+            db.save_commit(pid, {
+                'sha': f'sha{i}', 'author': 'Alice' if i % 2 else 'Bob',
+                'email': 'alice@test.com' if i % 2 else 'bob@test.com',
+                'message': '', 'date': day, 'files_changed': 1,
+                'insertions': 10, 'deletions': 1
+            })
+
+        weeks = db.get_activity(pid, 'week')
+        assert [(w['bucket'], w['commits'], w['authors']) for w in weeks] == [
+            ('2024-01-01', 3, 2), ('2024-02-05', 1, 1)]
+        months = db.get_activity(pid, 'month', start=date(2024, 1, 15), end=date(2024, 1, 31))
+        assert [(m['bucket'], m['insertions']) for m in months] == [('2024-01-01', 30)]
+        assert db.get_commit_activity(pid)['2024-01-01'] == 2
+
+    def test_data_generation(self, db):
+        from datetime import datetime
+        from src.analyzer import CodeAnalyzer
+        pid = db.save_project("test", "https://github.com/test/test")
+        assert db.get_data_generation(pid) == {'commits': 0, 'files': 0}
+
+        db.save_commit(pid, {
+            'sha': 'abc', 'author': 'Alice', 'email': 'alice@test.com', 'message': '',
+            'date': datetime.now(), 'files_changed': 1, 'insertions': 1, 'deletions': 0
+        })
+        assert db.get_data_generation(pid) == {'commits': 1, 'files': 0}
+
+        db.save_file_stats(pid, CodeAnalyzer("x = 1\n", "a.py").analyze())
+        generation = db.get_data_generation(pid)
+        assert generation['commits'] == 1 and generation['files'] == 1
+
+    def test_chart_cache(self, db, tmp_path):
+        from datetime import datetime
+        from src.visualizer import ChartCache
+
+        def commit(i):
+            db.save_commit(pid, {'sha': f'sha{i}', 'author': 'Alice', 'email': 'alice@test.com',
+                                 'message': '', 'date': datetime(2024, 1, i + 1), 'files_changed': 1,
+                                 'insertions': 1, 'deletions': 0})
+
+        pid = db.save_project("test", "https://github.com/test/test")
+        commit(0)
+        with ChartCache(db, str(tmp_path), max_workers=1) as cache:
+            first = cache.get(pid, 'contributors')
+            pool = cache._pool
+            assert os.path.exists(first)
+            assert pool._mp_context.get_start_method() != 'fork'
+            assert cache.get(pid, 'contributors') == first
+
+            # 数据变化后重绘, 复用同一个进程池并删除旧版本
+            commit(1)
+            second = cache.get(pid, 'contributors')
+            assert second != first and os.path.exists(second) and not os.path.exists(first)
+            assert cache._pool is pool
+        assert cache._pool is None
+
+    def test_save_run_report(self, db):
+        from src.profiling import RunProfiler
+        pid = db.save_project("test", "https://github.com/test/test")
+
+        profiler = RunProfiler()
+        profiler.start()
+        with profiler.stage("analyze"):
+            profiler.count("files", 3)
+        with profiler.stage("analyze"):
+            pass
+        profiler.stop()
+        db.save_run(pid, profiler.report())
+
+        runs = db.get_runs(pid)
+        assert len(runs) == 1
+        assert runs[0]['report']['stages']['analyze']['calls'] == 2
+        assert runs[0]['report']['counters'] == {'files': 3}
+        assert db.get_latest_runs()[0]['project_name'] == 'test'
+
+        # 重复 stop 不改变已记录的耗时
+        duration = profiler.report()['duration_seconds']
+        profiler.stop()
+        assert profiler.report()['duration_seconds'] == duration
+
+    def test_profiler_stops_on_early_return(self, tmp_path, monkeypatch):
+        import sys
+        import tracemalloc
+        import main
+        from benchmarks.generator import RepoSpec, generate_repo
+        path = generate_repo(str(tmp_path / "repo"), RepoSpec(commits=2, files=2, functions_per_file=2))
+        monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "analysis.db"))
+
+        # 无效修订版本与无法打开的仓库都提前返回, cProfile/tracemalloc 不能保持开启
+        main.analyze_repository(path, profile=True, rev="bogus")
+        main.analyze_repository(str(tmp_path), profile=True)
+        assert not tracemalloc.is_tracing()
+        assert sys.getprofile() is None
+
+    def test_snapshot_delta(self, db):
+        from datetime import datetime
+        from src.analyzer import CodeAnalyzer
+        from src.delta import compute_delta
+        pid = db.save_project("test", "https://github.com/test/test")
+
+        def analyze(sha, files):
+            reused = db.find_file_rows(pid, {path: blob for path, (blob, _) in files.items()})
+            for path, (blob, code) in files.items():
+                if path not in reused:
+                    metrics = CodeAnalyzer(code, path).analyze()
+                    reused[path] = db.save_file_stats(pid, metrics, blob)
+                    db.save_functions(pid, [(reused[path], f) for f in metrics.functions])
+            return db.save_snapshot(pid, sha, datetime(2024, 1, len(sha)), reused.values())
+
+        v1 = {'a.py': ('b1', "def f(x):\n    return x\n"),
+              'b.py': ('b2', "def g(x):\n    return x\n")}
+        v2 = {'a.py': ('b1', v1['a.py'][1]),
+              'b.py': ('b3', "def g(x):\n    if x:\n        return 1\n    return x\n")}
+        s1, s2 = analyze('aaa', v1), analyze('bbbb', v2)
+
+        # 未变化的 a.py 在两个快照间共享同一行
+        with db.get_conn() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM file_stats").fetchone()[0] == 3
+        assert db.get_complexity_histogram(pid) == {1: 1, 2: 1}
+        assert [f['file_path'] for f in db.get_file_stats(pid)] == ['b.py', 'a.py']
+
+        delta = compute_delta(db, db.find_snapshot(pid, str(s1)), db.find_snapshot(pid, 'bbbb'))
+        assert [f['file_path'] for f in delta['files']] == ['b.py']
+        func = delta['files'][0]['functions'][0]
+        assert (func['name'], func['metrics']['complexity']['delta']) == ('g', 1)
+        assert delta['summary']['max_complexity'] == {'old': 1, 'new': 2, 'delta': 1}
+
+    def test_full_text_search(self, db):
+        from datetime import datetime
+        from src.analyzer import CodeAnalyzer
+        pid = db.save_project("test", "https://github.com/test/test")
+        messages = ["Fix crash in <parser> when input is empty",
+                    "Add caching layer for repository queries",
+                    "Refactor parsing helpers"]
+        for i, message in enumerate(messages):
+            db.save_commit(pid, {
+                'sha': f'sha{i}', 'author': 'Alice', 'email': 'alice@test.com',
+                'message': message, 'date': datetime.now(), 'files_changed': 1,
+                'insertions': 1, 'deletions': 0
+            })
+        db.save_file_stats(pid, CodeAnalyzer("x = 1\n", "src/text_parser.py").analyze())
+
+        results = db.search_commits("parser")
+        assert [r['sha'] for r in results] == ['sha0']
+        assert '<mark>parser</mark>' in results[0]['snippet']
+        assert '&lt;' in results[0]['snippet']
+        assert [r['sha'] for r in db.search_commits("refactored parse")] == ['sha2']
+        assert db.search_commits("parser", project_id=pid + 1) == []
+
+        files = db.search_files("t_pars")
+        assert [f['file_path'] for f in files] == ['src/text_parser.py']
+
+        # 重新分析时已保存的提交不会重复写入
+        db.save_project("test", "https://github.com/test/test")
+        db.save_commit(pid, {
+            'sha': 'sha1', 'author': 'Alice', 'email': 'alice@test.com', 'message': messages[1],
+            'date': datetime.now(), 'files_changed': 1, 'insertions': 1, 'deletions': 0
+        })
+        assert [r['sha'] for r in db.search_commits("caching")] == ['sha1']
+
+    def test_search_index_without_trigram(self, db):
+        import sqlite3
+        from datetime import datetime
+
+        class NoTrigram:
+            """模拟不支持trigram分词的旧版SQLite"""
+            def __init__(self, cursor):
+                self.cursor = cursor
+
+            def execute(self, sql, *args):
+                if "trigram" in sql:
+                    raise sqlite3.OperationalError("no such tokenizer: trigram")
+                return self.cursor.execute(sql, *args)
+
+            def __getattr__(self, name):
+                return getattr(self.cursor, name)
+
+        # 建立索引之前的旧数据库, 在旧版SQLite上打开: 不应留下只建了一半的索引
+        with db.get_conn() as conn:
+            db._drop_search_index(conn.cursor())
+            db._init_search_index(NoTrigram(conn.cursor()))
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+        assert not db.fts_enabled and not tables & {'commits_fts', 'files_fts'}
+
+        pid = db.save_project("test", "https://github.com/test/test")
+        db.save_commit(pid, {'sha': 'sha0', 'author': 'Alice', 'email': 'alice@test.com',
+                             'message': 'Fix parser crash', 'date': datetime.now(),
+                             'files_changed': 1, 'insertions': 1, 'deletions': 0})
+        assert [r['sha'] for r in db.search_commits("parser")] == ['sha0']
+
+        # 升级SQLite后两个索引一起建立并回填
+        upgraded = Database(db.db_path)
+        upgraded.init_tables()
+        assert upgraded.fts_enabled
+        assert [r['sha'] for r in upgraded.search_commits("parser")] == ['sha0']
+        assert 'snippet' in upgraded.search_commits("parser")[0]
+
+    def test_search_interleaved_projects(self, db):
+        from datetime import datetime
+
+        def commits(prefix, count, message):
+            return [{'sha': f'{prefix}{i}', 'author': 'Alice', 'email': 'alice@test.com',
+                     'message': message, 'date': datetime(2024, 1, 1), 'files_changed': 1,
+                     'insertions': 1, 'deletions': 0} for i in range(count)]
+
+        a = db.save_project("a", "https://github.com/test/a")
+        b = db.save_project("b", "https://github.com/test/b")
+        db.save_commits(a, commits('a', 5, "parser"))
+        db.save_commits(b, commits('b', 6000, "fix the parser in the module"))
+        db.save_commits(a, commits('late', 1, "rewrite the parser module"))
+
+        assert len(db.search_commits("parser", a, limit=10)) == 6
+        # 限定项目时较早写入、相关度最高的匹配不会被其他项目的新提交挤出
+        assert db.search_commits("parser", a, limit=1)[0]['sha'] in {f'a{i}' for i in range(5)}
+        assert len(db.search_commits("parser", b, limit=10)) == 10
+        # 不限项目时只对最近的 SEARCH_WINDOW 个匹配排序
+        from src.storage import SEARCH_WINDOW
+        recent = {r['sha'] for r in db.search_commits("parser", limit=SEARCH_WINDOW * 2)}
+        assert len(recent) == SEARCH_WINDOW and 'late0' in recent and 'a0' not in recent
+
+    def test_collector_revisions(self, tmp_path):
+        from git import Repo
+        from git.exc import BadName
+        from benchmarks.generator import RepoSpec, generate_repo
+        from src.collector import GitCollector
+        path = generate_repo(str(tmp_path / "repo"), RepoSpec(commits=3, files=4, functions_per_file=2))
+        repo = Repo(path)
+        repo.create_tag('v1')
+        old_blobs = {b.path: b.hexsha for b in repo.head.commit.tree.traverse() if b.path.endswith('.py')}
+
+        # 新增、删除、修改各一个文件, 另在跳过的目录中新增文件
+        files = {'pkg0/module_0.py': "x = 1\n", 'pkg9/new.py': "y = 2\n",
+                 'venv/lib/site.py': "z = 3\n", 'build/gen.py': "w = 4\n"}
+        for name, content in files.items():
+            (tmp_path / "repo" / name).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / "repo" / name).write_text(content)
+        repo.index.add(list(files))
+        repo.index.remove(['pkg1/module_1.py'], working_tree=True)
+        repo.index.commit("v2")
+
+        collector = GitCollector(path)
+        assert collector.clone()
+        assert collector.get_python_blobs('v1') == old_blobs
+        new_blobs = collector.get_python_blobs()
+        assert set(new_blobs) == set(old_blobs) - {'pkg1/module_1.py'} | {'pkg9/new.py'}
+        assert collector.get_current_file('pkg0/module_0.py') == "x = 1\n"
+        assert collector.get_current_file('pkg0/module_0.py', 'v1') != "x = 1\n"
+        assert collector.get_current_file('pkg9/new.py', 'v1') is None
+        assert [c.message for c in collector.get_commits(rev='v1')][0].startswith('commit 2')
+        assert len(list(collector.get_commits(rev='v1..HEAD'))) == 1
+
+        assert sorted(collector.get_changed_python_files('v1', 'HEAD'), key=str) == [
+            ('pkg0/module_0.py', 'pkg0/module_0.py'), ('pkg1/module_1.py', None), (None, 'pkg9/new.py')]
+        for call in (lambda: collector.resolve('bogus'), lambda: collector.get_python_blobs('bogus'),
+                     lambda: collector.get_changed_python_files('bogus', 'HEAD')):
+            with pytest.raises(BadName):
+                call()
+
+    def test_diff_analyze_skipped(self, tmp_path, capsys):
+        import main
+        from benchmarks.generator import RepoSpec, generate_repo
+        from src.guard import FileLimits
+        path = generate_repo(str(tmp_path / "repo"), RepoSpec(commits=3, files=3, functions_per_file=2))
+
+        # 超限的文件只列为跳过, 不当作删除或新增
+        main.diff_analyze(path, "HEAD~2..HEAD", FileLimits(max_lines=1), workers=1)
+        out = capsys.readouterr().out
+        assert not [line for line in out.splitlines() if line.startswith('pkg')]
+        assert "跳过文件数: 4" in out and "HEAD~2:" in out and "too_many_lines" in out
+
+    def test_commit_batch_records(self, db):
+        import pickle
+        from src.records import CommitBatch, make_commit
+        records = [make_commit(f'{i:040x}', 'Alice', 'alice@test.com', f'change {i}',
+                               1700000000 + i * 86400, 1, i, 0) for i in range(3)]
+        batch = CommitBatch(records)
+        assert batch.authors.tolist() == [0, 0, 0]
+
+        restored = pickle.loads(pickle.dumps(batch))
+        assert list(restored) == records
+        assert restored[-1]['insertions'] == 2
+
+        pid = db.save_project("test", "https://github.com/test/test")
+        assert db.save_commits(pid, restored) == 3
+        stats = db.get_contributor_stats(pid)
+        assert (stats[0]['commits'], stats[0]['active_days']) == (3, 3)
+
+        # SHA-256 仓库的64位SHA按32字节存储; 长度不一致或非十六进制的SHA直接报错
+        sha256 = [make_commit(f'{i:064x}', 'Bob', 'bob@test.com', '', 1700000000) for i in range(2)]
+        wide = pickle.loads(pickle.dumps(CommitBatch(sha256)))
+        assert wide.sha_size == 32 and [c.sha for c in wide] == [c.sha for c in sha256]
+        for bad in ('abc123', 'z' * 40, f'{1:064x}'):
+            with pytest.raises(ValueError):
+                batch.append(make_commit(bad, 'Alice', 'alice@test.com', '', 1700000000))
+        assert len(batch) == 3
+
+    def test_guarded_analysis_skips(self, db, tmp_path):
+        from git import Repo
+        from src.guard import FileLimits, GuardedPool
+        repo = Repo.init(tmp_path)
+        files = {'ok.py': "def f(a):\n    return a\n", 'big.py': "x = 1\n" * 500,
+                 'deep.py': "x = " + "+".join(["a"] * 100) + "\n", 'bad.py': "def (:\n"}
+        for name, content in files.items():
+            (tmp_path / name).write_text(content)
+        repo.index.add(list(files))
+        repo.index.commit("init")
+        blobs = {b.path: b.hexsha for b in repo.head.commit.tree.traverse()}
+
+        limits = FileLimits(max_bytes=1000, max_depth=50)
+        with GuardedPool(str(tmp_path), limits, workers=2) as pool:
+            # 任务按空闲容量拉取, 第一个结果返回前最多取走与进程数相同的任务
+            pulled = []
+
+            def source():
+                for task in blobs.items():
+                    pulled.append(task)
+                    yield task
+            results = pool.imap(source())
+            first = next(results)
+            assert len(pulled) == 2
+            results = {r.file_path: r for r in [first, *results]}
+            assert results['ok.py'].metrics.functions_count == 1
+            assert set(results['ok.py'].timings) == {'read_blob', 'analyze', 'signature'}
+            assert {p: r.skipped for p, r in results.items() if r.skipped} == {
+                'big.py': 'too_large', 'deep.py': 'too_deep', 'bad.py': 'syntax_error'}
+
+        with GuardedPool(str(tmp_path), FileLimits(timeout=1e-6), workers=1) as pool:
+            timed_out = list(pool.imap([('ok.py', blobs['ok.py'])]))
+            assert timed_out[0].skipped == 'timeout' and pool.killed == 1
+
+        pid = db.save_project("test", str(tmp_path))
+        db.save_skipped_files(pid, [r for r in results.values() if r.skipped])
+        skipped = db.get_skipped_files(pid)
+        assert [s['file_path'] for s in skipped] == ['bad.py', 'deep.py', 'big.py']
+        assert skipped[2]['size_bytes'] == 3000
+
+    def test_async_collector_matches_sync(self, tmp_path, monkeypatch):
+        import asyncio
+        from src.async_collector import CollectedFile, CollectedRepo, RepoDone, collect_repos
+        from benchmarks.generator import RepoSpec, generate_repo
+        from src.collector import GitCollector
+        path = generate_repo(str(tmp_path / "repo"), RepoSpec(commits=5, files=4, functions_per_file=2))
+        sync = GitCollector(path)
+        sync.clone()
+
+        async def collect():
+            queue = asyncio.Queue()
+            await collect_repos([path, str(tmp_path / "missing")], queue, concurrency=2)
+            items = []
+            while (item := queue.get_nowait()) is not None:
+                items.append(item)
+            return items
+
+        items = asyncio.run(collect())
+        repo = next(i for i in items if isinstance(i, CollectedRepo))
+        assert [c.to_dict() for c in repo.commits] == [c.to_dict() for c in sync.get_commits()]
+        assert repo.blobs == sync.get_python_blobs()
+        files = {i.file_path: i.content for i in items if isinstance(i, CollectedFile)}
+        assert files == {p: sync.get_current_file(p) for p in repo.blobs}
+        errors = [i.error for i in items if isinstance(i, RepoDone)]
+        assert errors.count(None) == 1 and len(errors) == 2
+
+        # 快照时间与同步路径的表示一致(含提交者时区), 重复分析不会改写 committed_at
+        import subprocess
+        from src.async_collector import AsyncGitCollector
+        env = dict(os.environ, GIT_COMMITTER_DATE='2024-01-01T01:00:00+08:00')
+        subprocess.run(['git', '-C', path, '-c', 'user.name=T', '-c', 'user.email=t@t',
+                        'commit', '--allow-empty', '-qm', 'tz'], env=env, check=True)
+        for rev in (None, 'HEAD~1'):
+            sha, committed_at = asyncio.run(AsyncGitCollector(path).resolve(rev))
+            head = sync.resolve(rev)
+            assert sha == head.hexsha
+            assert committed_at.isoformat() == head.committed_datetime.isoformat()
+        assert committed_at.utcoffset() is not None
+
+        # 读取blob中途出错时该仓库以 RepoDone(error) 结束, 不中断其他仓库
+        async def broken(self, shas):
+            raise asyncio.IncompleteReadError(b'', 10)
+            yield
+        monkeypatch.setattr(AsyncGitCollector, 'read_blobs', broken)
+        errors = [i.error for i in asyncio.run(collect()) if isinstance(i, RepoDone)]
+        assert len(errors) == 2 and all(errors)
+
+    def test_batch_pipeline(self, tmp_path, monkeypatch):
+        import main
+        from benchmarks.generator import RepoSpec, generate_repo
+        from src import guard
+        from src.sharding import open_database
+        # 工作进程不能直接fork: 事件循环线程可能正在创建git子进程
+        assert guard._MP_CONTEXT.get_start_method() != 'fork'
+
+        # repo_6 与 repo_0 内容相同: 相同路径和blob的文件分别计入两个仓库
+        paths = [generate_repo(str(tmp_path / f"repo_{i}"),
+                               RepoSpec(commits=4, files=5, functions_per_file=2, seed=i % 6))
+                 for i in range(7)]
+        list_file = tmp_path / "list.txt"
+        list_file.write_text("\n".join(paths) + "\n", encoding='utf-8')
+        monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "shards"))
+        main.batch_analyze(str(list_file), workers=2, concurrency=4)
+
+        db = open_database(str(tmp_path / "shards"))
+        db.init_tables()
+        projects = db.get_all_projects()
+        assert sorted(p['name'] for p in projects) == [f"repo_{i}" for i in range(7)]
+        assert all(p['total_files'] == 5 and len(db.get_snapshots(p['id'])) == 1 for p in projects)
+
+        # 再次运行时全部复用已有结果, 同一提交的快照原地更新
+        main.batch_analyze(str(list_file), workers=2, concurrency=4)
+        assert all(p['total_files'] == 5 and len(db.get_snapshots(p['id'])) == 1
+                   for p in db.get_all_projects())
+        assert all(r['report']['counters']['files_reused'] == 5 for r in db.get_latest_runs())
+
+    def test_sharded_database(self, tmp_path):
+        from datetime import datetime
+        from src.analyzer import CodeAnalyzer
+        from src.sharding import SHARD_ID_BITS, open_database
+        from src.similarity import compute_signature
+        db = open_database(str(tmp_path / "shards"))
+        db.init_tables()
+
+        code = "\n".join(f"def func_{i}(a, b):\n    return a * {i} + b" for i in range(20))
+        file_ids = []
+        for name in ("alpha", "beta"):
+            pid = db.save_project(name, f"https://github.com/test/{name}")
+            db.save_commits(pid, [{'sha': f'{name}0', 'author': 'Test', 'email': 't@t.com',
+                                   'message': f'fix parser in {name}', 'date': datetime(2024, 1, 1),
+                                   'files_changed': 1, 'insertions': 1, 'deletions': 0}])
+            fid = db.save_file_stats(pid, CodeAnalyzer(code, f"{name}/parser.py").analyze())
+            db.save_file_signature(pid, fid, compute_signature(code))
+            snapshot_id = db.save_snapshot(pid, f'{name}0', datetime(2024, 1, 1), [fid])
+            db.save_project_stats(pid, db.find_snapshot(pid, str(snapshot_id)))
+            file_ids.append(fid)
+
+        # 每个项目一个分片, 文件ID高位为分片号
+        assert sorted(os.listdir(tmp_path / "shards")) == ['catalog.db', 'project_1.db', 'project_2.db']
+        assert [fid >> SHARD_ID_BITS for fid in file_ids] == [1, 2]
+        projects = {p['name']: p for p in db.get_all_projects()}
+        assert projects['beta']['total_files'] == 1 and projects['beta']['total_functions'] == 20
+
+        assert {r['sha'] for r in db.search_commits("parser")} == {'alpha0', 'beta0'}
+        assert len(db.search_files("parser", project_id=2)) == 1
+        similar = db.find_similar_files(file_ids[0])
+        assert [r['file_id'] for r in similar] == [file_ids[1]]
+        assert db.get_table_counts()['commits'] == 2
+
+        # 不存在的项目与单文件库一样返回空结果
+        assert db.get_project(99) is None and db.get_data_generation(99) == {}
+        assert db.get_activity(99) == [] and db.search_commits("parser", project_id=99) == []
+        with pytest.raises(KeyError):
+            db.save_commits(99, [])
+
+    def test_save_project_waits_for_writer(self, tmp_path):
+        import threading
+        from src.sharding import open_database
+        for path in ("analysis.db", "shards"):
+            db = open_database(str(tmp_path / path), 'hash', buckets=1)
+            db.init_tables()
+            pid = db.save_project("alpha", "https://github.com/test/alpha")
+
+            # 其他线程持有同一文件的写锁(长事务)时, 新项目等锁释放后再写入
+            saved = []
+            with db.write_lock(pid):
+                writer = threading.Thread(target=lambda: saved.append(
+                    db.save_project("beta", "https://github.com/test/beta")))
+                writer.start()
+                writer.join(0.3)
+                assert writer.is_alive() and not saved
+                if path == "shards":
+                    # 目录库中的项目行在等待分片写锁之前已分配
+                    assert db.find_project("beta") is not None
+            writer.join(5)
+            assert db.get_project(saved[0])['name'] == 'beta'
+
+    def test_retention_compaction(self, tmp_path):
+        import sqlite3
+        from datetime import datetime, timedelta
+        from src.analyzer import CodeAnalyzer
+        from src.retention import RetentionPolicy, compact
+        db = Database(str(tmp_path / "analysis.db"))
+        db.init_tables()
+        pid = db.save_project("test", "https://github.com/test/test")
+
+        now = datetime.now()
+        commits = [{'sha': f'sha{i}', 'author': 'Alice', 'email': 'alice@test.com', 'message': '',
+                    'date': now - timedelta(days=days), 'files_changed': 1,
+                    'insertions': 10, 'deletions': 0} for i, days in enumerate((500, 400, 1))]
+        db.save_commits(pid, commits)
+        legacy = db.save_file_stats(pid, CodeAnalyzer("x = 0\n", "old.py").analyze())
+
+        snapshots = []
+        for i in range(4):
+            code = f"def f(x):\n    return x + {i}\n"
+            fid = db.save_file_stats(pid, CodeAnalyzer(code, "a.py").analyze(), f"blob{i}")
+            snapshots.append(db.save_snapshot(pid, f"c{i}", now - timedelta(days=4 - i), [fid]))
+
+        result = compact(db, RetentionPolicy(keep_snapshots=2, commit_days=365))
+        assert result['projects']['test'] == {'snapshots': 2, 'archived': 2, 'files': 3,
+                                              'commits': 2, 'runs': 0}
+        assert [s['id'] for s in db.get_snapshots(pid)] == snapshots[2:]
+        # 旧提交已删除, 汇总保留; 再次保存时不会重复累加
+        db.save_commits(pid, commits)
+        assert [c['sha'] for c in db.get_commits(pid)] == ['sha2']
+        assert sum(m['commits'] for m in db.get_activity(pid, 'month')) == 3
+        with db.get_conn() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM file_stats WHERE id = ?", (legacy,)).fetchone()[0] == 0
+
+        archive, = db.get_archives(pid)
+        assert archive['snapshots'] == 2 and os.path.exists(archive['path'])
+        with db.attach_archive(pid, archive['id']) as conn:
+            rows = conn.execute('''
+                SELECT s.commit_sha, f.file_path FROM archive.snapshots s
+                JOIN archive.snapshot_files sf ON sf.snapshot_id = s.id
+                JOIN archive.file_stats f ON f.id = sf.file_id ORDER BY s.id
+            ''').fetchall()
+            assert [tuple(r) for r in rows] == [('c0', 'a.py'), ('c1', 'a.py')]
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM archive.snapshots")
+
+        db.delete_project(pid)
+        assert db.get_all_projects() == [] and not os.path.exists(archive['path'])
 
 
 if __name__ == "__main__":